@@ -0,0 +1,259 @@
+"""
+Bulk analysis of logged positions. Reads boards from a JSONL or CSV file as
+a stream, chooses the computer's move on each one in chunks across a pool of
+processes, and writes every row back out, in the same order and format, with
+the analysis added:
+
+    best_move - the square the computer would play, or empty if the game is
+                over or the board couldn't be read
+    score - the cost of that move from the computer's point of view (see
+                TicTacToeBoard), or the result of a finished game
+    outcome - 'win', 'tie' or 'loss' for the computer with best play from
+                here, or 'invalid' if the board couldn't be read
+    game_over - whether the board already has a winner or is full
+
+Run it from the project root with, for example:
+
+    python -m app.analyze positions.jsonl analysis.jsonl
+    python -m app.analyze positions.csv - --column position
+
+Boards are read from the "board" field or column (or --column), as an
+integer like 131072 or 0x20000, or as a nine-character board string like
+X.O...... (see app/uci.py). It's always the computer's turn. Only a few
+chunks are held in memory at once, however big the input is.
+"""
+import argparse
+import collections
+import concurrent.futures
+import csv
+import io
+import json
+import os
+import sys
+
+import numpy
+
+from app.batch import choose_squares
+from app.cli import parse_board
+from app.uci import ProtocolError, parse_board_string
+
+
+CHUNK_SIZE = 10000
+FIELDS = ('best_move', 'score', 'outcome', 'game_over')
+FORMATS = ('jsonl', 'csv')
+INTEGER_PREFIXES = ('0x', '0o', '0b')
+
+
+def read_board(value):
+    """
+    Reads a board from a JSONL field or CSV column.
+
+    :param value: integer, or string of an integer or a board string
+    :return: integer representing a board
+    :raises: ValueError
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("%r is not a board" % (value,))
+    text = str(value).strip()
+    if (len(text) == 9 and not text.isdigit()
+            and text[:2].lower() not in INTEGER_PREFIXES):
+        try:
+            return parse_board_string(text)
+        except ProtocolError as error:
+            raise ValueError(str(error))
+    return parse_board(text)
+
+
+def outcome(score):
+    """
+    Classifies a score from the computer's point of view.
+
+    :param score: integer
+    :return: 'win', 'tie' or 'loss'
+    """
+    if score > 0:
+        return 'win'
+    if score < 0:
+        return 'loss'
+    return 'tie'
+
+
+def read_rows(stream, format):
+    """
+    Reads rows from a JSONL or CSV stream, one at a time. A JSONL line that
+    isn't a JSON object is read as a row with just its text, under "line",
+    so that it's analyzed as invalid rather than ending the run.
+
+    :param stream: text file
+    :param format: 'jsonl' or 'csv'
+    :return: generator of dictionaries
+    """
+    if format == 'csv':
+        for row in csv.DictReader(stream):
+            yield row
+        return
+    for line in stream:
+        if line.strip():
+            try:
+                row = json.loads(line, object_pairs_hook=collections.OrderedDict)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                row = collections.OrderedDict(line=line.rstrip('\r\n'))
+            yield row
+
+
+def _analyze_chunk(task):
+    """
+    Chooses the computer's move on a chunk of boards, in a worker process.
+
+    :param task: (list of boards, seed for the choice between equal moves)
+    :return: (list of squares, list of scores, list of game over flags)
+    """
+    boards, seed = task
+    squares, scores, game_over = choose_squares(boards, numpy.random.default_rng(seed))
+    return squares.tolist(), scores.tolist(), game_over.tolist()
+
+
+def _chunks(rows, column, chunk_size):
+    """
+    Groups rows into chunks, and reads the board of each row. Anything but
+    a dictionary is put in one under "line", with no board.
+
+    :param rows: iterable of dictionaries
+    :param column: name of the board field or column
+    :param chunk_size: most rows in a chunk
+    :return: generator of (list of rows, list of boards, with None for any
+                board that couldn't be read)
+    """
+    chunk = []
+    boards = []
+    for row in rows:
+        if not isinstance(row, dict):
+            row = collections.OrderedDict(line=row)
+        try:
+            board = read_board(row.get(column))
+        except ValueError:
+            board = None
+        chunk.append(row)
+        boards.append(board)
+        if len(chunk) == chunk_size:
+            yield chunk, boards
+            chunk, boards = [], []
+    if chunk:
+        yield chunk, boards
+
+
+def _merge(chunk, boards, analysis):
+    """
+    Adds the analysis of a chunk to its rows.
+
+    :param chunk: list of rows
+    :param boards: list of boards, with None for unreadable ones
+    :param analysis: result of _analyze_chunk for the readable boards
+    :return: generator of rows
+    """
+    results = zip(*analysis)
+    for row, board in zip(chunk, boards):
+        if board is None:
+            row.update(best_move=None, score=None, outcome='invalid', game_over=None)
+        else:
+            square, score, game_over = next(results)
+            row.update(best_move=None if square < 0 else square, score=score,
+                       outcome=outcome(score), game_over=game_over)
+        yield row
+
+
+def analyze_rows(rows, column='board', processes=None, chunk_size=CHUNK_SIZE, seed=0):
+    """
+    Analyzes a stream of rows across a pool of processes, keeping at most two
+    chunks per process in flight, and yields them in their original order.
+
+    :param rows: iterable of dictionaries
+    :param column: name of the board field or column
+    :param processes: number of worker processes. Defaults to one per CPU.
+    :param chunk_size: rows sent to a worker at once
+    :param seed: seed for the choices between equally good moves; chunk n
+                uses seed + n
+    :return: generator of the rows, with FIELDS added
+    """
+    processes = processes or os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        pending = collections.deque()
+        for index, (chunk, boards) in enumerate(_chunks(rows, column, chunk_size)):
+            task = ([board for board in boards if board is not None], seed + index)
+            pending.append((chunk, boards, executor.submit(_analyze_chunk, task)))
+            if len(pending) >= 2 * processes:
+                chunk, boards, future = pending.popleft()
+                yield from _merge(chunk, boards, future.result())
+        while pending:
+            chunk, boards, future = pending.popleft()
+            yield from _merge(chunk, boards, future.result())
+
+
+def write_rows(rows, stream, format):
+    """
+    Writes rows to a JSONL or CSV stream as they arrive. CSV columns are
+    taken from the first row.
+
+    :param rows: iterable of dictionaries
+    :param stream: text file
+    :param format: 'jsonl' or 'csv'
+    :return: integer count of rows written
+    """
+    count = 0
+    writer = None
+    for row in rows:
+        if format == 'jsonl':
+            stream.write(json.dumps(row) + '\n')
+        else:
+            if writer is None:
+                writer = csv.DictWriter(stream, list(row), extrasaction='ignore')
+                writer.writeheader()
+            writer.writerow(dict((key, '' if value is None else value)
+                                 for key, value in row.items()))
+        count += 1
+    return count
+
+
+def _format(path, format):
+    """Picks a format from --format or the extension of a path."""
+    if format:
+        return format
+    if path.endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', help="JSONL or CSV file, or - for stdin")
+    parser.add_argument('output', nargs='?', default='-',
+                        help="file to write, or - for stdout (the default)")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="format of the input and output. Defaults to csv for "
+                        ".csv files and jsonl for anything else.")
+    parser.add_argument('--column', default='board')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    format = _format(args.input, args.format)
+    input = sys.stdin if args.input == '-' else io.open(args.input, newline='')
+    output = sys.stdout if args.output == '-' else io.open(args.output, 'w', newline='')
+    try:
+        rows = analyze_rows(read_rows(input, format), args.column, args.processes,
+                            args.chunk_size, args.seed)
+        count = write_rows(rows, output, format)
+    finally:
+        if input is not sys.stdin:
+            input.close()
+        if output is not sys.stdout:
+            output.close()
+    sys.stderr.write("Analyzed %s positions\n" % count)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Batch version of TicTacToeBoard._choose_square for callers with many boards
+at once, such as analytics jobs and bots. Boards are handled as NumPy arrays,
+so win detection and move lookups are a handful of array operations for the
+whole batch instead of a method call per board:
+
+    from app.batch import choose_squares
+    squares, scores, game_over = choose_squares(boards)
+"""
+import numpy
+
+from app.ttt import (ALL_SQUARES, COMPUTER, ENGINE, HAS_LINE, LOSS_VALUE,
+                     MASK_SQUARES, TIE_VALUE, WIN_VALUE, board_rank, pack_record,
+                     unrank_board, unrank_position_id)
+
+
+# lookup tables indexed by a nine-bit mask of squares
+_HAS_LINE = numpy.array(HAS_LINE, dtype=bool)
+_POWERS_OF_3 = numpy.array([sum(3 ** square for square in MASK_SQUARES[mask])
+                            for mask in range(ALL_SQUARES + 1)], dtype=numpy.int64)
+_SQUARE_COUNT = numpy.array([len(squares) for squares in MASK_SQUARES],
+                            dtype=numpy.int64)
+# _NTH_SQUARE[mask, n] is the nth lowest square in mask, or -1
+_NTH_SQUARE = numpy.array([squares + (-1,) * (9 - len(squares))
+                           for squares in MASK_SQUARES], dtype=numpy.int8)
+
+
+def split_boards(boards):
+    """
+    Vectorized split_board: separates an array of boards into a nine-bit mask
+    of squares for each player.
+
+    :param boards: NumPy array of integers representing boards
+    :return: (NumPy array, NumPy array) of human and computer masks
+    """
+    filled = boards & 0x2aaaa
+    computer_bits = (boards << 1) & filled
+    human_bits = filled & ~computer_bits
+    human = numpy.zeros(boards.shape, dtype=numpy.int64)
+    computer = numpy.zeros(boards.shape, dtype=numpy.int64)
+    for square in range(9):
+        shift = 2 * square + 1
+        human |= ((human_bits >> shift) & 1) << square
+        computer |= ((computer_bits >> shift) & 1) << square
+    return human, computer
+
+
+class BatchSolver(object):
+    """
+    Chooses the computer's move for whole arrays of boards.
+
+    The solved table of an Engine is indexed by position_id, which takes a
+    lookup per board to find. Instead, the computer's records are copied
+    once into a dense array of 16-bit records (see pack_record) indexed by
+    board_rank. Looking up a batch of boards is then a single array index.
+    Boards that aren't in the table, because they can't come up in a real
+    game, are passed to the engine once each and then added to the array.
+
+    Public methods:
+        choose_squares
+
+    """
+    def __init__(self, engine=None):
+        """
+        Builds the dense table for an engine.
+
+        :param engine: the Engine to take solved positions from. Defaults to
+                    the global ENGINE.
+        :attr records: NumPy array of 3^9 16-bit records for the computer
+                    to move, 0 for a board that hasn't been solved yet
+        """
+        super(BatchSolver, self).__init__()
+        self.engine = ENGINE if engine is None else engine
+        self.records = numpy.zeros(3 ** 9, dtype=numpy.uint16)
+        if self.engine.table is None:
+            return
+
+        for position, record in enumerate(self.engine.table):
+            if record:
+                board, player = unrank_position_id(position)
+                if player == COMPUTER:
+                    self.records[board_rank(board)] = record
+
+    def _fill_records(self, ranks):
+        """
+        Solves boards that aren't in the dense table yet, by asking the
+        engine about each one, and adds them so that later batches find them.
+
+        :param ranks: NumPy array of distinct board ranks
+        """
+        for rank in ranks.tolist():
+            potential_moves = self.engine.potential_moves(unrank_board(rank))
+            self.records[rank] = pack_record(potential_moves, COMPUTER)
+
+    def choose_squares(self, boards, rng=None):
+        """
+        Chooses the computer's move on every board in a batch, as
+        TicTacToeBoard._choose_square would. Returns three arrays with one
+        entry per board:
+            squares - the chosen square, or -1 if the game is over
+            scores - the cost of that move from the computer's point of view,
+                    or WIN_VALUE, LOSS_VALUE or TIE_VALUE for a finished game
+            game_over - whether the board already has a winner or is full
+
+        :param boards: sequence or NumPy array of integers representing boards
+        :param rng: NumPy random Generator to pick between equally good moves
+        :return: (NumPy array, NumPy array, NumPy array)
+        """
+        if rng is None:
+            rng = numpy.random.default_rng()
+        boards = numpy.asarray(boards, dtype=numpy.int64)
+        human, computer = split_boards(boards)
+
+        human_won = _HAS_LINE[human]
+        computer_won = _HAS_LINE[computer]
+        game_over = human_won | computer_won | ((human | computer) == ALL_SQUARES)
+
+        squares = numpy.full(boards.shape, -1, dtype=numpy.int8)
+        scores = numpy.full(boards.shape, TIE_VALUE, dtype=numpy.int8)
+        scores[human_won] = LOSS_VALUE
+        scores[computer_won] = WIN_VALUE
+
+        ranks = _POWERS_OF_3[human] + 2 * _POWERS_OF_3[computer]
+        records = self.records[ranks]
+        missing = ~game_over & (records == 0)
+        if missing.any():
+            self._fill_records(numpy.unique(ranks[missing]))
+            records = self.records[ranks]
+
+        playing = ~game_over
+        moves = (records[playing] & ALL_SQUARES).astype(numpy.int64)
+        choices = rng.integers(_SQUARE_COUNT[moves])
+        squares[playing] = _NTH_SQUARE[moves, choices]
+        scores[playing] = (records[playing] >> 9).astype(numpy.int8) + LOSS_VALUE
+        return squares, scores, game_over
+
+
+_SOLVER = None
+
+
+def choose_squares(boards, rng=None):
+    """
+    BatchSolver.choose_squares with a BatchSolver for the global ENGINE, which
+    is built the first time it's needed.
+
+    :param boards: sequence or NumPy array of integers representing boards
+    :param rng: NumPy random Generator to pick between equally good moves
+    :return: (NumPy array, NumPy array, NumPy array)
+    """
+    global _SOLVER
+    if _SOLVER is None:
+        _SOLVER = BatchSolver()
+    return _SOLVER.choose_squares(boards, rng)
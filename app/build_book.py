@@ -0,0 +1,49 @@
+"""
+Build step for the opening book, which an Engine reads the first time it
+needs a position that isn't in its playbook. Every canonical position where
+it's the computer's turn, up to `--depth` moves into the game (with either
+player moving first), is solved and written to BOOK_PATH with all of its
+equally good moves, except that positions in OPENING_BOOK keep their
+hand-picked moves. Run this from the project root whenever the solver or
+OPENING_BOOK changes:
+
+    python -m app.build_book --depth 4
+"""
+import argparse
+
+from app.build_table import position_records, solve_positions, table_bytes
+from app.ttt import BOOK_DEPTH, BOOK_MAGIC, BOOK_PATH, BOOK_VERSION, COMPUTER
+
+
+def build_book(depth=BOOK_DEPTH):
+    """
+    Solves the computer's positions up to a depth and encodes them as
+    records in the same format as the solved table.
+
+    :param depth: the most moves played in any position in the book
+    :return: dictionary of table keys paired with 16-bit records
+    :raises: ValueError
+    """
+    costs = dict((key, potential_moves)
+                 for key, potential_moves in solve_positions(depth).items()
+                 if key[1] == COMPUTER)
+    return position_records(costs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--depth', type=int, default=BOOK_DEPTH,
+                        help="the most moves played in any position in the book")
+    parser.add_argument('--path', default=BOOK_PATH)
+    args = parser.parse_args(argv)
+
+    records = build_book(args.depth)
+    data = table_bytes(records, BOOK_MAGIC, BOOK_VERSION, args.depth)
+    with open(args.path, 'wb') as book_file:
+        book_file.write(data)
+    print("Wrote %s positions (%s bytes) to %s" % (len(records), len(data),
+                                                   args.path))
+
+
+if __name__ == '__main__':
+    main()
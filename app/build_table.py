@@ -0,0 +1,125 @@
+"""
+Build step for the solved position table that ttt.py memory-maps at import.
+Every position that can come up in a real game (with either player moving
+first) is solved once, in its canonical form, and written to TABLE_PATH for
+all of its rotations and reflections. Run this from the project root
+whenever the solver or OPENING_BOOK changes:
+
+    python -m app.build_table
+"""
+import array
+import sys
+
+from app.ttt import (ALL_SQUARES, COMPUTER, HUMAN, INVERSE_SYMMETRIES,
+                     LEGAL_POSITIONS, MASK_SYMMETRIES, OPENING_BOOK, TABLE_HEADER,
+                     TABLE_MAGIC, TABLE_PATH, TABLE_VERSION, Engine, TicTacToeBoard,
+                     canonical_board, canonical_playbook, join_board, pack_record,
+                     position_id, position_key, split_board, unrank_position)
+
+
+def solve_positions(depth=None):
+    """
+    Calculates the cost of every move for every reachable canonical position.
+    Returns a dictionary in the same format as OPENING_BOOK, with an entry for
+    each canonical (board, player) pair where the game is not over yet.
+
+    :param depth: only solve positions with at most this many moves played,
+                or None for every position
+    :return: dictionary
+    """
+    engine = Engine()
+    ttt = TicTacToeBoard(engine)
+    costs = {}
+
+    # either player can move first
+    positions = [(0, HUMAN, 0), (0, COMPUTER, 0)]
+    while positions:
+        board, player, moves = positions.pop()
+        if (board, player) in costs:
+            continue
+        costs.update(engine.calculate_board_costs(board, player))
+        if depth is not None and moves >= depth:
+            continue
+        for square in ttt._get_valid_moves(board):
+            new_board = board + ttt._convert_move(square, player)
+            if not (ttt._has_won(player, new_board) or
+                    ttt._is_board_full(new_board)):
+                positions.append((canonical_board(new_board)[0], ~player & 0x3,
+                                  moves + 1))
+    return costs
+
+
+def position_records(costs):
+    """
+    Encodes solved positions as solved table records, for every rotation
+    and reflection of each one, with its moves turned the same way that
+    Engine.potential_moves would turn them back from the canonical board.
+    Positions in OPENING_BOOK keep their hand-picked moves, as long as
+    they're among the best moves the solver found.
+
+    :param costs: dictionary from solve_positions
+    :return: dictionary of table keys paired with 16-bit records
+    :raises: ValueError
+    """
+    opening_book = canonical_playbook(OPENING_BOOK)
+    records = {}
+    for (board, player), potential_moves in costs.items():
+        record = pack_record(potential_moves, player)
+        if player == COMPUTER and (board, player) in opening_book:
+            book_moves = opening_book[(board, player)]
+            book_mask = sum(1 << square for square in book_moves)
+            if book_mask & ~record:
+                raise ValueError("OPENING_BOOK move for %#x is not a best move" % board)
+            record = (record & ~0x1ff) | book_mask
+        human, computer = split_board(board)
+        for symmetry in MASK_SYMMETRIES:
+            variant = join_board(symmetry[human], symmetry[computer])
+            undo = MASK_SYMMETRIES[INVERSE_SYMMETRIES[canonical_board(variant)[1]]]
+            records[position_key(variant, player)] = ((record & ~ALL_SQUARES) |
+                                                      undo[record & ALL_SQUARES])
+    return records
+
+
+def build_table():
+    """
+    Solves every reachable canonical position and encodes it as a solved
+    table record (see position_records).
+
+    :return: dictionary of table keys paired with 16-bit records
+    :raises: ValueError
+    """
+    return position_records(solve_positions())
+
+
+def table_bytes(records, magic=TABLE_MAGIC, version=TABLE_VERSION, extra=0):
+    """
+    Serializes solved table records, with the header, in the on-disk format:
+    a record for every legal position, in position_id order, with 0 for the
+    positions that aren't in `records`.
+
+    :param records: dictionary of table keys paired with 16-bit records
+    :param magic: the four bytes the file starts with
+    :param version: the version of the file
+    :param extra: 16-bit integer for the header's unused field
+    :return: bytes
+    """
+    values = array.array('H', [0]) * LEGAL_POSITIONS
+    for key, record in records.items():
+        board, player = unrank_position(key)
+        values[position_id(board, player)] = record
+    if sys.byteorder == 'big':
+        values.byteswap()
+    header = TABLE_HEADER.pack(magic, version, extra, len(values))
+    return header + values.tobytes()
+
+
+def main(path=TABLE_PATH):
+    """Builds the table and writes it to `path`."""
+    data = table_bytes(build_table())
+    with open(path, 'wb') as table_file:
+        table_file.write(data)
+    print("Wrote %s bytes to %s" % (len(data), path))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,187 @@
+"""
+Command-line entry point that uses only the engine in ttt.py, and never
+imports Kivy, for scripts, batch jobs and servers. Run it from the project
+root with one of:
+
+    python -m app.cli move 0x20000       the computer's best squares on a board
+    python -m app.cli play               a game in the terminal
+    python -m app.cli imports            how long importing the engine takes
+
+Squares are numbered the same way as in TicTacToeBoard:
+
+    8 | 7 | 6
+    1 | 0 | 5
+    2 | 3 | 4
+"""
+import argparse
+import os
+import sys
+
+from app.ttt import (COMPUTER, ENGINE, HUMAN, PLAYER1, PLAYER2, GameState,
+                     InvalidStateException, TieBreaker)
+
+
+# the squares of each row of the board, top to bottom
+ROWS = ((8, 7, 6), (1, 0, 5), (2, 3, 4))
+# modules the engine must never import
+GUI_MODULES = ('kivy',)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def format_board(board):
+    """
+    Draws a board as text, with the number of each open square.
+
+    :param board: integer representing a board
+    :return: string
+    """
+    labels = {0: None, 2: PLAYER1, 3: PLAYER2}
+    lines = []
+    for row in ROWS:
+        lines.append(' | '.join(labels[(board >> (2 * square)) & 3] or str(square)
+                                for square in row))
+    return '\n---------\n'.join(lines)
+
+
+def parse_board(text):
+    """
+    Reads a board written as an integer in any base Python understands, like
+    0x20000 or 0b100000000000000000.
+
+    :param text: string
+    :return: integer
+    :raises: ValueError
+    """
+    board = int(text, 0)
+    if not 0 <= board < 1 << 18 or any((board >> (2 * square)) & 3 == 1
+                                       for square in range(9)):
+        raise ValueError("%r is not a board" % text)
+    return board
+
+
+def move(board, engine=ENGINE):
+    """
+    Describes the computer's best squares on a board.
+
+    :param board: integer representing a board
+    :param engine: Engine to find the moves
+    :return: string
+    """
+    try:
+        squares = engine.best_squares(board)
+    except InvalidStateException as error:
+        return str(error)
+    return ' '.join(str(square) for square in squares)
+
+
+def play(first, stdin, stdout, engine=ENGINE, tie_breaker=None):
+    """
+    Plays a game in the terminal, reading the human's squares one per line.
+    The game ends early at the end of the input or on a line of 'q'.
+
+    :param first: 'human' or 'computer'
+    :param stdin: file to read the human's moves from
+    :param stdout: file to write the board to
+    :param engine: Engine to play the computer's moves
+    :param tie_breaker: TieBreaker for the computer, or None for the engine's
+    :return: the winner, or None for a tie or an unfinished game
+    """
+    state = GameState(turn=int(first == 'computer'))
+    winner = None
+    while not state.game_over:
+        if state.turn:
+            square, game_over, winner = engine.computer_move(state, tie_breaker)
+            stdout.write("Computer plays %s\n" % square)
+            continue
+
+        stdout.write("%s\nYour move: " % format_board(state.board))
+        stdout.flush()
+        line = stdin.readline().strip()
+        if not line or line == 'q':
+            stdout.write("\n")
+            return None
+        square = int(line) if line.isdecimal() else None
+        square, game_over, winner = engine.human_move(state, square)
+        if square is None:
+            stdout.write("%s isn't an open square\n" % line)
+
+    stdout.write("%s\n%s\n" % (format_board(state.board),
+                               {HUMAN: "You win!", COMPUTER: "You lose!"}.get(
+                                   winner, "It's a tie!")))
+    return winner
+
+
+def import_times(module='app.ttt'):
+    """
+    Imports a module in a new interpreter with -X importtime, and reads the
+    time taken by each module it imported.
+
+    :param module: name of the module to import
+    :return: list of (module name, self microseconds, cumulative
+                microseconds), in the order they finished importing
+    """
+    import subprocess
+
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import %s' % module],
+                            stderr=subprocess.PIPE, universal_newlines=True,
+                            cwd=PROJECT_ROOT, check=True).stderr
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(own), int(cumulative)))
+    return times
+
+
+def import_report(module='app.ttt', count=10):
+    """
+    Summarizes import_times: the total time to import the module, the
+    slowest modules it imported, and any GUI_MODULES among them.
+
+    :param module: name of the module to import
+    :param count: number of the slowest modules to list
+    :return: (string, list of GUI module names that were imported)
+    """
+    times = import_times(module)
+    total = dict((name, cumulative) for name, own, cumulative in times)[module]
+    gui = sorted(set(name.split('.')[0] for name, own, cumulative in times
+                     if name.split('.')[0] in GUI_MODULES))
+    lines = ["import %s: %.1f ms, %s modules" % (module, total / 1000.0, len(times)),
+             "%-32s %10s %10s" % ('slowest modules', 'self (ms)', 'total (ms)')]
+    for name, own, cumulative in sorted(times, key=lambda time: -time[1])[:count]:
+        lines.append("%-32s %10.1f %10.1f" % (name, own / 1000.0, cumulative / 1000.0))
+    lines.append("GUI modules imported: %s" % (', '.join(gui) or 'none'))
+    return '\n'.join(lines), gui
+
+
+def main(argv=None, stdin=sys.stdin, stdout=sys.stdout):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command')
+    command = commands.add_parser('move', help="the computer's best squares on a board")
+    command.add_argument('board', type=parse_board)
+    command = commands.add_parser('play', help="a game in the terminal")
+    command.add_argument('--first', choices=('human', 'computer'), default='human')
+    command.add_argument('--seed', type=int, help="seed for the computer's choices")
+    command = commands.add_parser('imports', help="how long importing takes")
+    command.add_argument('module', nargs='?', default='app.ttt')
+    args = parser.parse_args(argv)
+
+    if args.command == 'move':
+        stdout.write(move(args.board) + '\n')
+    elif args.command == 'play':
+        tie_breaker = None if args.seed is None else TieBreaker(args.seed)
+        play(args.first, stdin, stdout, tie_breaker=tie_breaker)
+    elif args.command == 'imports':
+        report, gui = import_report(args.module)
+        stdout.write(report + '\n')
+        return int(bool(gui))
+    else:
+        parser.print_help(stdout)
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
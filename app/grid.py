@@ -0,0 +1,476 @@
+"""
+Tic-tac-toe on larger boards: N x N squares, where k in a row wins. The
+board sizes past 3 x 3 are too big to solve ahead of time like SOLVED_TABLE,
+so GridEngine searches them with iterative deepening instead, stopping at a
+depth or time limit and scoring unfinished games with a heuristic.
+
+Squares are numbered row by row from the top left, 0 to N * N - 1, and a
+position is a pair of masks with one bit per square for each player, like
+the nine-bit masks in ttt.py. ClassicEngine runs the 3 x 3 game through a
+GridEngine for TicTacToeBoard, translating its square numbers.
+"""
+import random
+import time
+
+from app.ttt import (EXACT, LOWER_BOUND, TIE_VALUE, TRANSPOSITION_LIMIT,
+                     UPPER_BOUND, WIN_VALUE, BoundedCache,
+                     InvalidStateException, Metrics, TieBreaker,
+                     split_board)
+
+
+# where each square of TicTacToeBoard is on a 3 x 3 grid, and back
+CLASSIC_SQUARES = (4, 3, 6, 7, 8, 5, 2, 1, 0)
+CLASSIC_LABELS = tuple(CLASSIC_SQUARES.index(square) for square in range(9))
+
+
+def line_masks(size, k):
+    """
+    Finds every line of k squares in a row on a size x size board:
+    horizontal, vertical and both diagonals.
+
+    :param size: number of squares along each side
+    :param k: number of squares in a row needed to win
+    :return: tuple of integer masks, one bit per square
+    """
+    lines = []
+    for row in range(size):
+        for column in range(size):
+            for row_step, column_step in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                last_row = row + row_step * (k - 1)
+                last_column = column + column_step * (k - 1)
+                if 0 <= last_row < size and 0 <= last_column < size:
+                    line = sum(1 << ((row + row_step * i) * size +
+                                     column + column_step * i)
+                               for i in range(k))
+                    # with k = 1, every direction gives the same line
+                    if line not in lines:
+                        lines.append(line)
+    return tuple(lines)
+
+
+def square_count(mask):
+    """
+    Counts the squares in a mask.
+
+    :param mask: integer mask, one bit per square
+    :return: integer
+    """
+    return bin(mask).count('1')
+
+
+class Grid(object):
+    """
+    The geometry of an N x N board with k in a row to win: its lines, which
+    lines go through each square, and the Zobrist keys used to hash
+    positions.
+
+    Public methods:
+        is_win
+        winner
+
+    """
+    def __init__(self, size=3, k=None, seed=0):
+        """
+        Works out the lines and keys for a board.
+
+        :param size: number of squares along each side
+        :param k: number of squares in a row needed to win. Defaults to size.
+        :param seed: seed for the Zobrist keys
+        :attr squares: number of squares on the board
+        :attr all_squares: mask of every square
+        :attr lines: tuple of line masks (see line_masks)
+        :attr square_lines: tuple of the lines through each square
+        :attr move_order: tuple of squares, the ones on the most lines first
+        :attr win_value: score of a win on the next move, larger than any
+                    heuristic score
+        :attr zobrist: two tuples of 64-bit keys for each square, for the
+                    player about to move and the other player
+        :raises: ValueError
+        """
+        super(Grid, self).__init__()
+        k = size if k is None else k
+        if not 1 <= k <= size:
+            raise ValueError("Can't get %s in a row on a %sx%s board" %
+                             (k, size, size))
+        self.size = size
+        self.k = k
+        self.squares = size * size
+        self.all_squares = (1 << self.squares) - 1
+        self.lines = line_masks(size, k)
+        self.square_lines = tuple(tuple(line for line in self.lines
+                                        if line & (1 << square))
+                                  for square in range(self.squares))
+        self.move_order = tuple(sorted(range(self.squares),
+                                       key=lambda square: -len(self.square_lines[square])))
+        self.win_value = WIN_VALUE if self.squares < WIN_VALUE else 1 << 16
+        rng = random.Random(seed)
+        self.zobrist = tuple(tuple(rng.getrandbits(64) for square in range(self.squares))
+                             for player in range(2))
+
+    def is_win(self, mask, square):
+        """
+        Checks if the last square played completes a line.
+
+        :param mask: mask of the squares of the player who just moved
+        :param square: the square they moved to
+        :return: boolean
+        """
+        for line in self.square_lines[square]:
+            if mask & line == line:
+                return True
+        return False
+
+    def winner(self, first, second):
+        """
+        Checks a position for a completed line. Returns 1 if the first mask
+        has one, 2 if the second does, or None.
+
+        :param first: mask of the squares of one player
+        :param second: mask of the squares of the other player
+        :return: integer or None
+        """
+        for line in self.lines:
+            if first & line == line:
+                return 1
+            if second & line == line:
+                return 2
+        return None
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class GridEngine(object):
+    """
+    Searches positions on a Grid with negamax and alpha-beta pruning, the
+    same scoring as Engine in ttt.py: win_value for a win on the next move,
+    moved one step closer to TIE_VALUE for every move it takes to get there.
+
+    GridEngine.best_move deepens the search one move at a time until it
+    finds a result that no deeper search could change, reaches a depth
+    limit, or runs out of time. Positions past the depth limit get a
+    heuristic score from the lines that are still open, which is always
+    smaller than the score of any real win or loss.
+
+    Search results are kept in a transposition cache keyed by Zobrist hash,
+    with the depth each was searched to, so each iteration reuses the work of
+    the last one. The hash only depends on which squares belong to the player
+    about to move and which to the other player, so positions with the
+    pieces swapped share results.
+
+    Like the caches it uses, a GridEngine is not thread-safe.
+
+    Public methods:
+        best_move
+        move_scores
+
+    """
+    def __init__(self, grid, transpositions=None):
+        """
+        Creates an engine for a Grid.
+
+        :param grid: Grid to play on
+        :param transpositions: cache of search results. Defaults to a new
+                    BoundedCache of TRANSPOSITION_LIMIT entries.
+        :attr nodes: integer count of positions searched
+        :attr deadline: time.time() to stop searching at, or None
+        """
+        super(GridEngine, self).__init__()
+        self.grid = grid
+        if transpositions is None:
+            transpositions = BoundedCache(maxsize=TRANSPOSITION_LIMIT)
+        self.transpositions = transpositions
+        self.nodes = 0
+        self.deadline = None
+        # heuristic scores never reach the score of a win in the most moves
+        self.heuristic_limit = grid.win_value - grid.squares - 1
+
+    def _evaluate(self, mover, opponent):
+        """
+        Heuristic score of a position for the player about to move: every
+        line that only one player has pieces on counts for that player, more
+        the more pieces they have on it.
+
+        :param mover: mask of the squares of the player about to move
+        :param opponent: mask of the other player's squares
+        :return: integer
+        """
+        score = 0
+        for line in self.grid.lines:
+            if not line & opponent:
+                score += 1 << (2 * square_count(line & mover))
+            elif not line & mover:
+                score -= 1 << (2 * square_count(line & opponent))
+        return max(-self.heuristic_limit, min(self.heuristic_limit, score))
+
+    def _keys(self, mover, opponent):
+        """
+        Hashes a position from scratch, as a pair of Zobrist keys: one as
+        seen by the player about to move, and one as seen by the other
+        player. _move_score updates both as moves are made.
+
+        :param mover: mask of the squares of the player about to move
+        :param opponent: mask of the other player's squares
+        :return: (integer, integer)
+        """
+        own, other = self.grid.zobrist
+        mover_key = opponent_key = 0
+        for square in range(self.grid.squares):
+            if mover & (1 << square):
+                mover_key ^= own[square]
+                opponent_key ^= other[square]
+            elif opponent & (1 << square):
+                mover_key ^= other[square]
+                opponent_key ^= own[square]
+        return mover_key, opponent_key
+
+    def _move_score(self, square, mover, opponent, keys, depth, alpha, beta):
+        """
+        Scores a single move from the point of view of the player making it,
+        searching `depth` moves ahead including this one.
+
+        :param square: an open square
+        :param mover: mask of the squares of the player moving
+        :param opponent: mask of the other player's squares
+        :param keys: Zobrist keys of the position (see self._keys)
+        :param depth: number of moves to search, at least 1
+        :param alpha: the score the player can already guarantee
+        :param beta: the score the opponent can already hold the player to
+        :return: integer
+        """
+        mover |= 1 << square
+        if self.grid.is_win(mover, square):
+            return self.grid.win_value
+        if mover | opponent == self.grid.all_squares:
+            return TIE_VALUE
+
+        own, other = self.grid.zobrist
+        child_keys = (keys[1] ^ other[square], keys[0] ^ own[square])
+        score = -self._negamax(opponent, mover, child_keys, depth - 1,
+                               -beta - 1, -alpha + 1)
+        if score:
+            score += [-1, 1][score < 0]
+        return score
+
+    def _negamax(self, mover, opponent, keys, depth, alpha, beta):
+        """
+        Depth-limited alpha-beta search of the game tree below a position,
+        in the same way as Engine._negamax. Returns the score of the position
+        for the player about to move.
+
+        :param mover: mask of the squares of the player about to move
+        :param opponent: mask of the other player's squares
+        :param keys: Zobrist keys of the position (see self._keys)
+        :param depth: number of moves to search
+        :param alpha: the score the player can already guarantee
+        :param beta: the score the opponent can already hold the player to
+        :return: integer
+        :raises: _SearchTimeout
+        """
+        self.nodes += 1
+        if (self.deadline is not None and not self.nodes & 0x3ff and
+                time.time() > self.deadline):
+            raise _SearchTimeout()
+
+        # searching past the end of the game is the same as searching to it
+        open_squares = self.grid.all_squares & ~(mover | opponent)
+        depth = min(depth, square_count(open_squares))
+        original_alpha = alpha
+        best_square = None
+        entry = self.transpositions.get(keys[0])
+        if entry is not None:
+            score, bound, entry_depth, best_square = entry
+            if entry_depth >= depth:
+                if bound is EXACT:
+                    return score
+                if bound is LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        if not depth:
+            return self._evaluate(mover, opponent)
+
+        best_score = None
+        for square in self._ordered_moves(open_squares, best_square):
+            score = self._move_score(square, mover, opponent, keys, depth,
+                                     alpha, beta)
+            if best_score is None or score > best_score:
+                best_score, best_square = score, square
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transpositions[keys[0]] = (best_score, bound, depth, best_square)
+        return best_score
+
+    def _ordered_moves(self, open_squares, first=None):
+        """
+        Lists the open squares in the order to search them: `first` (the
+        best move found so far), then the squares on the most lines.
+
+        :param open_squares: mask of the open squares
+        :param first: a square to search first, or None
+        :return: list of integers
+        """
+        moves = [square for square in self.grid.move_order
+                 if open_squares & (1 << square)]
+        if first is not None and first in moves:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def best_move(self, mover, opponent, max_depth=None, time_limit=None):
+        """
+        Finds the best move for the player about to move with iterative
+        deepening. Returns the best square, its score, and the depth of the
+        deepest search that finished, or (None, TIE_VALUE, 0) if the board is
+        full. At least one move is always searched, even past `time_limit`.
+
+        :param mover: mask of the squares of the player about to move
+        :param opponent: mask of the other player's squares
+        :param max_depth: most moves to search ahead, or None for no limit
+        :param time_limit: seconds to search for, or None for no limit
+        :return: (integer, integer, integer)
+        """
+        open_squares = self.grid.all_squares & ~(mover | opponent)
+        depth_limit = square_count(open_squares)
+        if max_depth is not None:
+            depth_limit = min(depth_limit, max_depth)
+        keys = self._keys(mover, opponent)
+
+        start = time.time()
+        best = (None, TIE_VALUE, 0)
+        for depth in range(1, depth_limit + 1):
+            if time_limit is not None and depth > 1:
+                if time.time() > start + time_limit:
+                    break
+                self.deadline = start + time_limit
+            try:
+                square, score = self._search_root(mover, opponent, keys, depth,
+                                                  best[0])
+            except _SearchTimeout:
+                break
+            finally:
+                self.deadline = None
+            best = (square, score, depth)
+            if abs(score) > self.heuristic_limit:
+                # a win or a loss that searching deeper can't change
+                break
+        return best
+
+    def _search_root(self, mover, opponent, keys, depth, first=None):
+        """
+        Searches every move from a position to `depth`, and returns the
+        best one with its score.
+
+        :param mover: mask of the squares of the player about to move
+        :param opponent: mask of the other player's squares
+        :param keys: Zobrist keys of the position (see self._keys)
+        :param depth: number of moves to search, at least 1
+        :param first: a square to search first, or None
+        :return: (integer, integer)
+        """
+        alpha, beta = -self.grid.win_value - 1, self.grid.win_value + 1
+        best_square = best_score = None
+        open_squares = self.grid.all_squares & ~(mover | opponent)
+        for square in self._ordered_moves(open_squares, first):
+            score = self._move_score(square, mover, opponent, keys, depth,
+                                     alpha, beta)
+            if best_score is None or score > best_score:
+                best_square, best_score = square, score
+                alpha = max(alpha, score)
+        return best_square, best_score
+
+    def move_scores(self, mover, opponent, depth=None):
+        """
+        Scores every open square for the player about to move, searching
+        each with the full window so that the scores are exact (up to
+        `depth`) and not just bounds.
+
+        :param mover: mask of the squares of the player about to move
+        :param opponent: mask of the other player's squares
+        :param depth: most moves to search ahead, or None to search to the
+                    end of the game
+        :return: dictionary of {square: score}
+        """
+        open_squares = self.grid.all_squares & ~(mover | opponent)
+        if depth is None:
+            depth = square_count(open_squares)
+        keys = self._keys(mover, opponent)
+        alpha, beta = -self.grid.win_value - 1, self.grid.win_value + 1
+        return dict((square, self._move_score(square, mover, opponent, keys,
+                                              depth, alpha, beta))
+                    for square in self._ordered_moves(open_squares))
+
+
+class ClassicEngine(object):
+    """
+    Plays the usual 3 x 3 game through a GridEngine, with the same interface
+    as Engine in ttt.py, so it can be passed to TicTacToeBoard:
+
+        TicTacToeBoard(ClassicEngine())
+
+    The 3 x 3 game is small enough to search to the end on every move, so
+    the costs are exactly the ones Engine gets from its solver.
+
+    Public methods:
+        best_squares
+        potential_moves
+
+    """
+    def __init__(self, engine=None, metrics=None, tie_breaker=None):
+        """
+        :param engine: GridEngine for a 3 x 3 Grid. Defaults to a new one.
+        :param metrics: Metrics that TicTacToeBoard times its moves in.
+                    Defaults to new, enabled Metrics.
+        :param tie_breaker: TieBreaker for boards that aren't given one.
+                    Defaults to a new, unseeded TieBreaker.
+        """
+        super(ClassicEngine, self).__init__()
+        self.engine = GridEngine(Grid(3, 3)) if engine is None else engine
+        self.metrics = Metrics() if metrics is None else metrics
+        self.tie_breaker = TieBreaker() if tie_breaker is None else tie_breaker
+
+    def best_squares(self, board, rank=None):
+        """
+        Finds the equally good best squares for the computer on a board, in
+        the same format as Engine.best_squares.
+
+        :param board: integer representing a board
+        :param rank: board_rank(board), which isn't needed here
+        :return: sorted tuple of integers
+        :raises: InvalidStateException
+        """
+        potential_moves = self.potential_moves(board)
+        best_cost = max(potential_moves.values())
+        return tuple(sorted(square for square, cost in potential_moves.items()
+                            if cost == best_cost))
+
+    def potential_moves(self, board):
+        """
+        Finds the cost of each move the computer could make on a board, in
+        the same format as Engine.potential_moves.
+
+        :param board: integer representing a board
+        :return: dictionary of {square: cost}
+        :raises: InvalidStateException
+        """
+        human, computer = [sum(1 << CLASSIC_SQUARES[square] for square in range(9)
+                               if mask & (1 << square))
+                           for mask in split_board(board)]
+        scores = self.engine.move_scores(computer, human)
+        if not scores:
+            # let the UI handle it
+            raise InvalidStateException("No valid moves for the computer")
+        return dict((CLASSIC_LABELS[square], score)
+                    for square, score in scores.items())
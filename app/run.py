@@ -1,17 +1,30 @@
 """
 UI classes for running this app. Logic can be found in ttt.py.
 """
+import concurrent.futures
+import functools
+import os
+import threading
+
 import kivy
 kivy.require('1.8.0')
 
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 
-from ttt import TicTacToeBoard 
+from stats import StatsStore
+from ttt import HUMAN, TicTacToeBoard 
 
+STATS_FILE = 'stats.sqlite3'
 HUMAN_NAME = "[color=c60f13]You[/color] "
 COMPUTER_NAME = "[color=2ba6cb]Josh[/color] "
+THINKING_TEXT = "[color=000000]Thinking...[/color]"
+
+# the computer's moves are worked out here, one at a time, so that a search
+# never holds up drawing the screen
+MOVE_WORKER = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
 
 class OpeningFrame(BoxLayout):
@@ -21,17 +34,48 @@ class OpeningFrame(BoxLayout):
 
 class TicTacToeFrame(BoxLayout):
     """Screen where game is played. Layout in tictactoe.kv"""
-    board = TicTacToeBoard()
     
-    def computer_move(self):
+    def __init__(self, **kwargs):
+        # every frame plays its own game, sharing the engine with the others.
+        # The layout reads the board as it's built, so it has to exist first.
+        self.board = TicTacToeBoard(stats=getattr(App.get_running_app(), 'stats', None))
+        self.thinking = False
+        super(TicTacToeFrame, self).__init__(**kwargs)
+    
+    def computer_move(self, turn_text=""):
+        """
+        Computer starts its turn on MOVE_WORKER, showing that it's thinking.
+        The player's clicks are ignored until the move comes back.
+        
+        :param turn_text: what the turn label should say once the computer
+                has moved
+        """
+        self.thinking = True
+        self.set_turn_label(THINKING_TEXT)
+        future = MOVE_WORKER.submit(self.board.computer_move)
+        future.add_done_callback(lambda future: Clock.schedule_once(
+            functools.partial(self.computer_moved, future, turn_text)))
+    
+    def computer_moved(self, future, turn_text, dt):
         """
-        Computer takes a turn, then returns if game is finished and who won
+        Shows the computer's move once it's been worked out. Called by the
+        Clock, on the UI thread.
         
-        :return: (boolean, integer)
+        :param future: concurrent.futures.Future of the computer's move
+        :param turn_text: what the turn label should say now
+        :param dt: argument passed by kivy, but not used by this function
         """
-        square, game_over, winner = self.board.computer_move()
+        self.thinking = False
+        self.set_turn_label(turn_text)
+        square, game_over, winner = future.result()
         self.set_square(square)
-        return game_over, winner
+        if game_over:
+            self.game_over()
+    
+    def game_over(self):
+        """Shows the scores and the 'Start Another Game' button"""
+        self.update_scores()
+        self.set_new_game_button(hide=False)
     
     def player_move(self, square):
         """
@@ -39,17 +83,17 @@ class TicTacToeFrame(BoxLayout):
         
         :param square: integer of the square that the player just selected
         """
+        if self.thinking:
+            return
         self.set_turn_label("")
         
         square, game_over, winner = self.board.human_move(square)
         self.set_square(square)
         
-        if not game_over:
-            game_over, winner = self.computer_move()
-
         if game_over:
-            self.update_scores()
-            self.set_new_game_button(hide=False)
+            self.game_over()
+        elif self.board.is_computer_turn():
+            self.computer_move()
     
     def player_text(self, player_number):
         """
@@ -63,6 +107,21 @@ class TicTacToeFrame(BoxLayout):
             name_text = COMPUTER_NAME
         return name_text + self.board.player_stats(player_number)
     
+    def redo_move(self, btn):
+        """
+        Plays the player's last undone move again, along with the computer's
+        reply to it
+        
+        :param button: argument passed by kivy, but not used by this function
+        """
+        if self.thinking:
+            return
+        was_over = self.board.game_over
+        square, game_over, winner = self.board.redo_move()
+        while square is not None and self.board.is_computer_turn() and not game_over:
+            square, game_over, winner = self.board.redo_move()
+        self.update_game(was_over)
+    
     def reset_game(self, btn):
         """
         Resets the game board (but not the scores) for another game
@@ -74,8 +133,7 @@ class TicTacToeFrame(BoxLayout):
         self.update_squares()
         
         if self.board.is_computer_turn():
-            self.computer_move()
-            self.set_turn_label("[color=000000]Now your turn...[/color]")
+            self.computer_move("[color=000000]Now your turn...[/color]")
         else:
             self.set_turn_label("[color=000000]You go first...[/color]")
     
@@ -127,6 +185,35 @@ class TicTacToeFrame(BoxLayout):
         """
         return self.board.get_square_label(square)
     
+    def undo_move(self, btn):
+        """
+        Takes back the player's last move, along with the computer's reply
+        to it, so the player can try another square
+        
+        :param button: argument passed by kivy, but not used by this function
+        """
+        if self.thinking or not any(player == HUMAN for square, player, scored
+                                    in self.board.history_moves()):
+            return
+        
+        was_over = self.board.game_over
+        while self.board.history_moves()[-1][1] != HUMAN:
+            self.board.undo_move()
+        self.board.undo_move()
+        self.update_game(was_over)
+    
+    def update_game(self, was_over):
+        """
+        Updates the squares, the scores and the 'Start Another Game' button
+        after moves were taken back or played again
+        
+        :param was_over: boolean, whether the game was over beforehand
+        """
+        self.update_squares()
+        self.update_scores()
+        if was_over != self.board.game_over:
+            self.set_new_game_button(hide=was_over)
+    
     def update_scores(self):
         """Updates the text displaying player scores"""
         self.player1_score.text = self.player_text(1)
@@ -163,7 +250,7 @@ class ExitFrame(BoxLayout):
         :return: string
         """
         try:
-            return "%s\n%s" % (HUMAN_NAME, self.board.player_wins)
+            return "%s\n%s" % (HUMAN_NAME, self.board.scores()[0])
         except AttributeError:
             # the tic-tac-toe screen hasn't passed control over yet
             return ""
@@ -175,7 +262,7 @@ class ExitFrame(BoxLayout):
         :return: string
         """
         try:
-            return "%s\n%s" % (COMPUTER_NAME, self.board.player_losses)
+            return "%s\n%s" % (COMPUTER_NAME, self.board.scores()[1])
         except AttributeError:
             # the tic-tac-toe screen hasn't passed control over yet
             return ""
@@ -187,7 +274,7 @@ class ExitFrame(BoxLayout):
         :return: string
         """
         try:
-            return "[color=e2c925]Ties[/color]: %s" % self.board.ties
+            return "[color=e2c925]Ties[/color]: %s" % self.board.scores()[2]
         except AttributeError:
             # yes, we know tic-tac-toe screen still has control of the board
             return ""
@@ -204,6 +291,9 @@ class TicTacToeApp(App):
     """Primary class for running the game"""
     
     def build(self):
+        # the player's results are kept between runs of the app
+        self.stats = StatsStore(os.path.join(self.user_data_dir, STATS_FILE))
+        
         # the three screens we'll use for this game
         self.root = BoxLayout()
         self.opening = OpeningFrame()
@@ -212,6 +302,11 @@ class TicTacToeApp(App):
         
         self.exit_screen.board = self.tic_tac_toe.board
         self.root.add_widget(self.opening)
+        
+        # get the computer's first moves ready while the opening screen is up
+        self.prewarm = threading.Thread(target=self.tic_tac_toe.board.engine.prewarm)
+        self.prewarm.daemon = True
+        self.prewarm.start()
         return self.root
     
     def load_game(self):
@@ -224,6 +319,10 @@ class TicTacToeApp(App):
         self.exit_screen.update_text()
         self.root.remove_widget(self.tic_tac_toe)
         self.root.add_widget(self.exit_screen)
+    
+    def on_stop(self):
+        """Writes out any results that are still waiting to be saved"""
+        self.stats.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,398 @@
+"""
+Headless game server: hosts any number of game sessions over a local TCP
+connection, without Kivy. Start it from the project root with:
+
+    python -m app.server --port 8765
+
+Clients send one JSON object per line and get one JSON object back per line,
+in the same order. Every request has an "op", and every response has "ok"
+and "ms", the time the server spent on the request in milliseconds:
+
+    {"op": "new", "first": "computer"}     starts a session
+    {"op": "move", "id": ..., "square": 4}  plays a square, and the
+                                            computer answers
+    {"op": "state", "id": ...}              the board of a session
+    {"op": "reset", "id": ...}              starts another game in a session
+    {"op": "end", "id": ...}                closes a session
+    {"op": "stats"}                         sessions, a latency histogram
+                                            per op (see Metrics in
+                                            app/ttt.py) and the engine's
+                                            metrics
+    {"op": "leaderboard", "count": 10}      the players with the most wins
+
+Responses about a session carry its "id", "board", "turn", "computer" (the
+square the computer just played, or null), "game_over" and "winner" (1 for
+the human, 2 for the computer, null for a tie or an unfinished game).
+A "new" request can also give an integer "seed", so that the computer's
+choices between equally good moves can be replayed, and a "player" name.
+When the server is started with --stats, the results of named players'
+games are kept in a StatsStore (see app/stats.py) for the leaderboard.
+Sessions that haven't been used for `ttl` seconds are closed.
+
+All sessions share one Engine. Positions in its solved table are answered
+straight away; anything that would need a search runs in a thread pool, so
+the event loop is never held up by a solve.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import secrets
+import time
+
+from app.stats import StatsStore
+from app.ttt import (COMPUTER, ENGINE, HUMAN, GameState, InvalidStateException,
+                     Metrics, TieBreaker, board_winner)
+
+
+SESSION_TTL = 300
+MAX_SESSIONS = 100000
+REAP_INTERVAL = 10
+
+
+class RequestError(Exception):
+    pass
+
+
+class Session(object):
+    """One client's game, with the time it was last used."""
+
+    __slots__ = ('state', 'touched', 'lock', 'tie_breaker', 'player')
+
+    def __init__(self, tie_breaker=None, player=None):
+        """
+        :param tie_breaker: TieBreaker for the computer's moves, or None to
+                    use the Engine's
+        :param player: string name the results are kept under, or None
+        :attr state: GameState, played by the server's Engine
+        :attr touched: time.monotonic() of the last request for the session
+        :attr lock: asyncio.Lock so one request at a time plays the game
+        """
+        super(Session, self).__init__()
+        self.state = GameState()
+        self.touched = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.tie_breaker = tie_breaker
+        self.player = player
+
+
+class GameServer(object):
+    """
+    Keeps the sessions and answers requests for them (see the module
+    docstring for the protocol).
+
+    Public methods:
+        close
+        expire_sessions
+        handle_client
+        handle_request
+        start
+
+    """
+    def __init__(self, engine=None, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS,
+                 executor=None, stats=None):
+        """
+        :param engine: Engine shared by every session. Defaults to the
+                    global ENGINE.
+        :param ttl: seconds a session can go unused before it's closed
+        :param max_sessions: most sessions to keep open at once
+        :param executor: concurrent.futures.Executor for moves that need a
+                    search. Defaults to a new ThreadPoolExecutor.
+        :param stats: StatsStore for named players' results, or None to
+                    keep none
+        :attr sessions: dictionary of session ids paired with Sessions
+        :attr metrics: Metrics timing the requests, by op
+        :attr offloaded: integer count of moves sent to the executor
+        :attr server: asyncio.Server, once started
+        :attr reaper: asyncio.Task closing unused sessions, once started
+        """
+        super(GameServer, self).__init__()
+        self.engine = ENGINE if engine is None else engine
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        self.executor = executor
+        self.stats = stats
+        self.sessions = {}
+        self.metrics = Metrics()
+        self.offloaded = 0
+        self.server = None
+        self.reaper = None
+        self.ops = {'new': self._new, 'move': self._move, 'state': self._state,
+                    'reset': self._reset, 'end': self._end,
+                    'stats': self._stats, 'leaderboard': self._leaderboard}
+
+    async def _computer_move(self, session):
+        """
+        Lets the computer move in a session, if it's the computer's turn.
+        Boards that aren't in the solved table are played in the executor.
+
+        :param session: Session
+        :return: integer square, or None
+        :raises: RequestError
+        """
+        state = session.state
+        if not state.turn or state.game_over:
+            return None
+        try:
+            if self.engine.in_table(state.board):
+                square = self.engine.computer_move(state, session.tie_breaker)[0]
+            else:
+                self.offloaded += 1
+                loop = asyncio.get_running_loop()
+                square = (await loop.run_in_executor(
+                    self.executor, self.engine.computer_move, state,
+                    session.tie_breaker))[0]
+        except InvalidStateException as error:
+            raise RequestError(str(error))
+        return square
+
+    def _describe(self, session_id, session, computer=None):
+        """
+        Builds the response about a session.
+
+        :param session_id: string
+        :param session: Session
+        :param computer: the square the computer just played, or None
+        :return: dictionary
+        """
+        state = session.state
+        return {'id': session_id, 'board': state.board, 'turn': state.turn,
+                'computer': computer, 'game_over': state.game_over,
+                'winner': board_winner(state.board)}
+
+    def _session(self, request):
+        """
+        Finds the session a request is for, and marks it as used.
+
+        :param request: dictionary
+        :return: (string, Session)
+        :raises: RequestError
+        """
+        session_id = request.get('id')
+        if not isinstance(session_id, str):
+            raise RequestError("'id' must be a string")
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise RequestError("No session %r" % (session_id,))
+        session.touched = time.monotonic()
+        return session_id, session
+
+    async def _new(self, request):
+        first = request.get('first', 'human')
+        if first not in ('human', 'computer'):
+            raise RequestError("'first' must be 'human' or 'computer'")
+        seed = request.get('seed')
+        if seed is not None and not isinstance(seed, int):
+            raise RequestError("'seed' must be an integer")
+        player = request.get('player')
+        if player is not None and not isinstance(player, str):
+            raise RequestError("'player' must be a string")
+        if len(self.sessions) >= self.max_sessions:
+            self.expire_sessions()
+            if len(self.sessions) >= self.max_sessions:
+                raise RequestError("Too many sessions")
+
+        session_id = secrets.token_hex(8)
+        session = self.sessions[session_id] = Session(
+            None if seed is None else TieBreaker(seed), player)
+        session.state.turn = int(first == 'computer')
+        async with session.lock:
+            computer = await self._computer_move(session)
+            return self._describe(session_id, session, computer)
+
+    async def _move(self, request):
+        session_id, session = self._session(request)
+        async with session.lock:
+            state = session.state
+            if state.game_over:
+                raise RequestError("The game is over")
+            if state.turn:
+                raise RequestError("It's the computer's turn")
+            square = request.get('square')
+            if not isinstance(square, int) or isinstance(square, bool):
+                raise RequestError("'square' must be an integer")
+            if self.engine.human_move(state, square)[0] is None:
+                raise RequestError("Illegal move %r" % (square,))
+            computer = await self._computer_move(session)
+            if state.game_over:
+                self._record(session)
+            return self._describe(session_id, session, computer)
+
+    def _record(self, session):
+        """
+        Counts the result of a finished game for the session's player, if
+        results are kept. It's only buffered, so it never waits on the disk.
+
+        :param session: Session
+        """
+        if self.stats is None or session.player is None:
+            return
+        winner = board_winner(session.state.board)
+        self.stats.add(session.player, int(winner == HUMAN), int(winner == COMPUTER),
+                       int(winner is None))
+
+    async def _state(self, request):
+        session_id, session = self._session(request)
+        # an offloaded move may be changing the state
+        async with session.lock:
+            return self._describe(session_id, session)
+
+    async def _reset(self, request):
+        session_id, session = self._session(request)
+        async with session.lock:
+            # like TicTacToeBoard.reset_board, whoever's turn it is goes first
+            session.state.board = 0
+            session.state.game_over = False
+            computer = await self._computer_move(session)
+            return self._describe(session_id, session, computer)
+
+    async def _end(self, request):
+        session_id, session = self._session(request)
+        del self.sessions[session_id]
+        return {'id': session_id}
+
+    async def _leaderboard(self, request):
+        count = request.get('count', 10)
+        if not isinstance(count, int) or count < 1:
+            raise RequestError("'count' must be a positive integer")
+        if self.stats is None:
+            raise RequestError("The server isn't keeping results")
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(self.executor, self.stats.leaderboard, count)
+        return {'players': [{'name': name, 'wins': wins, 'losses': losses, 'ties': ties}
+                            for name, wins, losses, ties in rows]}
+
+    async def _stats(self, request):
+        # the engine's snapshot waits for its lock, which a solve in the
+        # executor holds until it's done
+        loop = asyncio.get_running_loop()
+        engine = await loop.run_in_executor(self.executor, self.engine.snapshot)
+        return {'sessions': len(self.sessions), 'offloaded': self.offloaded,
+                'latency': self.metrics.snapshot()['latency'], 'engine': engine}
+
+    def expire_sessions(self, now=None):
+        """
+        Closes every session that hasn't been used for self.ttl seconds.
+
+        :param now: time.monotonic() to measure from. Defaults to now.
+        :return: integer count of sessions closed
+        """
+        if now is None:
+            now = time.monotonic()
+        expired = [session_id for session_id, session in self.sessions.items()
+                   if now - session.touched > self.ttl]
+        for session_id in expired:
+            del self.sessions[session_id]
+        return len(expired)
+
+    async def handle_request(self, request):
+        """
+        Answers a single request, timing how long it takes.
+
+        :param request: dictionary
+        :return: dictionary
+        """
+        start = time.perf_counter()
+        op = request.get('op') if isinstance(request, dict) else None
+        try:
+            if op not in self.ops:
+                raise RequestError("Unknown op %r" % (op,))
+            response = await self.ops[op](request)
+            response['ok'] = True
+        except RequestError as error:
+            response = {'ok': False, 'error': str(error)}
+        except Exception as error:
+            # a bad request must never close the connection
+            response = {'ok': False, 'error': "Internal error: %r" % (error,)}
+        ms = 1000 * (time.perf_counter() - start)
+        response['ms'] = ms
+        if op in self.ops:
+            self.metrics.observe(op, start)
+        return response
+
+    async def handle_client(self, reader, writer):
+        """
+        Answers the requests on one connection until the client closes it.
+
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {'ok': False, 'error': "Requests must be JSON",
+                                'ms': 0.0}
+                else:
+                    response = await self.handle_request(request)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _reap(self, interval):
+        """Closes unused sessions every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            self.expire_sessions()
+
+    async def start(self, host='127.0.0.1', port=8765, reap_interval=REAP_INTERVAL):
+        """
+        Starts listening for clients, and closing unused sessions in the
+        background.
+
+        :param host: address to listen on
+        :param port: port to listen on, or 0 for any free port
+        :param reap_interval: seconds between checks for unused sessions
+        :return: asyncio.Server
+        """
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        self.reaper = asyncio.ensure_future(self._reap(reap_interval))
+        return self.server
+
+    async def close(self):
+        """Stops listening for clients and closing unused sessions."""
+        self.reaper.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def serve(host, port, ttl, stats_path=None):
+    """Runs a GameServer until the process is stopped."""
+    stats = None if stats_path is None else StatsStore(stats_path)
+    game_server = GameServer(ttl=ttl, stats=stats)
+    server = await game_server.start(host, port)
+    print("Serving on %s:%s" % server.sockets[0].getsockname()[:2])
+    try:
+        await server.serve_forever()
+    finally:
+        await game_server.close()
+        if stats is not None:
+            stats.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ttl', type=float, default=SESSION_TTL,
+                        help="seconds before an unused session is closed")
+    parser.add_argument('--stats', metavar='PATH',
+                        help="SQLite file to keep named players' results in")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.ttl, args.stats))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Self-play simulator that checks that the computer never loses. It plays the
+computer's moves against three kinds of opponent, with either side moving
+first, spread across a pool of processes:
+
+    random - plays any open square
+    greedy - wins if it can, blocks if it has to, and otherwise plays
+             randomly
+    exhaustive - plays every possible game: every human move, against every
+             move the computer might choose
+
+Run it from the project root with, for example:
+
+    python -m app.simulate --games 1000000
+
+It prints the totals and games per second for each opponent, and the moves
+of any game the computer lost, and exits with status 1 if there were any.
+"""
+import argparse
+import collections
+import concurrent.futures
+import os
+import random
+import sys
+import time
+
+from app.ttt import (COMPUTER, ENGINE, HUMAN, SQUARE_MOVES, GameState,
+                     TieBreaker, board_winner, is_board_full, open_squares)
+
+
+OPPONENTS = ('random', 'greedy', 'exhaustive')
+CHUNK_SIZE = 10000
+MAX_LOSSES = 10
+
+
+def random_move(board, rng):
+    """
+    Picks any open square.
+
+    :param board: integer representing a board
+    :param rng: random.Random
+    :return: integer
+    """
+    return rng.choice(open_squares(board))
+
+
+def greedy_move(board, rng):
+    """
+    Picks a square that wins straight away, or else one that stops the
+    computer from winning on its next move, or else any open square.
+
+    :param board: integer representing a board
+    :param rng: random.Random
+    :return: integer
+    """
+    squares = open_squares(board)
+    for player in (HUMAN, COMPUTER):
+        for square in squares:
+            if board_winner(board | SQUARE_MOVES[player][square]) == player:
+                return square
+    return rng.choice(squares)
+
+
+STRATEGIES = {'random': random_move, 'greedy': greedy_move}
+
+
+def format_moves(moves):
+    """
+    Writes out the moves of a game, like 'H4 C0 H8'.
+
+    :param moves: list of (player, square) tuples
+    :return: string
+    """
+    return ' '.join('%s%s' % ('HC'[player - 1], square) for player, square in moves)
+
+
+def new_results():
+    """
+    Creates an empty tally of games.
+
+    :return: dictionary of 'games', 'wins', 'ties' and 'losses' (from the
+                computer's point of view), 'losing_games', the moves of up to
+                MAX_LOSSES lost games, and 'seconds' spent playing them
+    """
+    return {'games': 0, 'wins': 0, 'ties': 0, 'losses': 0, 'losing_games': [],
+            'seconds': 0.0}
+
+
+def add_results(results, other):
+    """
+    Adds the tally of `other` to `results`.
+
+    :param results: dictionary from new_results
+    :param other: dictionary from new_results
+    """
+    for key in ('games', 'wins', 'ties', 'losses', 'seconds'):
+        results[key] += other[key]
+    results['losing_games'].extend(other['losing_games'][:MAX_LOSSES -
+                                                         len(results['losing_games'])])
+
+
+def _record_game(results, winner, moves):
+    """Adds a single finished game to a tally."""
+    results['games'] += 1
+    if winner == COMPUTER:
+        results['wins'] += 1
+    elif winner == HUMAN:
+        results['losses'] += 1
+        if len(results['losing_games']) < MAX_LOSSES:
+            results['losing_games'].append(format_moves(moves))
+    else:
+        results['ties'] += 1
+
+
+def play_game(strategy, computer_first, rng, engine=ENGINE, tie_breaker=None):
+    """
+    Plays one game of the computer against a strategy.
+
+    :param strategy: function taking a board and rng, and returning a square
+    :param computer_first: boolean
+    :param rng: random.Random for the strategy
+    :param engine: Engine to play the computer's moves
+    :param tie_breaker: TieBreaker for the computer. Defaults to the
+                engine's.
+    :return: (winner or None, list of (player, square) tuples)
+    """
+    state = GameState(turn=int(computer_first))
+    moves = []
+    winner = None
+    while not state.game_over:
+        if state.turn:
+            square, game_over, winner = engine.computer_move(state, tie_breaker)
+            moves.append((COMPUTER, square))
+        else:
+            square, game_over, winner = engine.human_move(state,
+                                                          strategy(state.board, rng))
+            moves.append((HUMAN, square))
+    return winner, moves
+
+
+def play_games(opponent, computer_first, games, seed, engine=ENGINE):
+    """
+    Plays a batch of games against the 'random' or 'greedy' opponent.
+
+    :param opponent: name of a strategy in STRATEGIES
+    :param computer_first: boolean
+    :param games: number of games to play
+    :param seed: seed for both players' random choices
+    :param engine: Engine to play the computer's moves
+    :return: dictionary from new_results
+    """
+    rng = random.Random(seed)
+    tie_breaker = TieBreaker(seed)
+    strategy = STRATEGIES[opponent]
+    results = new_results()
+    for game in range(games):
+        _record_game(results, *play_game(strategy, computer_first, rng, engine,
+                                         tie_breaker))
+    return results
+
+
+def best_squares(board, engine=ENGINE):
+    """
+    Lists every square the computer might choose on a board.
+
+    :param board: integer representing a board
+    :param engine: Engine to find the computer's moves
+    :return: list of integers
+    """
+    return list(engine.best_squares(board))
+
+
+def explore(board, computer_turn, moves=(), engine=ENGINE):
+    """
+    Plays out every game from a position: every open square for the human,
+    and every square the computer might choose between.
+
+    :param board: integer representing a board
+    :param computer_turn: boolean
+    :param moves: tuple of (player, square) tuples that led to the board
+    :param engine: Engine to find the computer's moves
+    :return: dictionary from new_results
+    """
+    results = new_results()
+    winner = board_winner(board)
+    if winner or is_board_full(board):
+        _record_game(results, winner, moves)
+        return results
+
+    if computer_turn:
+        player = COMPUTER
+        squares = best_squares(board, engine)
+    else:
+        player = HUMAN
+        squares = open_squares(board)
+    for square in squares:
+        add_results(results, explore(board | SQUARE_MOVES[player][square],
+                                     not computer_turn, moves + ((player, square),),
+                                     engine))
+    return results
+
+
+def _run_task(task):
+    """
+    Runs a task from _tasks in a worker process.
+
+    :param task: (opponent, computer_first, games or first move, seed)
+    :return: (opponent, dictionary from new_results)
+    """
+    opponent, computer_first, size, seed = task
+    start = time.time()
+    if opponent == 'exhaustive':
+        # each task explores the games after one human or computer opening
+        player = [HUMAN, COMPUTER][computer_first]
+        results = explore(SQUARE_MOVES[player][size], not computer_first,
+                          ((player, size),))
+    else:
+        results = play_games(opponent, computer_first, size, seed)
+    results['seconds'] = time.time() - start
+    return opponent, results
+
+
+def _tasks(opponents, games, seed):
+    """
+    Splits the games for each opponent into tasks for the process pool.
+
+    :param opponents: names from OPPONENTS
+    :param games: number of games against each random opponent
+    :param seed: seed for the first task; each task gets its own
+    :return: list of tasks for _run_task
+    """
+    tasks = []
+    for opponent in opponents:
+        for computer_first in (False, True):
+            if opponent == 'exhaustive':
+                # one task for each opening the first player might choose
+                openings = range(9)
+                if computer_first:
+                    openings = best_squares(0)
+                tasks.extend((opponent, computer_first, square, None)
+                             for square in openings)
+                continue
+            # either side moves first in half of the games
+            remaining = games // 2 + (games % 2 if computer_first else 0)
+            while remaining > 0:
+                size = min(CHUNK_SIZE, remaining)
+                tasks.append((opponent, computer_first, size, seed + len(tasks)))
+                remaining -= size
+    return tasks
+
+
+def simulate(opponents=OPPONENTS, games=100000, processes=None, seed=0):
+    """
+    Plays games against each opponent across a pool of processes.
+
+    :param opponents: names from OPPONENTS
+    :param games: number of games against each of the random opponents; the
+                exhaustive opponent always plays every possible game
+    :param processes: number of worker processes. Defaults to one per CPU.
+    :param seed: seed for the random choices of the first batch of games
+    :return: OrderedDict of opponents paired with their results (see
+                new_results), where 'seconds' is the time the workers spent
+    """
+    summary = collections.OrderedDict((opponent, new_results()) for opponent in opponents)
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        for opponent, results in executor.map(_run_task, _tasks(opponents, games, seed)):
+            add_results(summary[opponent], results)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--games', type=int, default=1000000,
+                        help="games against each random opponent")
+    parser.add_argument('--opponents', nargs='+', choices=OPPONENTS,
+                        default=list(OPPONENTS))
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    summary = simulate(args.opponents, args.games, args.processes, args.seed)
+    total = new_results()
+    for results in summary.values():
+        add_results(total, results)
+    # each opponent's rate is per worker; the total's is across all of them
+    total['seconds'] = time.time() - start
+    summary['total'] = total
+
+    print("%-12s %10s %10s %10s %8s %12s" % ('opponent', 'games', 'wins', 'ties',
+                                             'losses', 'games/sec'))
+    for opponent, results in summary.items():
+        print("%-12s %10s %10s %10s %8s %12.0f" % (
+            opponent, results['games'], results['wins'], results['ties'],
+            results['losses'], results['games'] / max(results['seconds'], 1e-9)))
+        if opponent != 'total':
+            for moves in results['losing_games']:
+                print("    lost: %s" % moves)
+    return int(bool(total['losses']))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Wins, losses and ties for any number of players, kept in a SQLite database
+so they survive restarts. Results are counted in memory as games end and
+written in batches by a background thread, so finishing a game never waits
+on the disk:
+
+    store = StatsStore('stats.sqlite3')
+    board = TicTacToeBoard(stats=store, player_name='ada')
+    ...
+    store.leaderboard(10)
+    store.close()
+
+Every count is from the human player's point of view: a win is a game the
+player won against the computer.
+"""
+import os
+import sqlite3
+import threading
+
+
+STATS_PATH = os.path.join(os.path.expanduser('~'), '.tictactoe', 'stats.sqlite3')
+FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    name TEXT PRIMARY KEY,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    ties INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS players_by_wins ON players (wins DESC, losses, name);
+"""
+
+
+class StatsStore(object):
+    """
+    A SQLite table of every player's results, with a write buffer in front
+    of it. add only touches the buffer; a writer thread flushes it every
+    `flush_interval` seconds, or as soon as `batch_size` players are waiting,
+    in one transaction. Reads include whatever is still in the buffer, so
+    they're never behind. Safe to share between threads.
+
+    Public methods:
+        add
+        close
+        flush
+        get
+        leaderboard
+
+    """
+    def __init__(self, path=STATS_PATH, flush_interval=FLUSH_INTERVAL,
+                 batch_size=BATCH_SIZE):
+        """
+        Opens the database, creating it if it's missing, and starts the
+        writer thread.
+
+        :param path: location of the database file, or ':memory:'
+        :param flush_interval: most seconds a result waits in the buffer
+        :param batch_size: players in the buffer that start a flush early
+        :attr pending: dictionary of player names paired with [wins, losses,
+                    ties] not written yet
+        :attr flushes: integer count of batches written
+        :attr lock: lock guarding self.pending
+        :attr writer: the writer threading.Thread
+        """
+        super(StatsStore, self).__init__()
+        directory = os.path.dirname(path)
+        if path != ':memory:' and directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        if path != ':memory:':
+            # readers don't block the writer, and a batch needs one sync
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending = {}
+        self.flushes = 0
+        self.lock = threading.Lock()
+        self._database_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def _write_loop(self):
+        """Flushes the buffer in the background until the store is closed."""
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # the batch went back into the buffer, to try again later
+                pass
+
+    def add(self, player, wins=0, losses=0, ties=0):
+        """
+        Counts results for a player. Negative counts take results back.
+
+        :param player: string name of the player
+        :param wins: integer
+        :param losses: integer
+        :param ties: integer
+        """
+        with self.lock:
+            counts = self.pending.setdefault(player, [0, 0, 0])
+            counts[0] += wins
+            counts[1] += losses
+            counts[2] += ties
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def close(self):
+        """Stops the writer thread, writes what's left, and closes the database."""
+        self._closed = True
+        self._wake.set()
+        self.writer.join()
+        self.flush()
+        self.connection.close()
+
+    def flush(self):
+        """
+        Writes every buffered result in one transaction. If the write fails,
+        the results go back into the buffer.
+
+        The database lock is held from taking the buffer until the
+        transaction is committed, so that readers never see a batch that's
+        neither in the buffer nor in the database. add only needs self.lock,
+        so it never waits for the write.
+
+        :return: integer count of players written
+        :raises: sqlite3.Error
+        """
+        with self._database_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return 0
+            try:
+                with self.connection:
+                    self.connection.executemany(
+                        'INSERT OR IGNORE INTO players (name) VALUES (?)',
+                        [(player,) for player in pending])
+                    self.connection.executemany(
+                        'UPDATE players SET wins = wins + ?, losses = losses + ?, '
+                        'ties = ties + ? WHERE name = ?',
+                        [tuple(counts) + (player,) for player, counts in pending.items()])
+            except sqlite3.Error:
+                for player, counts in pending.items():
+                    self.add(player, *counts)
+                raise
+            self.flushes += 1
+        return len(pending)
+
+    def get(self, player):
+        """
+        Looks up a player's results, including any that haven't been written.
+
+        :param player: string name of the player
+        :return: (wins, losses, ties), all 0 for a player with no games
+        """
+        # both reads under the database lock, so a flush can't move results
+        # from the buffer to the database in between
+        with self._database_lock:
+            row = self.connection.execute(
+                'SELECT wins, losses, ties FROM players WHERE name = ?',
+                (player,)).fetchone()
+            with self.lock:
+                pending = self.pending.get(player, (0, 0, 0))
+        return tuple(saved + waiting for saved, waiting
+                     in zip(row or (0, 0, 0), pending))
+
+    def leaderboard(self, count=10):
+        """
+        Finds the players with the most wins, breaking ties by fewest losses
+        and then by name. Flushes the buffer first.
+
+        :param count: most players to list
+        :return: list of (name, wins, losses, ties)
+        """
+        self.flush()
+        with self._database_lock:
+            return self.connection.execute(
+                'SELECT name, wins, losses, ties FROM players '
+                'ORDER BY wins DESC, losses, name LIMIT ?', (count,)).fetchall()
@@ -2,13 +2,23 @@
 Functions and classes for playing the game. The UI classes can be found in
 run.py
 """
+import array
+import collections
+import itertools
+import mmap
+import os
 import random
+import struct
+import sys
+import threading
+import time
 
 
 WINNING_MOVES = (0x2a000, 0x20202, 0x20028, 0x08082,  
                  0x02a00, 0x02022, 0x0080a, 0x002a0)
 
-# a cache to minimize calculation, populated with some default starting values.
+# hand-picked moves for the start of the game, which app/build_book.py and
+# app/build_table.py use in place of the solver's moves for these positions.
 #
 # Ideally for opening moves the computer should always take a corner or the
 # center, and if the human player is going first, the computer should take
@@ -17,17 +27,18 @@ WINNING_MOVES = (0x2a000, 0x20202, 0x20028, 0x08082,
 # This could be set so the computer always makes the same move in response to
 # a human move, but it seems more interesting and challenging to the player if
 # the computer has multiple possibilities of equal cost to choose from
-# when possible.
-PLAYBOOK = {(0x00000, 2): {8: -100, 6: -100, 4: -100, 2: -100},
-            (0x20000, 2): {0: -100},
-            (0x02000, 2): {0: -100},
-            (0x00200, 2): {0: -100},
-            (0x00020, 2): {0: -100},
-            (0x00002, 2): {8: -100, 6: -100, 4: -100, 2: -100},
-            (0x08000, 2): {8: -100, 6: -100},
-            (0x00800, 2): {6: -100, 4: -100},
-            (0x00080, 2): {4: -100, 2: -100},
-            (0x00008, 2): {8: -100, 2: -100}}
+# when possible. All of these moves lead to a tie with perfect play, so they
+# cost TIE_VALUE (0).
+OPENING_BOOK = {(0x00000, 2): {8: 0, 6: 0, 4: 0, 2: 0},
+                (0x20000, 2): {0: 0},
+                (0x02000, 2): {0: 0},
+                (0x00200, 2): {0: 0},
+                (0x00020, 2): {0: 0},
+                (0x00002, 2): {8: 0, 6: 0, 4: 0, 2: 0},
+                (0x08000, 2): {8: 0, 6: 0},
+                (0x00800, 2): {6: 0, 4: 0},
+                (0x00080, 2): {4: 0, 2: 0},
+                (0x00008, 2): {8: 0, 2: 0}}
 
 
 # values used when calculating the best move for the computer
@@ -35,17 +46,1614 @@ WIN_VALUE = 10
 LOSS_VALUE = -10
 TIE_VALUE = 0
 
+# results of the game tree search are kept in TRANSPOSITIONS (below), keyed by
+# canonical position (see canonical_masks). Each value is a (score, bound)
+# tuple, where the bound says whether the score is exact or only a lower or
+# upper bound on the real score. At most TRANSPOSITION_LIMIT are kept.
+TRANSPOSITION_LIMIT = 1 << 16
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# latencies are counted in buckets that double in width, from under 1
+# microsecond up to everything over LATENCY_BUCKETS - 2 bits of microseconds
+LATENCY_BUCKETS = 22
+
 HUMAN = 1
 COMPUTER = 2
 
-PLAYER1 = 'X'
-PLAYER2 = 'O'
+PLAYER1 = 'X'
+PLAYER2 = 'O'
+
+# name the human's results are kept under in a StatsStore (see app/stats.py)
+DEFAULT_PLAYER = 'player'
+
+# Bit primitives for the solver, built once at import. On any board the
+# high bit of each square (FULL_BOARD) says whether it is filled, and the low
+# bit says whether player 2 filled it.
+FULL_BOARD = 0x2aaaa
+
+# the integer to add to a board for each player taking each square
+SQUARE_MOVES = {HUMAN: tuple(2 << (2 * square) for square in range(9)),
+                COMPUTER: tuple(3 << (2 * square) for square in range(9))}
+
+# what each player taking each square adds to the base-3 rank of a board (see
+# board_rank), so a rank can be kept up to date one move at a time, the way a
+# Zobrist hash is, but without ever colliding
+RANK_MOVES = {HUMAN: tuple(3 ** square for square in range(9)),
+              COMPUTER: tuple(2 * 3 ** square for square in range(9))}
+
+# the open squares for each combination of filled squares
+_OPEN_SQUARES = dict((filled, tuple(square for square in range(9) 
+                                    if not filled & (2 << (2 * square))))
+                     for filled in (sum(2 << (2 * square) 
+                                        for square in range(9) if mask & (1 << square))
+                                    for mask in range(1 << 9)))
+
+# every player board (see player_board) with three in a row
+_WINNING_BOARDS = frozenset(filled for filled in _OPEN_SQUARES
+                            if any(filled & combo == combo for combo in WINNING_MOVES))
+
+
+def player_board(board, player):
+    """
+    Converts a board to one with only the indicated player's pieces, each of
+    them shown the way player 1's pieces are (1 0).
+    
+    :param board: integer representing a board
+    :param player: integer for the player, either 1 or 2
+    :return: integer
+    """
+    if player == COMPUTER:
+        return board & (board << 1) & FULL_BOARD
+    return board & ~(board << 1) & FULL_BOARD
+
+
+def board_winner(board):
+    """
+    Finds the player with three in a row on a board, if any.
+    
+    :param board: integer representing a board
+    :return: integer (1 or 2) or None
+    """
+    if board & ~(board << 1) & FULL_BOARD in _WINNING_BOARDS:
+        return HUMAN
+    if board & (board << 1) & FULL_BOARD in _WINNING_BOARDS:
+        return COMPUTER
+    return None
+
+
+def open_squares(board):
+    """
+    Finds the squares that nobody has played in yet.
+    
+    :param board: integer representing a board
+    :return: tuple of integers between 0 and 8
+    """
+    return _OPEN_SQUARES[board & FULL_BOARD]
+
+
+def is_board_full(board):
+    """
+    Determines if there are no open squares left on a board.
+    
+    :param board: integer representing a board
+    :return: boolean
+    """
+    return board & FULL_BOARD == FULL_BOARD
+
+
+# The solved position table is generated by `python -m app.build_table` and
+# holds the best moves for every position that can come up in a real game, so
+# the computer never has to search while playing. Each position has a 16-bit
+# record: the low nine bits are a mask of the equally good squares and the
+# next five bits hold the cost of those squares (offset by LOSS_VALUE), or 0
+# if the position isn't in the table. The file is the header, then one record
+# for every legal position, in position_id order, so a record is found by
+# indexing rather than searching. Only canonical positions (see
+# canonical_board) are solved, but each one's record is stored for all of its
+# rotations and reflections, so a board doesn't have to be turned around to
+# be looked up. Everything in the file is little-endian.
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
+                          'data', 'solved.bin')
+TABLE_MAGIC = b'TTTS'
+TABLE_VERSION = 4
+TABLE_HEADER = struct.Struct('<4sHHI')  # magic, version, unused, record count
+
+# The opening book written by app/build_book.py has the best moves for the
+# computer in every position up to BOOK_DEPTH moves into the game, in the
+# same layout as the solved table, but with its own magic and version
+# and the depth it was built to in the unused header field. It's only read
+# the first time an Engine needs a position that isn't in its playbook.
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'data', 'book.bin')
+BOOK_MAGIC = b'TTTB'
+BOOK_VERSION = 3
+BOOK_DEPTH = 4
+
+# one slot per (board, player) in PlaybookArray
+PLAYBOOK_SLOTS = 2 * 3 ** 9
+# the position_id of a position that isn't legal (see is_legal_position)
+NO_POSITION = 0xffff
+
+
+
+def _half_ranks():
+    """
+    Builds the base-3 rank of every ten-bit half board, each from the rank
+    of the same half without its lowest square, which keeps import fast.
+    
+    :return: list of integers
+    """
+    digits = (0, 0, 1, 2)  # empty, empty, player 1, player 2
+    ranks = [0] * (1 << 10)
+    for half in range(1, 1 << 10):
+        ranks[half] = digits[half & 3] + 3 * ranks[half >> 2]
+    return ranks
+
+
+# base-3 rank of each half of the board: squares 0-4 are the low ten bits and
+# squares 5-8 are the high eight bits. An empty square counts as 0, player 1
+# as 1 and player 2 as 2.
+_RANK_LOW = _half_ranks()
+_RANK_HIGH = [3 ** 5 * _RANK_LOW[half] for half in range(1 << 8)]
+
+# the squares set in each nine-bit mask, for decoding table records
+MASK_SQUARES = tuple(tuple(square for square in range(9) if mask & (1 << square))
+                     for mask in range(1 << 9))
+
+# The eight rotations and reflections of the board. Square 0 is the center and
+# squares 1 to 8 go around it in order, so a quarter turn moves every outer
+# square two places around the ring. The mirror image (across the row of
+# squares 1, 0 and 5) swaps squares 2 and 8, 3 and 7, and 4 and 6. Symmetry k
+# is k quarter turns for k < 4, or the mirror image followed by k - 4 quarter
+# turns. SYMMETRIES[k][square] is where the square ends up.
+SYMMETRIES = tuple(tuple(0 if not square else 
+                         1 + ([1, -1][k >= 4] * (square - 1) + 2 * (k % 4)) % 8
+                         for square in range(9))
+                   for k in range(8))
+INVERSE_SYMMETRIES = (0, 3, 2, 1, 4, 5, 6, 7)  # undoes symmetry k
+
+# the outer ring of the board (squares 1-8) is sixteen bits, two per square.
+# This reverses the order of the four squares in each byte of the ring.
+_REVERSE_RING_BYTE = [sum(((byte >> (2 * i)) & 3) << (2 * (3 - i)) for i in range(4))
+                      for byte in range(1 << 8)]
+
+
+# The solver runs on a pair of nine-bit masks instead, one per player, with
+# bit n set if the player has square n. This is lossless (see split_board and
+# join_board), and a win is a line mask ANDed with the player's mask.
+ALL_SQUARES = 0x1ff
+LINE_MASKS = tuple(sum(1 << square for square in range(9) if combo & (2 << (2 * square)))
+                   for combo in WINNING_MOVES)
+HAS_LINE = tuple(any(mask & line == line for line in LINE_MASKS) 
+                 for mask in range(1 << 9))
+
+# TicTacToeBoard keeps a count of each player's pieces in every line, two bits
+# per line in the order of LINE_MASKS, so it can tell when a game is over
+# without looking at the whole board. LINE_COUNTS[square] is what taking the
+# square adds to a player's counts. A count never goes past 3, so a line is
+# complete when both of its bits are set. Both players' counts are kept in
+# one integer, the computer's COMPUTER_COUNT_SHIFT bits up, and
+# PLAYER_LINE_COUNTS[player][square] is what a move adds to it.
+LINE_COUNTS = tuple(sum(1 << (2 * index) for index, line in enumerate(LINE_MASKS) 
+                        if line & (1 << square))
+                    for square in range(9))
+LOW_COUNT_BITS = 0x5555
+COMPUTER_COUNT_SHIFT = 16
+PLAYER_LINE_COUNTS = {HUMAN: LINE_COUNTS,
+                      COMPUTER: tuple(counts << COMPUTER_COUNT_SHIFT 
+                                      for counts in LINE_COUNTS)}
+COMPLETE_LINE_BITS = LOW_COUNT_BITS | LOW_COUNT_BITS << COMPUTER_COUNT_SHIFT
+
+# TicTacToeBoard keeps the moves of a game, for undo and redo, as a stack
+# packed into an integer, HISTORY_BITS to a move with the latest move lowest.
+# A move is its square plus 1, so that no move is 0 and an empty stack is 0,
+# with HISTORY_COMPUTER set for the computer's moves and HISTORY_SCORED for a
+# move that ended the game and was added to the scores.
+HISTORY_BITS = 6
+HISTORY_MASK = (1 << HISTORY_BITS) - 1
+HISTORY_COMPUTER = 0x10
+HISTORY_SCORED = 0x20
+
+
+def _mask_symmetry(symmetry):
+    """
+    Builds the image of every nine-bit mask under a symmetry, each from the
+    image of the same mask without its lowest square, which keeps import
+    fast.
+    
+    :param symmetry: tuple from SYMMETRIES
+    :return: tuple of integers
+    """
+    masks = [0] * (1 << 9)
+    for mask in range(1, 1 << 9):
+        low = mask & -mask
+        masks[mask] = masks[mask ^ low] | 1 << symmetry[low.bit_length() - 1]
+    return tuple(masks)
+
+
+MASK_SYMMETRIES = tuple(_mask_symmetry(symmetry) for symmetry in SYMMETRIES)
+# SYMMETRIC_SQUARES[k][mask] is the squares of the mask after symmetry k, in
+# order, for turning the best moves of a canonical board back into squares
+SYMMETRIC_SQUARES = tuple(tuple(MASK_SQUARES[mask] for mask in masks)
+                          for masks in MASK_SYMMETRIES)
+
+# spreads a nine-bit mask out to the two-bits-per-square layout, and back
+_SPREAD = tuple(sum(2 << (2 * square) for square in MASK_SQUARES[mask])
+                for mask in range(1 << 9))
+_COMPRESS = dict((spread, mask) for mask, spread in enumerate(_SPREAD))
+
+def _rotate_ring(ring, bits):
+    """
+    Rotates the outer ring of a board, two bits per square.
+    
+    :param ring: sixteen-bit integer for squares 1 to 8
+    :param bits: how far to rotate, between 1 and 15
+    :return: integer
+    """
+    return ((ring << bits) | (ring >> (16 - bits))) & 0xffff
+
+
+def board_rank(board):
+    """
+    Converts the integer representation of a board to its base-3 rank, a
+    number between 0 and 3^9 - 1.
+    
+    :param board: integer representing a board
+    :return: integer
+    """
+    return _RANK_LOW[board & 0x3ff] + _RANK_HIGH[board >> 10]
+
+
+def push_move(stack, square, player, scored=False):
+    """
+    Adds a move to the top of a stack of moves packed into an integer (see
+    HISTORY_BITS).
+    
+    :param stack: integer, 0 for an empty stack
+    :param square: integer between 0 and 8
+    :param player: integer representing player (1 or 2)
+    :param scored: boolean, whether the move ended the game and its result
+                was added to the scores
+    :return: integer
+    """
+    return (stack << HISTORY_BITS | square + 1 | HISTORY_COMPUTER * (player == COMPUTER) 
+            | HISTORY_SCORED * bool(scored))
+
+
+def top_move(stack):
+    """
+    Reads the move at the top of a packed stack of moves. The stack without
+    it is stack >> HISTORY_BITS.
+    
+    :param stack: integer, not 0
+    :return: (square, player, scored)
+    """
+    move = stack & HISTORY_MASK
+    return ((move & 0xf) - 1, COMPUTER if move & HISTORY_COMPUTER else HUMAN, 
+            bool(move & HISTORY_SCORED))
+
+
+def stack_moves(stack):
+    """
+    Unpacks every move of a packed stack of moves.
+    
+    :param stack: integer
+    :return: list of (square, player, scored), the top of the stack last
+    """
+    moves = []
+    while stack:
+        moves.append(top_move(stack))
+        stack >>= HISTORY_BITS
+    moves.reverse()
+    return moves
+
+
+def unrank_board(rank):
+    """
+    Converts a base-3 rank (see board_rank) back into the integer 
+    representation of a board.
+    
+    :param rank: integer between 0 and 3^9 - 1
+    :return: integer
+    """
+    board = 0
+    for square in range(9):
+        rank, digit = divmod(rank, 3)
+        board |= (0, 2, 3)[digit] << (2 * square)
+    return board
+
+
+def position_key(board, player):
+    """
+    Converts a position to the 16-bit key used by the solved table, the
+    opening book and the playbook: 2 * board_rank(board) + (player - 1).
+    
+    :param board: integer representing a board
+    :param player: integer representing the player about to move (1 or 2)
+    :return: integer between 0 and PLAYBOOK_SLOTS - 1
+    """
+    return 2 * (_RANK_LOW[board & 0x3ff] + _RANK_HIGH[board >> 10]) + player - 1
+
+
+def unrank_position(key):
+    """
+    Converts a key from position_key back into a position.
+    
+    :param key: integer between 0 and PLAYBOOK_SLOTS - 1
+    :return: (integer representing a board, integer for the player)
+    """
+    return unrank_board(key >> 1), (key & 1) + 1
+
+
+def _legal_positions():
+    """
+    Lists the position_key of every legal position (see is_legal_position)
+    in order, so that a position's place in the list is a dense ID for it,
+    and indexes the list by key. Each player's squares are only paired with
+    masks of the other player's that have about as many squares, which
+    keeps import fast.
+    
+    :return: (array of the position_id of every key, or NO_POSITION,
+                array of the key of every position_id)
+    """
+    # the masks with each number of squares, as the computer's squares, with
+    # what they add to a position_key: all of them with the human to move,
+    # and only those without a line with the computer to move
+    human_to_move = [[] for count in range(11)]
+    computer_to_move = [[] for count in range(11)]
+    for mask, spread in enumerate(_SPREAD):
+        count = len(MASK_SQUARES[mask])
+        key = 2 * board_rank(spread | spread >> 1)
+        human_to_move[count].append((mask, key))
+        if not HAS_LINE[mask]:
+            computer_to_move[count].append((mask, key + 1))
+    
+    keys = []
+    for human, spread in enumerate(_SPREAD):
+        count = len(MASK_SQUARES[human])
+        # the player who moved first has one square more. With at most five
+        # squares, a player's lines always share a square that could have
+        # been their last move, so only the winner needs checking.
+        candidates = computer_to_move[max(count - 1, 0):count + 1]
+        if not HAS_LINE[human]:
+            candidates += human_to_move[count:count + 2]
+        human_key = 2 * board_rank(spread)
+        for masks in candidates:
+            keys += [human_key + key for mask, key in masks if not mask & human]
+    keys.sort()
+    
+    ids = array.array('H', [NO_POSITION]) * PLAYBOOK_SLOTS
+    for position, key in enumerate(keys):
+        ids[key] = position
+    return ids, array.array('H', keys)
+
+
+_POSITION_IDS, _POSITION_KEYS = _legal_positions()
+# how many legal positions there are, with either player moving first
+LEGAL_POSITIONS = len(_POSITION_KEYS)
+
+
+def is_legal_position(board, player):
+    """
+    Checks if a position can come up in a real game, with either player
+    moving first. Finished games are legal, with the player who would move
+    next.
+    
+    :param board: integer representing a board
+    :param player: integer representing the player about to move (1 or 2)
+    :return: boolean
+    """
+    # a square of 0b01 isn't either player's
+    if board & ~(board >> 1) & (FULL_BOARD >> 1):
+        return False
+    return _POSITION_IDS[position_key(board, player)] != NO_POSITION
+
+
+def position_id(board, player):
+    """
+    Ranks a legal position among all of them, in position_key order, for
+    storing positions in as few bits as possible.
+    
+    :param board: integer representing a board
+    :param player: integer representing the player about to move (1 or 2)
+    :return: integer between 0 and LEGAL_POSITIONS - 1
+    :raises: ValueError
+    """
+    if not is_legal_position(board, player):
+        raise ValueError("%#x with player %s to move is not a legal position" %
+                         (board, player))
+    return _POSITION_IDS[position_key(board, player)]
+
+
+def unrank_position_id(position):
+    """
+    Converts an ID from position_id back into a position.
+    
+    :param position: integer between 0 and LEGAL_POSITIONS - 1
+    :return: (integer representing a board, integer for the player)
+    :raises: IndexError
+    """
+    return unrank_position(_POSITION_KEYS[position])
+
+
+def split_board(board):
+    """
+    Converts the integer representation of a board into one nine-bit mask
+    per player.
+    
+    :param board: integer representing a board
+    :return: (integer, integer) for player 1 and player 2
+    """
+    return (_COMPRESS[board & ~(board << 1) & FULL_BOARD], 
+            _COMPRESS[board & (board << 1) & FULL_BOARD])
+
+
+def join_board(human, computer):
+    """
+    Converts one nine-bit mask per player back into the integer 
+    representation of a board.
+    
+    :param human: nine-bit mask of player 1's squares
+    :param computer: nine-bit mask of player 2's squares
+    :return: integer
+    """
+    spread = _SPREAD[computer]
+    return _SPREAD[human] | spread | (spread >> 1)
+
+
+def canonical_masks(mover, opponent):
+    """
+    Finds the canonical form of a position in the solver: the smallest of
+    the eight rotations and reflections of the two masks, packed into one
+    integer with the player about to move in the high nine bits.
+    
+    :param mover: nine-bit mask of the squares of the player about to move
+    :param opponent: nine-bit mask of the other player's squares
+    :return: integer
+    """
+    return min((symmetry[mover] << 9) | symmetry[opponent] 
+               for symmetry in MASK_SYMMETRIES)
+
+
+def canonical_board(board):
+    """
+    Finds the canonical form of a board: the smallest integer among its eight
+    rotations and reflections. Returns the canonical board and the number of
+    the symmetry in SYMMETRIES that turns the board into it.
+    
+    :param board: integer representing a board
+    :return: (integer, integer)
+    """
+    ring = board >> 2
+    reversed_ring = (_REVERSE_RING_BYTE[ring & 0xff] << 8 | 
+                     _REVERSE_RING_BYTE[ring >> 8])
+    mirrored = _rotate_ring(reversed_ring, 2)
+    rings = (ring, _rotate_ring(ring, 4), _rotate_ring(ring, 8), 
+             _rotate_ring(ring, 12), mirrored, _rotate_ring(mirrored, 4), 
+             _rotate_ring(mirrored, 8), _rotate_ring(mirrored, 12))
+    smallest = min(rings)
+    return (board & 3) | (smallest << 2), rings.index(smallest)
+
+
+def canonical_playbook(playbook):
+    """
+    Re-keys a dictionary in the same format as OPENING_BOOK by canonical
+    board, moving the squares of each entry along with its board.
+    
+    :param playbook: dictionary keyed by (board, player)
+    :return: dictionary
+    """
+    canonical = {}
+    for (board, player), potential_moves in playbook.items():
+        new_board, symmetry = canonical_board(board)
+        canonical[(new_board, player)] = dict(
+            (SYMMETRIES[symmetry][square], cost) 
+            for square, cost in potential_moves.items())
+    return canonical
+
+
+def keyed_playbook(playbook):
+    """
+    Re-keys a dictionary in the same format as OPENING_BOOK by position_key,
+    the way PLAYBOOK is keyed.
+    
+    :param playbook: dictionary keyed by (board, player)
+    :return: dictionary keyed by integers
+    """
+    return dict((position_key(board, player), potential_moves)
+                for (board, player), potential_moves in playbook.items())
+
+
+def pack_record(potential_moves, player):
+    """
+    Encodes the best moves from a dictionary of potential moves (in the same
+    format as the values of PLAYBOOK) as a 16-bit solved table record.
+    
+    :param potential_moves: dictionary of squares paired with their cost
+    :param player: integer representing the player making the move (1 or 2)
+    :return: integer
+    """
+    best = (max if player == COMPUTER else min)(potential_moves.values())
+    mask = 0
+    for square, cost in potential_moves.items():
+        if cost == best:
+            mask |= 1 << square
+    return mask | ((best - LOSS_VALUE) << 9)
+
+
+def unpack_record(record):
+    """
+    Decodes a solved table record into a dictionary of the best moves in the
+    same format as the values of PLAYBOOK. Returns None if the record is
+    empty.
+    
+    :param record: 16-bit integer from the solved table
+    :return: dictionary or None
+    """
+    if not record:
+        return None
+    cost = (record >> 9) + LOSS_VALUE
+    return dict((square, cost) for square in MASK_SQUARES[record & 0x1ff])
+
+
+def load_solved_table(path=TABLE_PATH, magic=TABLE_MAGIC, version=TABLE_VERSION):
+    """
+    Memory-maps the solved position table written by app/build_table.py, or
+    a file in the same layout, like the opening book. Returns the records,
+    indexed by position_id, or None if the file is missing or was written
+    for a different table version.
+    
+    :param path: location of the table file
+    :param magic: the four bytes the file should start with
+    :param version: the version the file should have
+    :return: memoryview or None
+    """
+    try:
+        with open(path, 'rb') as table_file:
+            data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return None
+    
+    if len(data) < TABLE_HEADER.size:
+        return None
+    file_magic, file_version, _, count = TABLE_HEADER.unpack_from(data)
+    if ((file_magic, file_version, count) != (magic, version, LEGAL_POSITIONS) or 
+            len(data) != TABLE_HEADER.size + 2 * count):
+        return None
+    
+    records = memoryview(data)[TABLE_HEADER.size:].cast('H')
+    if sys.byteorder == 'big':
+        records = array.array('H', records)
+        records.byteswap()
+    return records
+
+
+def table_record(table, key):
+    """
+    Looks up a position in a table from load_solved_table. Returns its
+    16-bit record, or 0 if the position isn't in the table.
+    
+    :param table: records from load_solved_table
+    :param key: position_key of the position
+    :return: integer
+    """
+    position = _POSITION_IDS[key]
+    if position == NO_POSITION:
+        return 0
+    return table[position]
+
+
+class OpeningBook(object):
+    """
+    The opening book written by app/build_book.py, loaded the first time a
+    position is looked up in it rather than when it's created, so that
+    importing this module costs the same however big the book is. Once
+    loaded, it's read-only and safe to share between threads.
+    
+    Public methods:
+        load
+        record
+    
+    """
+    def __init__(self, path=BOOK_PATH):
+        """
+        :param path: location of the book file
+        :attr table: records from load_solved_table once loaded, or
+                    None if the book hasn't been loaded or there isn't one
+        :attr loaded: boolean
+        """
+        super(OpeningBook, self).__init__()
+        self.path = path
+        self.table = None
+        self.loaded = False
+        self.lock = threading.Lock()
+    
+    def load(self):
+        """
+        Loads the book, unless it's been loaded already.
+        
+        :return: records, or None if there's no book
+        """
+        with self.lock:
+            if not self.loaded:
+                self.table = load_solved_table(self.path, BOOK_MAGIC, BOOK_VERSION)
+                self.loaded = True
+        return self.table
+    
+    def record(self, key):
+        """
+        Looks up the computer's move in a position.
+        
+        :param key: position_key of a board with the computer to move
+        :return: 16-bit record in the same format as the solved table, or 0
+                    if the position isn't in the book
+        """
+        table = self.table if self.loaded else self.load()
+        if table is None:
+            return 0
+        return table_record(table, key)
+
+
+class LatencyHistogram(object):
+    """
+    Counts latencies in LATENCY_BUCKETS buckets, where bucket i holds the
+    latencies of under 2^i microseconds and the last bucket holds everything
+    slower. Adding a latency takes a few integer operations and never
+    allocates, so percentiles are only as precise as the buckets.
+    
+    Public methods:
+        add
+        merge
+        percentile
+        snapshot
+    
+    """
+    def __init__(self):
+        """
+        Creates an empty histogram.
+        
+        :attr count: integer count of latencies
+        :attr total: float sum of the latencies, in seconds
+        :attr max: float slowest latency, in seconds
+        :attr buckets: list of LATENCY_BUCKETS integer counts
+        """
+        super(LatencyHistogram, self).__init__()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * LATENCY_BUCKETS
+    
+    def add(self, seconds):
+        """
+        Counts one latency.
+        
+        :param seconds: float
+        """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(int(seconds * 1e6).bit_length(), LATENCY_BUCKETS - 1)] += 1
+    
+    def merge(self, other):
+        """
+        Adds every latency counted by another histogram to this one.
+        
+        :param other: LatencyHistogram
+        """
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, other.buckets)]
+    
+    def percentile(self, fraction):
+        """
+        Estimates a percentile as the upper bound of the bucket it falls in,
+        or the slowest latency if that's lower.
+        
+        :param fraction: float between 0 and 1, e.g. .99
+        :return: float microseconds, or 0.0 if the histogram is empty
+        """
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= fraction * self.count:
+                if i == LATENCY_BUCKETS - 1:
+                    return 1e6 * self.max
+                return min(float(1 << i), 1e6 * self.max)
+        return 0.0
+    
+    def snapshot(self):
+        """
+        Reports the histogram, in microseconds.
+        
+        :return: dictionary of 'count', 'mean_us', 'p50_us', 'p99_us',
+                    'max_us', and 'buckets', a dictionary of the non-empty
+                    buckets keyed by their upper bound in microseconds
+                    (None for the last one)
+        """
+        last = LATENCY_BUCKETS - 1
+        return {'count': self.count,
+                'mean_us': 1e6 * self.total / max(self.count, 1),
+                'p50_us': self.percentile(.5), 'p99_us': self.percentile(.99),
+                'max_us': 1e6 * self.max,
+                'buckets': dict((1 << i if i < last else None, count)
+                                for i, count in enumerate(self.buckets) if count)}
+
+
+class Metrics(object):
+    """
+    Counters and latency histograms for an Engine, cheap enough to leave on.
+    Timings are taken like so, and cost nothing but the check of
+    self.enabled when it's switched off:
+    
+        start = metrics.start()
+        ...
+        metrics.observe('move', start)
+    
+    Every thread counts into counters and histograms of its own, so
+    counting never waits on a lock; snapshot adds them up. A snapshot taken
+    while other threads are counting may miss their latest counts.
+    
+    Public methods:
+        count
+        observe
+        reset
+        snapshot
+        start
+    
+    """
+    def __init__(self, enabled=True):
+        """
+        Creates an empty set of metrics.
+        
+        :param enabled: boolean; set self.enabled to switch metrics on or off
+                    at any time
+        :attr lock: lock guarding the list of every thread's counters and
+                    histograms
+        """
+        super(Metrics, self).__init__()
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+    
+    def _shard(self):
+        """
+        Creates the counters and histograms of the current thread, the first
+        time it counts anything.
+        
+        :return: (dictionary of named integer counts, dictionary of named
+                    LatencyHistograms)
+        """
+        shard = self._local.shard = ({}, {})
+        with self.lock:
+            self._shards.append(shard)
+        return shard
+    
+    def count(self, name, amount=1):
+        """
+        Adds to a counter, if metrics are enabled.
+        
+        :param name: string
+        :param amount: integer
+        """
+        if self.enabled:
+            try:
+                counters = self._local.shard[0]
+            except AttributeError:
+                counters = self._shard()[0]
+            counters[name] = counters.get(name, 0) + amount
+    
+    def observe(self, name, start):
+        """
+        Adds the time since `start` to a latency histogram.
+        
+        :param name: string
+        :param start: float from self.start, or None to do nothing
+        """
+        if start is not None:
+            seconds = time.perf_counter() - start
+            try:
+                latencies = self._local.shard[1]
+            except AttributeError:
+                latencies = self._shard()[1]
+            histogram = latencies.get(name)
+            if histogram is None:
+                histogram = latencies[name] = LatencyHistogram()
+            histogram.add(seconds)
+    
+    def reset(self):
+        """Clears every counter and histogram."""
+        with self.lock:
+            for counters, latencies in self._shards:
+                counters.clear()
+                latencies.clear()
+    
+    def snapshot(self):
+        """
+        Reports every counter and histogram.
+        
+        :return: dictionary of 'enabled', 'counters', and 'latency', a
+                    dictionary of LatencyHistogram.snapshot results
+        """
+        counters = collections.Counter()
+        latencies = collections.defaultdict(LatencyHistogram)
+        with self.lock:
+            for shard_counters, shard_latencies in self._shards:
+                counters.update(dict(shard_counters))
+                for name, histogram in list(shard_latencies.items()):
+                    latencies[name].merge(histogram)
+        return {'enabled': self.enabled, 'counters': dict(counters),
+                'latency': dict((name, histogram.snapshot())
+                                for name, histogram in latencies.items())}
+    
+    def start(self):
+        """
+        Starts timing something for self.observe.
+        
+        :return: float, or None if metrics are disabled
+        """
+        if self.enabled:
+            return time.perf_counter()
+        return None
+
+
+class BoundedCache(object):
+    """
+    A cache with the same interface as a dictionary, which holds at most
+    `maxsize` entries and evicts the least recently used entry to make room
+    for a new one. Pinned entries are never evicted or replaced, and don't
+    count towards `maxsize`.
+    
+    Lookups through `get` are counted as hits or misses, so callers can see
+    how well the cache is working with `stats`.
+    
+    Public methods:
+        clear
+        get
+        pin
+        stats
+        update
+    
+    """
+    def __init__(self, maxsize=None, pinned=None):
+        """
+        Creates an empty cache.
+        
+        :param maxsize: the most unpinned entries to keep, or None for no limit
+        :param pinned: dictionary of entries that are never evicted
+        :attr entries: OrderedDict of unpinned entries, least recently used
+                    first
+        :attr pinned: dictionary of pinned entries
+        :attr hits: integer count of lookups that found an entry
+        :attr misses: integer count of lookups that didn't
+        :attr evictions: integer count of entries evicted to make room
+        """
+        super(BoundedCache, self).__init__()
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.pinned = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        for key, value in (pinned or {}).items():
+            self.pin(key, value)
+    
+    def __contains__(self, key):
+        return key in self.pinned or key in self.entries
+    
+    def __getitem__(self, key):
+        if key in self.pinned:
+            return self.pinned[key]
+        value = self.entries[key]
+        self.entries.move_to_end(key)
+        return value
+    
+    def __iter__(self):
+        return itertools.chain(self.pinned, list(self.entries))
+    
+    def __len__(self):
+        return len(self.pinned) + len(self.entries)
+    
+    def __setitem__(self, key, value):
+        if key in self.pinned:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self):
+        """Empties the cache, except for pinned entries."""
+        self.entries.clear()
+    
+    def get(self, key, default=None):
+        """
+        Looks up an entry, counting the lookup as a hit or a miss.
+        
+        :param key: the key of the entry
+        :param default: what to return if there's no entry
+        :return: the value of the entry, or default
+        """
+        try:
+            value = self[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+    
+    def pin(self, key, value):
+        """
+        Adds an entry that will never be evicted or replaced.
+        
+        :param key: the key of the entry
+        :param value: the value of the entry
+        """
+        self.entries.pop(key, None)
+        self.pinned[key] = value
+    
+    def stats(self):
+        """
+        Reports the counters of the cache.
+        
+        :return: dictionary
+        """
+        return {'hits': self.hits, 'misses': self.misses, 
+                'evictions': self.evictions, 'size': len(self), 
+                'maxsize': self.maxsize, 'pinned': len(self.pinned)}
+    
+    def update(self, other):
+        """
+        Adds every entry from a dictionary.
+        
+        :param other: dictionary
+        """
+        for key, value in other.items():
+            self[key] = value
+
+
+class PlaybookArray(object):
+    """
+    A cache of solved positions with the same interface as BoundedCache, but
+    stored as one 16-bit record (see pack_record) per position in a flat array
+    indexed by its key. Keys are position_key(board, player) and values are
+    dictionaries of {square: cost}. Only the best moves of each position are
+    kept, and the whole cache is 2 * 2 * 3^9 bytes no matter how full it is,
+    so nothing ever has to be evicted.
+    
+    Public methods:
+        clear
+        get
+        pin
+        record
+        stats
+        update
+    
+    """
+    def __init__(self, playbook=None, pinned=None):
+        """
+        Creates an empty cache, optionally filled from `playbook`.
+        
+        :param playbook: dictionary keyed by position_key (see
+                    keyed_playbook)
+        :param pinned: dictionary of entries that are never replaced, in the
+                    same format
+        :attr records: array of 16-bit records, 0 for an empty slot
+        :attr pinned: dictionary of pinned slots and their records
+        :attr hits: integer count of lookups that found an entry
+        :attr misses: integer count of lookups that didn't
+        """
+        super(PlaybookArray, self).__init__()
+        self.records = array.array('H', [0]) * PLAYBOOK_SLOTS
+        self.pinned = {}
+        self.hits = 0
+        self.misses = 0
+        for key, potential_moves in (pinned or {}).items():
+            self.pin(key, potential_moves)
+        if playbook:
+            self.update(playbook)
+    
+    def __contains__(self, key):
+        return bool(self.records[key])
+    
+    def __getitem__(self, key):
+        potential_moves = unpack_record(self.records[key])
+        if potential_moves is None:
+            raise KeyError(key)
+        return potential_moves
+    
+    def __iter__(self):
+        for key, record in enumerate(self.records):
+            if record:
+                yield key
+    
+    def __len__(self):
+        return len(self.records) - self.records.count(0)
+    
+    def __setitem__(self, key, potential_moves):
+        if key not in self.pinned:
+            self.records[key] = pack_record(potential_moves, (key & 1) + 1)
+    
+    def clear(self):
+        """Empties every slot of the cache, except for pinned entries."""
+        self.records = array.array('H', [0]) * PLAYBOOK_SLOTS
+        for key, record in self.pinned.items():
+            self.records[key] = record
+    
+    def get(self, key, default=None):
+        """
+        Looks up an entry, counting the lookup as a hit or a miss.
+        
+        :param key: position_key of the position
+        :param default: what to return if there's no entry
+        :return: dictionary of {square: cost}, or default
+        """
+        potential_moves = unpack_record(self.records[key])
+        if potential_moves is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return potential_moves
+    
+    def pin(self, key, potential_moves):
+        """
+        Adds an entry that will never be replaced.
+        
+        :param key: position_key of the position
+        :param potential_moves: dictionary of {square: cost}
+        """
+        self.pinned.pop(key, None)
+        self[key] = potential_moves
+        self.pinned[key] = self.records[key]
+    
+    def record(self, key):
+        """
+        Gets the raw 16-bit record for a position, or 0 if it isn't cached.
+        
+        :param key: position_key of the position
+        :return: integer
+        """
+        return self.records[key]
+    
+    def stats(self):
+        """
+        Reports the counters of the cache, in the same format as 
+        BoundedCache.stats.
+        
+        :return: dictionary
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': 0,
+                'size': len(self), 'maxsize': PLAYBOOK_SLOTS, 
+                'pinned': len(self.pinned)}
+    
+    def update(self, playbook):
+        """
+        Adds every position from a dictionary keyed by position_key (see
+        keyed_playbook).
+        
+        :param playbook: dictionary
+        """
+        for key, potential_moves in playbook.items():
+            self[key] = potential_moves
+
+
+# caches to minimize calculation, keyed by canonical position: the playbook
+# by its position_key, and the transpositions by canonical_masks. Either can
+# be swapped for any object with the same interface as BoundedCache, here or
+# for a single Engine.
+PLAYBOOK = PlaybookArray()
+TRANSPOSITIONS = BoundedCache(maxsize=TRANSPOSITION_LIMIT)
+SOLVED_TABLE = load_solved_table()
+BOOK = OpeningBook()
 
 
 class InvalidStateException(Exception):
     pass
 
 
+class TieBreaker(object):
+    """
+    Picks between equally good squares for the computer, with one random
+    draw from its own random.Random, so that games can be replayed from a
+    seed without touching the global random state. Deterministic tie
+    breakers always pick the lowest square instead, for benchmarks.
+    
+    Every Engine has a tie breaker of its own, and a tie breaker can also be
+    passed for a single move, to give each game its own seed.
+    
+    Public methods:
+        choose
+    
+    """
+    def __init__(self, seed=None, deterministic=False):
+        """
+        :param seed: seed for self.rng. Defaults to None, which seeds it
+                    from the operating system.
+        :param deterministic: boolean; if True, self.rng is never used
+        :attr rng: random.Random
+        """
+        super(TieBreaker, self).__init__()
+        self.deterministic = deterministic
+        self.rng = random.Random(seed)
+    
+    def choose(self, squares):
+        """
+        Picks one of a sequence of equally good squares.
+        
+        :param squares: sorted, non-empty sequence of integers
+        :return: integer
+        """
+        if self.deterministic:
+            return squares[0]
+        return squares[int(self.rng.random() * len(squares))]
+
+
+class GameState(object):
+    """
+    The state of one game and nothing else, for keeping many games at once:
+    the board, whose turn it is, and whether the game is over. The moves are
+    made by an Engine (see Engine.human_move and Engine.computer_move), so a
+    GameState has no methods for playing and no instance dictionary.
+    
+    A state can also be packed into a single integer of at most 20 bits, to
+    store games in an array of 32-bit integers.
+    
+    Public methods:
+        pack
+        unpack
+    
+    """
+    __slots__ = ('board', 'turn', 'game_over')
+    
+    def __init__(self, board=0, turn=0, game_over=False):
+        """
+        :param board: integer representing a board
+        :param turn: 0 if the human moves next, 1 for the computer
+        :param game_over: boolean
+        """
+        self.board = board
+        self.turn = turn
+        self.game_over = game_over
+    
+    def __eq__(self, other):
+        return (isinstance(other, GameState) and 
+                self.pack() == other.pack())
+    
+    def __ne__(self, other):
+        return not self == other
+    
+    def __repr__(self):
+        return 'GameState(%#x, %s, %s)' % (self.board, self.turn, self.game_over)
+    
+    def pack(self):
+        """
+        Packs the state into an integer: the board in the low 18 bits, then
+        the turn and the game over flag.
+        
+        :return: integer
+        """
+        return self.board | self.turn << 18 | int(self.game_over) << 19
+    
+    @classmethod
+    def unpack(cls, packed):
+        """
+        Unpacks a state packed by GameState.pack.
+        
+        :param packed: integer
+        :return: GameState
+        """
+        return cls(packed & 0x3ffff, (packed >> 18) & 1, bool(packed >> 19))
+
+
+class Engine(object):
+    """
+    The solver and its caches, kept apart from the state of any one game so
+    that a single engine can serve many TicTacToeBoard sessions at once, from
+    any number of threads.
+    
+    The solved table is read-only, so lookups in it need no locking. A
+    position that isn't in the table is looked up in the playbook, then in
+    the opening book, and only solved if it's in neither. The
+    playbook and transposition caches are not thread-safe by themselves, so
+    every read or write of them happens while holding self.lock. A position
+    that isn't in the playbook is solved while the lock is held too, which
+    means that threads asking for the same position wait for the first one to
+    finish and then find its result, instead of all solving it again.
+    
+    It also plays moves on a GameState, keeping no state of its own between
+    calls.
+    
+    Ties between equally good moves are broken by self.tie_breaker (see
+    TieBreaker), or by one passed in for the move.
+    
+    What the engine does is counted in self.metrics: table and book hits
+    and misses, solves and the nodes they searched, and the latency of solves and of the
+    computer's moves. See Engine.snapshot.
+    
+    Public methods:
+        best_squares
+        calculate_board_costs
+        computer_move
+        human_move
+        in_table
+        potential_moves
+        prewarm
+        snapshot
+    
+    """
+    def __init__(self, playbook=None, transpositions=None, table=SOLVED_TABLE,
+                 metrics=None, tie_breaker=None, book=BOOK):
+        """
+        Creates an engine with its own caches, unless some are passed in.
+        
+        :param playbook: cache of solved positions, keyed by position_key.
+                    Defaults to a new PlaybookArray.
+        :param transpositions: cache of search results. Defaults to a new
+                    BoundedCache of TRANSPOSITION_LIMIT entries.
+        :param table: solved table from load_solved_table, or None to solve
+                    every position. Defaults to SOLVED_TABLE.
+        :param metrics: Metrics to count in. Defaults to new, enabled Metrics.
+        :param tie_breaker: TieBreaker for moves that aren't given one.
+                    Defaults to a new, unseeded TieBreaker.
+        :param book: OpeningBook, or None to solve every position that isn't
+                    in the table or playbook. Defaults to BOOK.
+        :attr lock: reentrant lock guarding both caches
+        :attr nodes: integer count of positions searched by _negamax
+        """
+        super(Engine, self).__init__()
+        if playbook is None:
+            playbook = PlaybookArray()
+        if transpositions is None:
+            transpositions = BoundedCache(maxsize=TRANSPOSITION_LIMIT)
+        self.playbook = playbook
+        self.transpositions = transpositions
+        self.table = table
+        self.book = book
+        self.metrics = Metrics() if metrics is None else metrics
+        self.tie_breaker = TieBreaker() if tie_breaker is None else tie_breaker
+        self.lock = threading.RLock()
+        self.nodes = 0
+    
+    def best_squares(self, board, rank=None):
+        """
+        Finds the squares the computer could play on a board that are all
+        equally good, and better than any other. The solved table has every
+        orientation of a position, so the board is looked up by its rank as
+        it is, and only turned into its canonical form if it isn't there.
+        
+        :param board: integer representing a board
+        :param rank: board_rank(board), if the caller keeps it already
+        :return: sorted tuple of integers
+        :raises: InvalidStateException
+        """
+        if rank is None:
+            rank = board_rank(board)
+        record = self._table_record(2 * rank + COMPUTER - 1)
+        if record:
+            return MASK_SQUARES[record & ALL_SQUARES]
+        canonical, symmetry = canonical_board(board)
+        record = pack_record(self._solved_moves(position_key(canonical, COMPUTER)), 
+                             COMPUTER)
+        return SYMMETRIC_SQUARES[INVERSE_SYMMETRIES[symmetry]][record & ALL_SQUARES]
+    
+    def calculate_board_costs(self, board, player=COMPUTER):
+        """
+        Calculates the cost of each possible move for the indicated board.
+        Returns a dictionary in the same format as OPENING_BOOK, or an empty
+        dictionary if there are no moves left.
+        
+        Costs are always from the computer's point of view, so the computer
+        wants the highest cost and the human wants the lowest.
+        
+        :param board: integer representing the current state of the board
+        :param player: integer representing the player about to move (1 or 2)
+        :return: dictionary
+        :raises: AssertionError
+        """
+        assert player in (HUMAN, COMPUTER)
+        
+        # searching each move with the full window gives an exact cost for
+        # every square, not just the best one, so _best_move can pick between
+        # equally good moves. Moves that lead to rotations or reflections of
+        # the same board cost the same, so each of those is searched once.
+        sign = [-1, 1][player == COMPUTER]
+        mover, opponent = split_board(board)
+        if player == COMPUTER:
+            mover, opponent = opponent, mover
+        
+        board_costs = {}
+        child_costs = {}
+        start = self.metrics.start()
+        with self.lock:
+            nodes = self.nodes
+            for square in MASK_SQUARES[~(mover | opponent) & ALL_SQUARES]:
+                child = canonical_masks(opponent, mover | (1 << square))
+                if child not in child_costs:
+                    child_costs[child] = sign * self._move_score(square, mover, 
+                                                                 opponent,
+                                                                 LOSS_VALUE - 1, 
+                                                                 WIN_VALUE + 1)
+                board_costs[square] = child_costs[child]
+            self.metrics.count('nodes', self.nodes - nodes)
+        self.metrics.count('solves')
+        self.metrics.observe('solve', start)
+        
+        if not board_costs:
+            return {}
+        return {(board, player): board_costs}
+    
+    def _finish_move(self, state, square):
+        """
+        Hands the turn over after a move on a GameState, and checks if the
+        game is over. Returns a tuple in the same format as
+        TicTacToeBoard.human_move.
+        
+        :param state: GameState
+        :param square: the square just played
+        :return: (integer, boolean, integer or None)
+        """
+        state.turn = ~state.turn & 0x1
+        winner = board_winner(state.board)
+        state.game_over = bool(winner) or is_board_full(state.board)
+        return square, state.game_over, winner
+    
+    def computer_move(self, state, tie_breaker=None):
+        """
+        Makes the computer's move on a GameState, the same way as
+        TicTacToeBoard.computer_move but without keeping scores.
+        Returns a tuple indicating (<square>, <game over>, <winner>).
+        
+        :param state: GameState
+        :param tie_breaker: TieBreaker to pick between equally good squares.
+                    Defaults to self.tie_breaker.
+        :return: (integer or None, boolean, integer or None)
+        :raises: InvalidStateException
+        """
+        if not state.turn or state.game_over:
+            return (None, state.game_over, None)
+        
+        start = self.metrics.start()
+        tie_breaker = self.tie_breaker if tie_breaker is None else tie_breaker
+        square = tie_breaker.choose(self.best_squares(state.board))
+        self.metrics.observe('move', start)
+        state.board |= SQUARE_MOVES[COMPUTER][square]
+        return self._finish_move(state, square)
+    
+    def human_move(self, state, square):
+        """
+        Makes the human's move on a GameState, the same way as
+        TicTacToeBoard.human_move but without keeping scores.
+        Returns a tuple indicating (<square>, <game over>, <winner>), with
+        a square of None if the move wasn't made.
+        
+        :param state: GameState
+        :param square: integer from 0 to 8 indicating which square to play in
+        :return: (integer or None, boolean, integer or None)
+        """
+        if state.turn or state.game_over:
+            return (None, state.game_over, None)
+        if not isinstance(square, int) or square not in open_squares(state.board):
+            return (None, False, None)
+        
+        state.board |= SQUARE_MOVES[HUMAN][square]
+        return self._finish_move(state, square)
+    
+    def in_table(self, board):
+        """
+        Checks if the computer's move on a board can be looked up in the
+        solved table, so that potential_moves will neither search nor wait
+        for the lock.
+        
+        :param board: integer representing a board
+        :return: boolean
+        """
+        if self.table is None:
+            return False
+        return bool(table_record(self.table, position_key(board, COMPUTER)))
+    
+    def potential_moves(self, board):
+        """
+        Finds the cost of each move the computer could make on a board.
+        Returns a dictionary of {square: cost} for the board as it was passed
+        in, in the same format as the values of PLAYBOOK.
+        
+        Any position that can come up in a real game is looked up in the
+        solved table, which only holds the best moves. For anything else,
+        cost calculations are stored in the playbook cache to minimize
+        repetition of calculations if they're needed again. The playbook
+        only holds canonical boards, so the board is turned into its
+        canonical form first and the squares are turned back afterwards.
+        
+        :param board: integer representing a board
+        :return: dictionary
+        :raises: InvalidStateException
+        """
+        potential_moves = unpack_record(self._table_record(position_key(board, COMPUTER)))
+        if potential_moves is not None:
+            return potential_moves
+        
+        board, symmetry = canonical_board(board)
+        undo = SYMMETRIES[INVERSE_SYMMETRIES[symmetry]]
+        potential_moves = self._solved_moves(position_key(board, COMPUTER))
+        return dict((undo[square], cost) 
+                    for square, cost in potential_moves.items())
+    
+    def prewarm(self, depth=BOOK_DEPTH):
+        """
+        Gets the computer's moves for the start of a game ready ahead of
+        time, so the first game never has to wait for them: the opening
+        book is loaded, and every position where it's the computer's turn in
+        the first `depth` moves (with either player going first) is looked
+        up, which solves any that aren't in the table or the book into the
+        playbook. Meant to be run in the background, while the player is
+        still getting ready to play.
+        
+        :param depth: the most moves played in any position looked up
+        :return: integer count of positions looked up
+        """
+        if self.book is not None:
+            self.book.load()
+        seen = set()
+        positions = [(0, HUMAN, 0), (0, COMPUTER, 0)]
+        while positions:
+            board, player, moves = positions.pop()
+            if (board, player) in seen:
+                continue
+            seen.add((board, player))
+            if player == COMPUTER:
+                self.best_squares(board)
+            if moves == depth:
+                continue
+            for square in open_squares(board):
+                new_board = board | SQUARE_MOVES[player][square]
+                if not (board_winner(new_board) or is_board_full(new_board)):
+                    positions.append((canonical_board(new_board)[0], 
+                                      ~player & 0x3, moves + 1))
+        return sum(player == COMPUTER for board, player in seen)
+    
+    def _solved_moves(self, key):
+        """
+        Finds the costs of the computer's moves in a canonical position in
+        the playbook or the opening book, or solves the position and adds it
+        to the playbook.
+        
+        :param key: position_key of a canonical board with the computer to
+                    move
+        :return: dictionary of {square: cost}
+        :raises: InvalidStateException
+        """
+        with self.lock:
+            potential_moves = self.playbook.get(key)
+            if potential_moves is None and self.book is not None:
+                potential_moves = unpack_record(self.book.record(key))
+                self.metrics.count('book_misses' if potential_moves is None 
+                                   else 'book_hits')
+            if potential_moves is None:
+                board = unrank_position(key)[0]
+                new_moves = self.calculate_board_costs(board)
+                if not new_moves:
+                    # let the UI handle it
+                    raise InvalidStateException("No valid moves for the computer")
+                self.playbook.update(keyed_playbook(new_moves))
+                potential_moves = new_moves[(board, COMPUTER)]
+        return potential_moves
+    
+    def _table_record(self, key):
+        """
+        Looks up the computer's move in a position in the solved table,
+        counting the lookup as a table hit or miss.
+        
+        :param key: position_key of a board with the computer to move
+        :return: 16-bit record, or 0 if it isn't in the table
+        """
+        if self.table is None:
+            return 0
+        record = table_record(self.table, key)
+        self.metrics.count('table_hits' if record else 'table_misses')
+        return record
+    
+    def _move_score(self, square, mover, opponent, alpha, beta):
+        """
+        Scores a single move from the point of view of the player making it:
+        WIN_VALUE for a win, TIE_VALUE for a tie, and otherwise the negated
+        score of the resulting position for the opponent, moved one step 
+        closer to TIE_VALUE so wins happen sooner and losses happen later.
+        
+        :param square: integer between 0 and 8 for an open square
+        :param mover: nine-bit mask of the squares of the player moving
+        :param opponent: nine-bit mask of the other player's squares
+        :param alpha: the score the player can already guarantee
+        :param beta: the score the opponent can already hold the player to
+        :return: integer
+        """
+        mover |= 1 << square
+        if HAS_LINE[mover]:
+            return WIN_VALUE
+        if mover | opponent == ALL_SQUARES:
+            return TIE_VALUE
+        
+        # the window is widened by one on each side, because the step towards
+        # TIE_VALUE can move a score that was just outside it back inside
+        score = -self._negamax(opponent, mover, -beta - 1, -alpha + 1)
+        if score:
+            score += [-1, 1][score < 0]
+        return score
+    
+    def _negamax(self, mover, opponent, alpha, beta):
+        """
+        Depth-first alpha-beta search of the game tree below a position.
+        Returns the score of the position from the point of view of the 
+        player about to move (see self._move_score). Scores outside of the
+        window (alpha, beta) are only bounds on the real score. Results are
+        kept in self.transpositions by canonical position, so each position
+        (and all of its rotations and reflections) only has to be searched
+        once.
+        
+        :param mover: nine-bit mask of the squares of the player about to move
+        :param opponent: nine-bit mask of the other player's squares
+        :param alpha: the score the player can already guarantee
+        :param beta: the score the opponent can already hold the player to
+        :return: integer
+        """
+        self.nodes += 1
+        key = canonical_masks(mover, opponent)
+        original_alpha = alpha
+        entry = self.transpositions.get(key)
+        if entry is not None:
+            score, bound = entry
+            if bound is EXACT:
+                return score
+            if bound is LOWER_BOUND:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score
+        
+        best_score = None
+        for square in MASK_SQUARES[~(mover | opponent) & ALL_SQUARES]:
+            score = self._move_score(square, mover, opponent, alpha, beta)
+            if best_score is None or score > best_score:
+                best_score = score
+                alpha = max(alpha, score)
+                if alpha >= beta:
+                    break
+        
+        if best_score is None:
+            # nowhere left to move
+            return TIE_VALUE
+        
+        if best_score <= original_alpha:
+            self.transpositions[key] = (best_score, UPPER_BOUND)
+        elif best_score >= beta:
+            self.transpositions[key] = (best_score, LOWER_BOUND)
+        else:
+            self.transpositions[key] = (best_score, EXACT)
+        return best_score
+    
+    def snapshot(self):
+        """
+        Reports the engine's metrics along with the stats of its caches.
+        
+        :return: dictionary from Metrics.snapshot, with 'playbook' and
+                    'transpositions' from the caches' stats methods added
+        """
+        snapshot = self.metrics.snapshot()
+        with self.lock:
+            snapshot['playbook'] = self.playbook.stats()
+            snapshot['transpositions'] = self.transpositions.stats()
+        return snapshot
+
+
+# shared by every TicTacToeBoard that isn't given an engine of its own
+ENGINE = Engine(PLAYBOOK, TRANSPOSITIONS, SOLVED_TABLE)
+
+
 class TicTacToeBoard(object):
     """
     Primary class for tracking and playing the game.  
@@ -85,19 +1693,43 @@ class TicTacToeBoard(object):
     be represented as 0x3080c2. Please also note that the X and O settings can 
     be changed by setting the global 'PLAYER1' and 'PLAYER2' constants above.
     
+    Moves are kept on a stack packed into an integer (see push_move), so
+    they can be taken back. human_move and computer_move play the game and
+    keep the scores; undo_move and redo_move step back and forward through
+    its moves, taking a finished game's result back out of the scores and
+    putting it in again. make_move and unmake_move push and pop a move in
+    place without touching the scores or the moves to redo, so analysis can
+    walk the game tree from any position and leave the board as it found it.
+    
     Public methods:
         computer_move
         get_square_label
+        history_moves
         human_move
         is_computer_turn
+        make_move
         player_stats
+        redo_move
         reset_board
+        scores
+        undo_move
+        unmake_move
     
     """
-    def __init__(self):
+    def __init__(self, engine=None, tie_breaker=None, stats=None,
+                 player_name=DEFAULT_PLAYER):
         """
-        Sets the default attributes for the class. No parameters are accepted.
+        Sets the default attributes for the class.
         
+        :param engine: the Engine that picks the computer's moves. Defaults
+                    to the global ENGINE, which every board can share.
+        :param tie_breaker: TieBreaker to pick between equally good moves,
+                    so this board's games can be seeded. Defaults to the
+                    engine's.
+        :param stats: StatsStore (see app/stats.py) that keeps the human's
+                    results across sessions, or None to only count them here
+        :param player_name: string the human's results are kept under in
+                    `stats`
         :attr board: an integer representation of the board. Defaults to 0.
         :attr turn: an integer representation of which player is moving. Can be
                     be 0 or 1. Defaults to 0.
@@ -107,6 +1739,21 @@ class TicTacToeBoard(object):
                     lost to the computer. Defaults to 0.
         :attr ties: integer count of tied games between player and computer.
                     Defaults to 0.
+        :attr line_counts: integer count of each player's pieces in every
+                    line (see PLAYER_LINE_COUNTS), for the board in
+                    self.counted_board
+        :attr moves: integer count of the squares filled on
+                    self.counted_board
+        :attr rank: board_rank of self.counted_board, kept up to date a move
+                    at a time (see RANK_MOVES), for looking up the computer's
+                    moves
+        :attr counted_board: the board that self.line_counts and self.moves
+                    were counted for. Defaults to 0.
+        :attr history: packed stack of the moves played this game (see
+                    push_move), the latest on top, 0 for none. Use
+                    self.history_moves to read them.
+        :attr redo_moves: packed stack of the moves that were undone, the
+                    next one to redo on top
         """
         super(TicTacToeBoard, self).__init__()
         self.board = 0x00000
@@ -114,16 +1761,28 @@ class TicTacToeBoard(object):
         self.player_wins = 0
         self.player_losses = 0
         self.ties = 0
-        self.game_over = False      
+        self.game_over = False
+        self.line_counts = 0
+        self.moves = 0
+        self.rank = 0
+        self.counted_board = 0
+        self.history = 0
+        self.redo_moves = 0
+        self.stats = stats
+        self.player_name = player_name
+        self.engine = ENGINE if engine is None else engine
+        self.tie_breaker = (self.engine.tie_breaker if tie_breaker is None 
+                            else tie_breaker)
     
     def _apply_move(self, square, board, player):
         """
         Checks the validity of a given move and applies it to the game board. 
-        Returns True if the move was applied; False otherwise.
+        Returns the square, as an integer, and the new board if the move was
+        applied; None and the board as it was otherwise.
         
-        :param square: integer between 0 and 8
+        :param square: integer between 0 and 8, or anything int() reads as one
         :param board: integer representing board
-        :return: boolean
+        :return: (integer or None, integer)
         :raises: AssertionError
         """
         self._assert_valid_player(player)
@@ -132,7 +1791,7 @@ class TicTacToeBoard(object):
             move = self._convert_move(square, player)
             if self._is_valid_move(move, board):
                 board += move
-                return square, board
+                return int(square), board
         return None, board
     
     def _assert_valid_player(self, player):
@@ -164,11 +1823,11 @@ class TicTacToeBoard(object):
             return None
         
         # we want to introduce a little bit of randomness for equal values
-        if player is COMPUTER:
-            return max(potential_moves.items(), 
-                       key=lambda x: x[1] + .01 * random.randint(0, 99))
-        return min(potential_moves.items(), 
-                   key=lambda x: x[1] + .01 * random.randint(0, 99))
+        best_cost = (max if player is COMPUTER else min)(potential_moves.values())
+        square = self.tie_breaker.choose(sorted(square for square, cost 
+                                                in potential_moves.items()
+                                                if cost == best_cost))
+        return square, best_cost
     
     def _board_for_player(self, player, board):
         """
@@ -182,124 +1841,27 @@ class TicTacToeBoard(object):
         :raises: AssertionError
         """
         self._assert_valid_player(player) 
-        
-        mod = player + 1
-        player_board = 0
-        i = 0
-        while board:
-            last_two_digits = board & 3
-            if last_two_digits and not last_two_digits % mod:
-                player_board += (0b10 << i)
-            board = board >> 2
-            i += 2
-
-        return player_board
+        return player_board(board, player)
     
-    def _calculate_board_costs(self, board):
-        """
-        Calculates the cost for next computer play for the indicated board.
-        Returns a dictionary in the same format as PLAYBOOK.
-        
-        :param board: integer representing the current state of the board
-        :return: dictionary
-        :raises: AssertionError
-        """
-        board_dict = {}
-        revisit_list = []
-        
-        boards = [(board, 2)]
-        while boards:
-            board, player = boards.pop(0)
-            if (board, player) not in board_dict:
-                new_boards, board_costs, revisit = self._calculate_board_variations(
-                                                                board, player)
-                boards.extend(new_boards)
-                revisit_list.extend(revisit)
-                board_dict[(board, player)] = board_costs
-        
-        while revisit_list:
-            # starting at the end, where there are more complete boards (and 
-            # more likely to be fully calculated)
-            board, player, square, new_board = revisit_list.pop()
-            
-            board_values = board_dict[(board, player)]
-            if None in board_values.values():
-                try:
-                    new_player = ~player & 0x3
-                    next_move = board_dict[(new_board, new_player)]
-                    best_move = self._best_move(next_move, new_player)[1]
-                    if best_move:
-                        # we want wins to happen sooner, and losses to happen
-                        # later
-                        best_move += [-1, 1][best_move < 0]
-                    board_dict[(board, player)][square] = best_move
-                except TypeError:
-                    # the next move still has to be calculated
-                    revisit_list.insert(0, (board, player, square, new_board))
-        
-        return board_dict
-    
-    def _calculate_board_variations(self, board, player):
-        """
-        Finds all possible next moves for the specified board.
-        Returns a list of boards that still need to be investigated, a 
-        dictionary of calculated costs for the current board, and board
-        moves that need to be calculated later after its sub-moves have been
-        calculated.
-        
-        :param board: integer representing a board
-        :param player: integer representing a player (1 or 2)
-        :return: (list, dict, list)
-        """
-        board_list = []
-        board_dict = {}
-        revisit_list = []
-        
-        valid_moves = self._get_valid_moves(board)
-        for square in valid_moves:
-            new_board = self._apply_move(square, board, player)[1]
-            if self._has_won(player, new_board):
-                if player is HUMAN:
-                    board_dict[square] = LOSS_VALUE
-                else:
-                    board_dict[square] = WIN_VALUE
-            elif self._is_board_full(new_board):
-                board_dict[square] = TIE_VALUE
-            else:
-                other_player = ~player & 0x3
-                board_list.append((new_board, other_player))
-                
-                # we'll calculate this later
-                board_dict[square] = None
-                revisit_list.append((board, player, square, new_board))
-        
-        return board_list, board_dict, revisit_list
-            
-    def _choose_square(self, board):
+    def _choose_square(self, board, rank=None):
         """
         Picks a square for the computer to make its move.
         
-        The method iterates through possible outcomes (wins, losses, ties)
+        The method searches through possible outcomes (wins, losses, ties)
         and picks the path with the lowest cost. Outcomes that take longer to
         achieve will cost more; losses will cost significantly more and wins
-        will cost significantly less.
-        
-        Cost calculations are stored in the PLAYBOOK dictionary to minimize
-        repetition of calculations if they're needed again.
+        will cost significantly less. The costs come from self.engine, which
+        may be shared with other boards.
         
         :param board: integer representing a board
+        :param rank: board_rank(board), like self.rank, or None to work it out
         :return: integer
         :raises: InvalidStateException
         """
-        if (board, COMPUTER) not in PLAYBOOK:
-            new_moves = self._calculate_board_costs(board)
-            if not new_moves:
-                # let the UI handle it
-                raise InvalidStateException("No valid moves for the computer")             
-            PLAYBOOK.update(new_moves)
-            
-        potential_moves = PLAYBOOK[(board, COMPUTER)]
-        return self._best_move(potential_moves, COMPUTER)[0]
+        start = self.engine.metrics.start()
+        square = self.tie_breaker.choose(self.engine.best_squares(board, rank))
+        self.engine.metrics.observe('move', start)
+        return square
     
     def _convert_move(self, square, player):
         """
@@ -321,6 +1883,37 @@ class TicTacToeBoard(object):
         # so we add 1 to the player number to get the binary representation
         return (player + 1) << (2 * move)
     
+    def _count_board(self, board):
+        """
+        Counts each player's pieces in every line of a board from scratch, for
+        boards that weren't reached through self._count_move.
+        
+        :param board: integer representing a board
+        """
+        masks = split_board(board)
+        self.line_counts = sum(PLAYER_LINE_COUNTS[player][square]
+                               for player, mask in zip((HUMAN, COMPUTER), masks)
+                               for square in MASK_SQUARES[mask])
+        self.moves = len(MASK_SQUARES[masks[0] | masks[1]])
+        self.rank = board_rank(board)
+        self.counted_board = board
+    
+    def _count_move(self, square, player, board):
+        """
+        Adds a move to the line counts, in constant time. If the counts
+        aren't for the board the move was made on, they're left to be
+        recounted the next time they're needed.
+        
+        :param square: integer between 0 and 8 for an open square
+        :param player: integer representing player (1 or 2)
+        :param board: integer representing the board before the move
+        """
+        if board == self.counted_board:
+            self.line_counts += PLAYER_LINE_COUNTS[player][square]
+            self.moves += 1
+            self.rank += RANK_MOVES[player][square]
+            self.counted_board = board + self._convert_move(square, player)
+    
     def _game_over_validation(self, board):
         """
         Determines if the game is over based on the state of the board.
@@ -335,13 +1928,31 @@ class TicTacToeBoard(object):
         :param board: integer representing a board
         :return: (boolean, integer)
         """
-        winner = (self._has_won(HUMAN, board) or self._has_won(COMPUTER, board))
-        if winner:
+        game_over, winner = self._game_result(board)
+        if game_over:
             self._set_win(winner)
-            return True, winner
+        return game_over, winner
+    
+    def _game_result(self, board):
+        """
+        Determines if the game is over, the same way as
+        self._game_over_validation, but without keeping score.
         
-        if self._is_board_full(board):
-            self._set_win(winner)
+        The line counts and move counter kept by self._count_move answer this
+        without looking at the board, unless it was set some other way.
+        
+        :param board: integer representing a board
+        :return: (boolean, integer)
+        """
+        if board != self.counted_board:
+            self._count_board(board)
+        
+        counts = self.line_counts
+        complete = counts & (counts >> 1) & COMPLETE_LINE_BITS
+        if complete:
+            return True, HUMAN if complete & LOW_COUNT_BITS else COMPUTER
+        
+        if self.moves == 9:
             return True, None
         
         return False, None
@@ -353,15 +1964,7 @@ class TicTacToeBoard(object):
         :param board: integer representation of a board
         :return: list of integers between 0 and 8
         """
-        i = 0
-        moves = []
-        tmp_board = ~board & 0x3ffff
-        while tmp_board:
-            if (tmp_board & 0x3) == 3:
-                moves.append(i)
-            tmp_board = tmp_board >> 2
-            i += 1
-        return moves
+        return list(open_squares(board))
     
     def _has_won(self, player, board):
         """
@@ -373,10 +1976,8 @@ class TicTacToeBoard(object):
         :param board: integer representing a board
         :return: boolean
         """
-        player_board = self._board_for_player(player, board)
-        for combo in WINNING_MOVES:
-            if self._is_win(player_board, combo):
-                return player
+        if player_board(board, player) in _WINNING_BOARDS:
+            return player
         return None
     
     def _is_board_full(self, board):
@@ -387,8 +1988,7 @@ class TicTacToeBoard(object):
         :param board: integer representing a board
         :return: boolean
         """
-        full_board = 0x2aaaa  # all squares filled, ignoring which player
-        return full_board == full_board & board
+        return board & FULL_BOARD == FULL_BOARD
     
     def _is_valid_move(self, move, board):
         """
@@ -423,17 +2023,22 @@ class TicTacToeBoard(object):
         """Alternates the current self.turn between 0 and 1."""
         self.turn = ~self.turn & 0x1
     
-    def _set_win(self, player):
+    def _set_win(self, player, count=1):
         """
         Increments self.player_wins, self.player_losses, and self.ties for player.
         
         :param player: integer representing which player won the game
+        :param count: amount to add, or -1 to take a result back
         """
         if player is None:
-            self.ties += 1
+            self.ties += count
         else:
-            self.player_wins += int(player is HUMAN)
-            self.player_losses += int(player is COMPUTER)
+            self.player_wins += count * int(player is HUMAN)
+            self.player_losses += count * int(player is COMPUTER)
+        if self.stats is not None:
+            self.stats.add(self.player_name, count * int(player is HUMAN),
+                           count * int(player is COMPUTER), 
+                           count * int(player is None))
     
     def computer_move(self):
         """
@@ -448,12 +2053,18 @@ class TicTacToeBoard(object):
         if not self.is_computer_turn():
             return (None, False, None)
         
-        square = self._choose_square(self.board)
-        square, self.board = self._apply_move(square, self.board, self.turn+1)
+        board = self.board
+        if board != self.counted_board:
+            self._count_board(board)
+        square = self._choose_square(board, self.rank)
+        square, self.board = self._apply_move(square, board, self.turn+1)
         if square is None:
             raise InvalidStateException("Illegal move by computer") # let the UI handle it
+        self._count_move(square, COMPUTER, board)
         self._set_turn()
         self.game_over, winner = self._game_over_validation(self.board)
+        self.history = push_move(self.history, square, COMPUTER, self.game_over)
+        self.redo_moves = 0
         return (square, self.game_over, winner)   
     
     def get_square_label(self, square):
@@ -468,6 +2079,16 @@ class TicTacToeBoard(object):
             return ''
         return [PLAYER1, PLAYER2][(player - 1) is COMPUTER]
     
+    def history_moves(self):
+        """
+        Unpacks the moves played this game.
+        
+        :return: list of (square, player, scored), oldest first, where scored
+                    is True if the move ended the game and its result was
+                    added to the scores
+        """
+        return stack_moves(self.history)
+    
     def human_move(self, square):
         """
         Completes a move that the human has made.
@@ -479,11 +2100,15 @@ class TicTacToeBoard(object):
         if self.is_computer_turn():
             return (None, False, None)
         
-        square, self.board = self._apply_move(square, self.board, self.turn+1)
+        board = self.board
+        square, self.board = self._apply_move(square, board, self.turn+1)
         winner = None
         if square is not None:
+            self._count_move(square, HUMAN, board)
             self._set_turn()
             self.game_over, winner = self._game_over_validation(self.board)
+            self.history = push_move(self.history, square, HUMAN, self.game_over)
+            self.redo_moves = 0
         return (square, self.game_over, winner)
     
     def is_computer_turn(self):
@@ -496,6 +2121,27 @@ class TicTacToeBoard(object):
         """
         return bool(self.turn)
     
+    def make_move(self, square):
+        """
+        Plays a square for whoever's turn it is and pushes it onto
+        self.history, without keeping score.
+        Returns a tuple indicating (<square>, <game over>, <winner>), with
+        a square of None if the move wasn't made.
+        
+        :param square: integer from 0 to 8 indicating which square to play in
+        :return: (integer or None, boolean, integer or None)
+        """
+        player = self.turn + 1
+        board = self.board
+        square, self.board = self._apply_move(square, board, player)
+        if square is None:
+            return (None, self.game_over, None)
+        self._count_move(square, player, board)
+        self._set_turn()
+        self.game_over, winner = self._game_result(self.board)
+        self.history = push_move(self.history, square, player)
+        return (square, self.game_over, winner)
+    
     def player_stats(self, player):
         """
         Generates a string showing player wins, losses, and ties
@@ -504,20 +2150,107 @@ class TicTacToeBoard(object):
         :return: string
         """
         plyr = [PLAYER1, PLAYER2][player is COMPUTER]
-        wins = self.player_wins if player is HUMAN else self.player_losses
-        losses = self.player_losses if player is HUMAN else self.player_wins
-        ties = self.ties
+        player_wins, player_losses, ties = self.scores()
+        wins = player_wins if player is HUMAN else player_losses
+        losses = player_losses if player is HUMAN else player_wins
         
         return "(Player %s)\n\nWins: %s\nLosses: %s\nTies: %s" % (plyr, wins,
                                                                   losses, ties)
     
+    def redo_move(self):
+        """
+        Plays the last move that was undone again, putting its result back
+        into the scores if it ended the game.
+        Returns a tuple in the same format as self.make_move, with a square
+        of None if there was nothing to redo.
+        
+        :return: (integer or None, boolean, integer or None)
+        """
+        if not self.redo_moves:
+            return (None, self.game_over, None)
+        square, player, scored = top_move(self.redo_moves)
+        self.redo_moves >>= HISTORY_BITS
+        if player != self.turn + 1:
+            # the board has moved on some other way since the move was undone
+            self.redo_moves = 0
+            return (None, self.game_over, None)
+        board = self.board
+        square, self.board = self._apply_move(square, board, player)
+        if square is None:
+            self.redo_moves = 0
+            return (None, self.game_over, None)
+        self._count_move(square, player, board)
+        self._set_turn()
+        if scored:
+            self.game_over, winner = self._game_over_validation(self.board)
+        else:
+            self.game_over, winner = self._game_result(self.board)
+        self.history = push_move(self.history, square, player, scored)
+        return (square, self.game_over, winner)
+    
     def reset_board(self):
         """
         Sets self.board back to 0.
         Does not reset turns, wins, losses, or ties, because for the purposes
         of this game the player will have to exit the game in order to reset
-        their scores.
+        their scores. Scores kept in self.stats carry over even then.
         """
         self.board = 0
         self.game_over = False
- 
\ No newline at end of file
+        self.line_counts = 0
+        self.moves = 0
+        self.rank = 0
+        self.counted_board = 0
+        self.history = 0
+        self.redo_moves = 0
+    
+    def scores(self):
+        """
+        Finds the human's wins, losses and ties: every game on record in
+        self.stats if there is one, otherwise the games on this board.
+        
+        :return: (integer, integer, integer)
+        """
+        if self.stats is not None:
+            return self.stats.get(self.player_name)
+        return self.player_wins, self.player_losses, self.ties
+    
+    def undo_move(self):
+        """
+        Takes back the last move, the same way as self.unmake_move, and keeps
+        it to be played again by self.redo_move.
+        
+        :return: the square of the move, or None if there was none
+        """
+        if not self.history:
+            return None
+        move = self.history & HISTORY_MASK
+        self.unmake_move()
+        self.redo_moves = self.redo_moves << HISTORY_BITS | move
+        return top_move(move)[0]
+    
+    def unmake_move(self):
+        """
+        Pops the last move off self.history and takes it back in place, so
+        it's that player's turn again. If the move ended the game, its
+        result is taken back out of the scores.
+        
+        :return: the square of the move, or None if there was none
+        """
+        if not self.history:
+            return None
+        square, player, scored = top_move(self.history)
+        self.history >>= HISTORY_BITS
+        if scored:
+            self._set_win(board_winner(self.board), -1)
+        
+        move = self._convert_move(square, player)
+        if self.board == self.counted_board:
+            self.line_counts -= PLAYER_LINE_COUNTS[player][square]
+            self.moves -= 1
+            self.rank -= RANK_MOVES[player][square]
+            self.counted_board -= move
+        self.board -= move
+        self.turn = player - 1
+        self.game_over = False
+        return square
@@ -0,0 +1,262 @@
+"""
+Line-oriented text protocol for driving the engine from another process,
+in the style of the UCI protocol used by chess engines. Start it from the
+project root with:
+
+    python -m app.uci
+
+and write one command per line to its stdin. It keeps a single game, on a
+TicTacToeBoard, for as long as it runs, and answers on stdout:
+
+    uci                         id name ..., then uciok
+    isready                     readyok
+    ucinewgame, reset           clears the board; the human moves first
+    position startpos [computer] [moves 4 0 ...]
+    position board XO.X..... [human|computer] [moves ...]
+    position packed 262146 [moves ...]
+                                sets the position. A board string gives
+                                the squares row by row from the top left,
+                                with X for the human, O for the computer
+                                and . for an empty square. A packed
+                                position is an integer from GameState.pack.
+    move 4                      plays a square for the side to move
+    undo, redo                  takes back the last move, or plays the last
+                                move taken back again
+    go                          info move <square> score <score> for each
+                                move, best first, then bestmove <square>
+                                score <score>, or bestmove (none) if the
+                                game is over. Scores are from the point of
+                                view of the side to move.
+    d                           the board, its string, and the side to move
+    setoption name Seed value 5 seeds the choice between equal moves
+    quit                        stops
+
+Squares are numbered the same way as in TicTacToeBoard (see app/cli.py).
+Errors and unknown commands are answered with "info string ...", and never
+stop the stream.
+"""
+import sys
+
+from app.cli import ROWS, format_board
+from app.ttt import (COMPUTER, HUMAN, PLAYER1, PLAYER2, GameState,
+                     TicTacToeBoard, TieBreaker, board_winner, is_board_full)
+
+
+NAME = 'Tic-Tac-Toe'
+# each square in the order of a board string, and the string's characters
+STRING_SQUARES = tuple(square for row in ROWS for square in row)
+SQUARE_CHARACTERS = {0: '.', 2: PLAYER1, 3: PLAYER2}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_board_string(text):
+    """
+    Reads a nine-character board string (see the module docstring).
+
+    :param text: string
+    :return: integer representing a board
+    :raises: ProtocolError
+    """
+    values = dict((character, value) for value, character in SQUARE_CHARACTERS.items())
+    values['-'] = 0
+    if len(text) != 9 or any(character.upper() not in values for character in text):
+        raise ProtocolError("A board string is nine of %s" % ''.join(sorted(values)))
+    return sum(values[character.upper()] << (2 * square)
+               for square, character in zip(STRING_SQUARES, text))
+
+
+def board_string(board):
+    """
+    Writes a board as a nine-character board string.
+
+    :param board: integer representing a board
+    :return: string
+    """
+    return ''.join(SQUARE_CHARACTERS[(board >> (2 * square)) & 3]
+                   for square in STRING_SQUARES)
+
+
+class UciSession(object):
+    """
+    One long-lived game driven by protocol commands. Everything the engine
+    needs is set up once, when the session is created, and kept warm between
+    commands.
+
+    Public methods:
+        handle
+        run
+
+    """
+    def __init__(self, engine=None, tie_breaker=None):
+        """
+        :param engine: Engine for the board. Defaults to the global ENGINE.
+        :param tie_breaker: TieBreaker for choosing between equal moves.
+                    Defaults to the engine's.
+        :attr board: TicTacToeBoard holding the position
+        :attr running: boolean, False once 'quit' has been handled
+        """
+        super(UciSession, self).__init__()
+        self.board = TicTacToeBoard(engine, tie_breaker)
+        self.running = True
+        self.commands = {'uci': self._uci, 'isready': self._isready,
+                         'ucinewgame': self._reset, 'reset': self._reset,
+                         'position': self._position, 'move': self._move,
+                         'go': self._go, 'd': self._display,
+                         'undo': self._undo, 'redo': self._redo,
+                         'setoption': self._setoption, 'quit': self._quit}
+
+    def _display(self, args):
+        player = 'computer' if self.board.turn else 'human'
+        return format_board(self.board.board).split('\n') + [
+            'board %s %s' % (board_string(self.board.board), player)]
+
+    def _go(self, args):
+        ttt = self.board
+        if ttt.game_over:
+            return ['bestmove (none)']
+        player = [HUMAN, COMPUTER][ttt.turn]
+        costs = ttt.engine.calculate_board_costs(ttt.board, player)[(ttt.board, player)]
+
+        # costs are from the computer's point of view
+        sign = [-1, 1][player == COMPUTER]
+        square, cost = ttt._best_move(costs, player)
+        lines = ['info move %s score %s' % (move, sign * costs[move])
+                 for move in sorted(costs, key=lambda move: (-sign * costs[move], move))]
+        return lines + ['bestmove %s score %s' % (square, sign * cost)]
+
+    def _isready(self, args):
+        return ['readyok']
+
+    def _move(self, args):
+        if len(args) != 1 or not args[0].isdecimal():
+            raise ProtocolError("move takes one square")
+        self._play(int(args[0]))
+        return []
+
+    def _play(self, square):
+        """
+        Plays a square for the side to move.
+
+        :param square: integer
+        :raises: ProtocolError
+        """
+        if self.board.game_over:
+            raise ProtocolError("The game is over")
+        if self.board.make_move(square)[0] is None:
+            raise ProtocolError("%s isn't an open square" % square)
+
+    def _position(self, args):
+        if not args:
+            raise ProtocolError("position needs startpos, board or packed")
+        kind, args = args[0], args[1:]
+        if kind == 'startpos':
+            state = GameState()
+        elif kind == 'board' and args:
+            state = GameState(parse_board_string(args[0]))
+            args = args[1:]
+        elif kind == 'packed' and args:
+            try:
+                packed = int(args[0], 0)
+            except ValueError:
+                packed = -1
+            if not 0 <= packed < 1 << 20:
+                raise ProtocolError("%r is not a packed position" % args[0])
+            state = GameState.unpack(packed)
+            args = args[1:]
+        else:
+            raise ProtocolError("position needs startpos, board or packed")
+
+        if kind != 'packed' and args and args[0] in ('human', 'computer'):
+            state.turn = int(args.pop(0) == 'computer')
+        if args and args[0] != 'moves':
+            raise ProtocolError("Unexpected %r" % args[0])
+        if any((state.board >> (2 * square)) & 3 == 1 for square in range(9)):
+            raise ProtocolError("Not a board")
+
+        ttt = self.board
+        ttt.board, ttt.turn = state.board, state.turn
+        ttt.game_over = bool(board_winner(ttt.board)) or is_board_full(ttt.board)
+        ttt.history, ttt.redo_moves = 0, 0
+        for move in args[1:]:
+            if not move.isdecimal():
+                raise ProtocolError("%r is not a square" % move)
+            self._play(int(move))
+        return []
+
+    def _quit(self, args):
+        self.running = False
+        return []
+
+    def _redo(self, args):
+        if self.board.redo_move()[0] is None:
+            raise ProtocolError("No move to redo")
+        return []
+
+    def _reset(self, args):
+        self.board.reset_board()
+        self.board.turn = 0
+        return []
+
+    def _setoption(self, args):
+        text = ' '.join(args)
+        if not text.startswith('name ') or ' value ' not in text:
+            raise ProtocolError("setoption name <name> value <value>")
+        name, value = text[len('name '):].split(' value ', 1)
+        digits = value[1:] if value.startswith('-') else value
+        if name.lower() != 'seed' or not digits.isdecimal():
+            raise ProtocolError("The only option is Seed, an integer")
+        self.board.tie_breaker = TieBreaker(int(value))
+        return []
+
+    def _uci(self, args):
+        return ['id name %s' % NAME, 'option name Seed type spin', 'uciok']
+
+    def _undo(self, args):
+        if self.board.undo_move() is None:
+            raise ProtocolError("No move to undo")
+        return []
+
+    def handle(self, line):
+        """
+        Answers one command.
+
+        :param line: string
+        :return: list of lines to write back, without newlines
+        """
+        words = line.split()
+        if not words:
+            return []
+        command = self.commands.get(words[0])
+        if command is None:
+            return ['info string unknown command %s' % words[0]]
+        try:
+            return command(words[1:])
+        except ProtocolError as error:
+            return ['info string error %s' % error]
+
+    def run(self, stdin, stdout):
+        """
+        Answers commands from a stream until 'quit' or the end of the
+        stream, flushing the answers to each command as soon as they're
+        written.
+
+        :param stdin: file to read commands from
+        :param stdout: file to write the answers to
+        """
+        for line in stdin:
+            for answer in self.handle(line):
+                stdout.write(answer + '\n')
+            stdout.flush()
+            if not self.running:
+                break
+
+
+def main():
+    UciSession().run(sys.stdin, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compares choosing the computer's move one board at a time, the way
+TicTacToeBoard.computer_move does, with app.batch.choose_squares on the same
+100,000 positions. Run from the project root with:
+
+    python -m benchmarks.batch_bench
+"""
+import random
+import timeit
+
+import numpy
+
+from app.batch import BatchSolver
+from app.ttt import (COMPUTER, HUMAN, SQUARE_MOVES, TicTacToeBoard,
+                     board_winner, is_board_full, open_squares)
+
+
+def random_positions(count, seed=42):
+    """
+    Plays random moves on empty boards, stopping each at a random point.
+
+    :param count: number of boards
+    :param seed: seed for the random number generator
+    :return: list of integers
+    """
+    rng = random.Random(seed)
+    boards = []
+    for i in range(count):
+        board = 0
+        player = rng.choice((HUMAN, COMPUTER))
+        for move in range(rng.randint(0, 9)):
+            if board_winner(board) or is_board_full(board):
+                break
+            board |= SQUARE_MOVES[player][rng.choice(open_squares(board))]
+            player = ~player & 0x3
+        boards.append(board)
+    return boards
+
+
+def one_at_a_time(ttt, boards):
+    """
+    Game-over check and move choice for each board in turn.
+
+    :param ttt: TicTacToeBoard
+    :param boards: list of integers representing boards
+    :return: list of squares, None for finished games
+    """
+    squares = []
+    for board in boards:
+        if board_winner(board) or is_board_full(board):
+            squares.append(None)
+        else:
+            squares.append(ttt._choose_square(board))
+    return squares
+
+
+def main():
+    boards = random_positions(100000)
+    array_boards = numpy.array(boards, dtype=numpy.int64)
+    ttt = TicTacToeBoard()
+    solver = BatchSolver()
+
+    old = min(timeit.repeat(lambda: one_at_a_time(ttt, boards), number=1,
+                            repeat=3))
+    new = min(timeit.repeat(lambda: solver.choose_squares(array_boards),
+                            number=1, repeat=3))
+    build = min(timeit.repeat(BatchSolver, number=1, repeat=3))
+    print("%-18s %12s" % ('', 'time (ms)'))
+    print("%-18s %12.1f" % ('one at a time', 1000 * old))
+    print("%-18s %12.1f" % ('choose_squares', 1000 * new))
+    print("%-18s %12.1f" % ('BatchSolver()', 1000 * build))
+    print("%-18s %11.1fx" % ('speedup', old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Compares the memory used by a fully populated PLAYBOOK as a dictionary of
+dictionaries with the same positions in a PlaybookArray. Run from the project
+root with:
+
+    python -m benchmarks.playbook_memory
+"""
+import sys
+
+from app.build_table import solve_positions
+from app.ttt import (MASK_SYMMETRIES, Engine, PlaybookArray, join_board,
+                     keyed_playbook, split_board)
+
+
+def deep_size(playbook):
+    """
+    Totals the size of a dictionary of dictionaries, including its keys and
+    values. Small integers are shared by the interpreter, so they aren't
+    counted.
+
+    :param playbook: dictionary in the same format as OPENING_BOOK
+    :return: integer, in bytes
+    """
+    size = sys.getsizeof(playbook)
+    for key, potential_moves in playbook.items():
+        size += sys.getsizeof(key) + sys.getsizeof(key[0])
+        size += sys.getsizeof(potential_moves)
+    return size
+
+
+def all_positions(canonical):
+    """
+    Solves every reachable position, with each board in every orientation
+    unless only canonical boards are wanted.
+
+    :param canonical: boolean
+    :return: dictionary in the same format as OPENING_BOOK
+    """
+    engine = Engine()
+    positions = solve_positions()
+    if canonical:
+        return positions
+
+    playbook = {}
+    for board, player in positions:
+        for variant in variants(board):
+            playbook.update(engine.calculate_board_costs(variant, player))
+    return playbook
+
+
+def variants(board):
+    """
+    Finds the rotations and reflections of a board.
+
+    :param board: integer representing a board
+    :return: set of integers
+    """
+    human, computer = split_board(board)
+    return set(join_board(symmetry[human], symmetry[computer])
+               for symmetry in MASK_SYMMETRIES)
+
+
+def main():
+    print("%-22s %10s %14s %14s" % ('positions', 'entries', 'dict (bytes)',
+                                    'array (bytes)'))
+    for name, canonical in (('canonical', True), ('every orientation', False)):
+        playbook = all_positions(canonical)
+        array_playbook = PlaybookArray(keyed_playbook(playbook))
+        array_size = (sys.getsizeof(array_playbook) +
+                      sys.getsizeof(array_playbook.__dict__) +
+                      sys.getsizeof(array_playbook.records))
+        print("%-22s %10s %14s %14s" % (name, len(playbook),
+                                        deep_size(playbook), array_size))
+
+
+if __name__ == '__main__':
+    main()
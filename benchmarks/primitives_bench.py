@@ -0,0 +1,116 @@
+"""
+Per-call timings for the board primitives that the solver calls on every
+node, compared with the loops they replaced. Run from the project root with:
+
+    python -m benchmarks.primitives_bench
+"""
+import random
+import timeit
+
+from app.ttt import WINNING_MOVES, TicTacToeBoard
+
+
+def legacy_board_for_player(player, board):
+    """The old loop in TicTacToeBoard._board_for_player."""
+    mod = player + 1
+    player_board = 0
+    i = 0
+    while board:
+        last_two_digits = board & 3
+        if last_two_digits and not last_two_digits % mod:
+            player_board += (0b10 << i)
+        board = board >> 2
+        i += 2
+    return player_board
+
+
+def legacy_has_won(player, board):
+    """The old loop in TicTacToeBoard._has_won."""
+    player_board = legacy_board_for_player(player, board)
+    for combo in WINNING_MOVES:
+        if combo == player_board & combo:
+            return player
+    return None
+
+
+def legacy_get_valid_moves(board):
+    """The old loop in TicTacToeBoard._get_valid_moves."""
+    i = 0
+    moves = []
+    tmp_board = ~board & 0x3ffff
+    while tmp_board:
+        if (tmp_board & 0x3) == 3:
+            moves.append(i)
+        tmp_board = tmp_board >> 2
+        i += 1
+    return moves
+
+
+def legacy_is_board_full(board):
+    """The old TicTacToeBoard._is_board_full."""
+    full_board = 0x2aaaa
+    return full_board == full_board & board
+
+
+def random_boards(count, seed=42):
+    """
+    Generates boards with random pieces for timing.
+
+    :param count: number of boards
+    :param seed: seed for the random number generator
+    :return: list of integers
+    """
+    rng = random.Random(seed)
+    boards = []
+    for i in range(count):
+        board = 0
+        for square in range(9):
+            board |= rng.choice((0, 2, 3)) << (2 * square)
+        boards.append(board)
+    return boards
+
+
+def per_call(func, boards, repeat=5):
+    """
+    Times `func` over every board and returns the fastest time per call, in
+    nanoseconds.
+
+    :param func: callable taking a board
+    :param boards: list of integers representing boards
+    :param repeat: number of runs
+    :return: float
+    """
+    best = min(timeit.repeat(lambda: [func(board) for board in boards],
+                             number=1, repeat=repeat))
+    return 1e9 * best / len(boards)
+
+
+def main():
+    ttt = TicTacToeBoard()
+    boards = random_boards(20000)
+
+    for board in boards:
+        for player in (1, 2):
+            assert (legacy_board_for_player(player, board) ==
+                    ttt._board_for_player(player, board))
+            assert legacy_has_won(player, board) == ttt._has_won(player, board)
+        assert legacy_get_valid_moves(board) == ttt._get_valid_moves(board)
+        assert legacy_is_board_full(board) == ttt._is_board_full(board)
+
+    print("%-20s %12s %12s %9s" % ('primitive', 'loop (ns)', 'table (ns)',
+                                   'speedup'))
+    for name, old, new in (
+            ('_board_for_player', lambda board: legacy_board_for_player(2, board),
+             lambda board: ttt._board_for_player(2, board)),
+            ('_has_won', lambda board: legacy_has_won(2, board),
+             lambda board: ttt._has_won(2, board)),
+            ('_get_valid_moves', legacy_get_valid_moves, ttt._get_valid_moves),
+            ('_is_board_full', legacy_is_board_full, ttt._is_board_full)):
+        old_time = per_call(old, boards)
+        new_time = per_call(new, boards)
+        print("%-20s %12.0f %12.0f %8.1fx" % (name, old_time, new_time,
+                                              old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
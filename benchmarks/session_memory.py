@@ -0,0 +1,65 @@
+"""
+Measures the memory used per live game by a TicTacToeBoard, a GameState,
+and a GameState packed into an array of 32-bit integers. Run from the
+project root with:
+
+    python -m benchmarks.session_memory
+"""
+import array
+import gc
+import tracemalloc
+
+from app.ttt import ENGINE, GameState, TicTacToeBoard
+
+
+GAMES = 100000
+
+
+def bytes_per_game(make_games):
+    """
+    Finds how much memory a batch of games takes, per game.
+
+    :param make_games: callable returning a container of GAMES games
+    :return: float
+    """
+    gc.collect()
+    tracemalloc.start()
+    games = make_games()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del games
+    return size / float(GAMES)
+
+
+def boards():
+    """Today's game objects, each one move in."""
+    games = [TicTacToeBoard() for i in range(GAMES)]
+    for game in games:
+        game.human_move(0)
+    return games
+
+
+def states():
+    """GameState objects, each one move in."""
+    games = [GameState() for i in range(GAMES)]
+    for game in games:
+        ENGINE.human_move(game, 0)
+    return games
+
+
+def packed_states():
+    """GameStates packed into an array, each one move in."""
+    state = GameState()
+    ENGINE.human_move(state, 0)
+    return array.array('I', [state.pack()]) * GAMES
+
+
+def main():
+    print("%-16s %14s" % ('game', 'bytes per game'))
+    for name, make_games in (('TicTacToeBoard', boards), ('GameState', states),
+                             ('packed', packed_states)):
+        print("%-16s %14.1f" % (name, bytes_per_game(make_games)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Compares the negamax solver in Engine.calculate_board_costs with the
+breadth-first solver it replaced, on an empty board and on every opening.
+Run from the project root with:
+
+    python -m benchmarks.solver_bench
+"""
+import timeit
+
+from app.ttt import (COMPUTER, HUMAN, LOSS_VALUE, TIE_VALUE, WIN_VALUE, Engine,
+                     TicTacToeBoard)
+
+
+def legacy_board_variations(board_obj, board, player):
+    """The old TicTacToeBoard._calculate_board_variations, for comparison."""
+    board_list = []
+    board_dict = {}
+    revisit_list = []
+
+    for square in board_obj._get_valid_moves(board):
+        new_board = board_obj._apply_move(square, board, player)[1]
+        if board_obj._has_won(player, new_board):
+            board_dict[square] = LOSS_VALUE if player is HUMAN else WIN_VALUE
+        elif board_obj._is_board_full(new_board):
+            board_dict[square] = TIE_VALUE
+        else:
+            board_list.append((new_board, ~player & 0x3))
+            board_dict[square] = None
+            revisit_list.append((board, player, square, new_board))
+    return board_list, board_dict, revisit_list
+
+
+def legacy_board_costs(board_obj, board):
+    """The old breadth-first TicTacToeBoard._calculate_board_costs."""
+    board_dict = {}
+    revisit_list = []
+
+    boards = [(board, 2)]
+    while boards:
+        board, player = boards.pop(0)
+        if (board, player) not in board_dict:
+            new_boards, board_costs, revisit = legacy_board_variations(
+                board_obj, board, player)
+            boards.extend(new_boards)
+            revisit_list.extend(revisit)
+            board_dict[(board, player)] = board_costs
+
+    while revisit_list:
+        board, player, square, new_board = revisit_list.pop()
+        board_values = board_dict[(board, player)]
+        if None in board_values.values():
+            try:
+                new_player = ~player & 0x3
+                next_move = board_dict[(new_board, new_player)]
+                best_move = board_obj._best_move(next_move, new_player)[1]
+                if best_move:
+                    best_move += [-1, 1][best_move < 0]
+                board_dict[(board, player)][square] = best_move
+            except TypeError:
+                revisit_list.insert(0, (board, player, square, new_board))
+    return board_dict
+
+
+def negamax_board_costs(board):
+    """Cold negamax solve: the transposition table starts out empty."""
+    return Engine().calculate_board_costs(board)
+
+
+def best_time(func, repeat=5):
+    """
+    Runs `func` `repeat` times and returns the fastest run, in milliseconds.
+
+    :param func: callable taking no arguments
+    :param repeat: number of runs
+    :return: float
+    """
+    return 1000 * min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    board_obj = TicTacToeBoard()
+    positions = [('empty board', 0)]
+    positions.extend(('human opens %s' % square,
+                      board_obj._convert_move(square, HUMAN))
+                     for square in range(9))
+
+    print("%-16s %12s %12s %9s" % ('position', 'bfs (ms)', 'negamax (ms)',
+                                   'speedup'))
+    for name, board in positions:
+        legacy = legacy_board_costs(board_obj, board)[(board, COMPUTER)]
+        negamax = negamax_board_costs(board)[(board, COMPUTER)]
+        assert legacy == negamax, (name, legacy, negamax)
+
+        old = best_time(lambda: legacy_board_costs(board_obj, board))
+        new = best_time(lambda: negamax_board_costs(board))
+        print("%-16s %12.2f %12.2f %8.1fx" % (name, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Benchmark suite for the engine's hot paths, with a stored baseline to catch
+slowdowns. Every benchmark uses fixed seeds, so each run does the same work.
+Run from the project root with:
+
+    python -m benchmarks.suite
+
+This times every benchmark, writes the results as JSON (to --output, if
+given), and compares them with benchmarks/baseline.json. If any benchmark is
+slower than its baseline by more than --threshold (25% by default), it
+prints which and exits with status 1. After a deliberate change in speed,
+or on a new machine, record a new baseline with:
+
+    python -m benchmarks.suite --update-baseline
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+from app.simulate import play_games
+from app.ttt import (BOOK_DEPTH, COMPUTER, HUMAN, SQUARE_MOVES, Engine, GameState,
+                     TicTacToeBoard, TieBreaker, board_winner, is_board_full,
+                     open_squares)
+from benchmarks.primitives_bench import random_boards
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baseline.json')
+THRESHOLD = .25
+REPEAT = 5
+SEED = 42
+TIE_BREAKER = TieBreaker(deterministic=True)
+
+
+def computer_move_cold():
+    """
+    The computer's moves with a new engine that has neither the table nor
+    the opening book, so every move is a playbook miss and a solve: the
+    computer's opening, and positions deeper than the book.
+    """
+    deep = [board for board in random_positions(500)
+            if len(open_squares(board)) < 9 - BOOK_DEPTH]
+    boards = [0] + deep[:4]
+
+    def run():
+        engine = Engine(table=None, tie_breaker=TIE_BREAKER, book=None)
+        for board in boards:
+            engine.computer_move(GameState(board, 1))
+        return engine
+
+    # make sure every move really is solved, not looked up
+    solves = run().metrics.snapshot()['counters'].get('solves', 0)
+    if solves != len(boards):
+        raise AssertionError("computer_move_cold solved %s of %s positions" % 
+                             (solves, len(boards)))
+    return run, len(boards)
+
+
+def computer_move_warm():
+    """The computer's moves once the playbook has every position cached."""
+    engine = Engine(table=None, tie_breaker=TIE_BREAKER)
+    boards = random_positions(500)
+    for board in boards:
+        engine.potential_moves(board)
+
+    def run():
+        for board in boards:
+            engine.computer_move(GameState(board, 1))
+    return run, len(boards)
+
+
+def computer_move_table():
+    """The computer's moves looked up in the solved table."""
+    engine = Engine(tie_breaker=TIE_BREAKER)
+    boards = random_positions(500)
+
+    def run():
+        for board in boards:
+            engine.computer_move(GameState(board, 1))
+    return run, len(boards)
+
+
+def calculate_board_costs():
+    """
+    Cold solves for either player: after each of the human's nine openings,
+    the computer's opening, after each of the computer's openings, and in
+    the middle of games.
+    """
+    positions = ([(SQUARE_MOVES[HUMAN][square], COMPUTER) for square in range(9)] +
+                 [(0, COMPUTER)] +
+                 [(SQUARE_MOVES[COMPUTER][square], HUMAN) for square in range(9)])
+    for board in random_positions(500)[:40]:
+        squares = open_squares(board)
+        if len(squares) < 9 - BOOK_DEPTH:
+            # the same game, with the human to move after the computer
+            reply = board | SQUARE_MOVES[COMPUTER][squares[0]]
+            positions.append((board, COMPUTER))
+            if not (board_winner(reply) or is_board_full(reply)):
+                positions.append((reply, HUMAN))
+
+    def run():
+        engine = Engine(table=None, book=None)
+        for board, player in positions:
+            engine.calculate_board_costs(board, player)
+    return run, len(positions)
+
+
+def primitive(name):
+    """One of TicTacToeBoard's board primitives, on random boards."""
+    def setup():
+        ttt = TicTacToeBoard()
+        boards = random_boards(10000, SEED)
+        method = getattr(ttt, name)
+        if name == '_get_valid_moves':
+            run = lambda: [method(board) for board in boards]
+        else:
+            run = lambda: [method(COMPUTER, board) for board in boards]
+        return run, len(boards)
+    setup.__doc__ = "TicTacToeBoard.%s on random boards." % name
+    return setup
+
+
+def full_games():
+    """Whole games against a random opponent, with the solved table."""
+    return lambda: play_games('random', False, 1000, SEED), 1000
+
+
+def random_positions(count):
+    """
+    Plays random moves from empty boards, stopping at random points where
+    it's the computer's turn in a game that isn't over.
+
+    :param count: number of boards
+    :return: list of integers
+    """
+    rng = random.Random(SEED)
+    boards = []
+    while len(boards) < count:
+        board = 0
+        player = rng.choice((HUMAN, COMPUTER))
+        for move in range(rng.randint(0, 8)):
+            if board_winner(board) or is_board_full(board):
+                break
+            board |= SQUARE_MOVES[player][rng.choice(open_squares(board))]
+            player = ~player & 0x3
+        if (player == COMPUTER and not board_winner(board) and
+                not is_board_full(board)):
+            boards.append(board)
+    return boards
+
+
+BENCHMARKS = collections.OrderedDict((
+    ('computer_move_cold', computer_move_cold),
+    ('computer_move_warm', computer_move_warm),
+    ('computer_move_table', computer_move_table),
+    ('calculate_board_costs', calculate_board_costs),
+    ('has_won', primitive('_has_won')),
+    ('get_valid_moves', primitive('_get_valid_moves')),
+    ('board_for_player', primitive('_board_for_player')),
+    ('full_games', full_games),
+))
+
+
+def time_benchmark(setup, repeat=REPEAT):
+    """
+    Times a benchmark, taking the fastest of `repeat` runs.
+
+    :param setup: function returning (run, operations per run)
+    :param repeat: number of runs
+    :return: float seconds per operation
+    """
+    run, operations = setup()
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / operations
+
+
+def run_suite(names=None, repeat=REPEAT):
+    """
+    Times every benchmark, or just the ones named.
+
+    :param names: list of names from BENCHMARKS, or None for all of them
+    :param repeat: number of runs of each benchmark
+    :return: dictionary of results, in the format written as JSON
+    """
+    results = collections.OrderedDict()
+    for name in names or BENCHMARKS:
+        results[name] = time_benchmark(BENCHMARKS[name], repeat)
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'seconds_per_op': results}
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    Compares results with a baseline. Returns the benchmarks that slowed
+    down by more than `threshold`, as a fraction of the baseline time.
+    Benchmarks missing from either side are skipped.
+
+    :param results: dictionary from run_suite
+    :param baseline: dictionary from run_suite
+    :param threshold: float, e.g. .25 for 25% slower
+    :return: list of (name, baseline seconds, new seconds)
+    """
+    slower = []
+    for name, seconds in results['seconds_per_op'].items():
+        old = baseline['seconds_per_op'].get(name)
+        if old is not None and seconds > old * (1 + threshold):
+            slower.append((name, old, seconds))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help="benchmarks to run (all of them by default): %s" %
+                        ', '.join(BENCHMARKS))
+    parser.add_argument('--output', help="file to write the results to")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark %r" % name)
+
+    results = run_suite(args.names, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as output:
+            json.dump(results, output, indent=2)
+            output.write('\n')
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print("%-24s %14s %14s %9s" % ('benchmark', 'baseline (us)', 'now (us)',
+                                   'change'))
+    for name, seconds in results['seconds_per_op'].items():
+        old = baseline and baseline['seconds_per_op'].get(name)
+        if old:
+            print("%-24s %14.2f %14.2f %+8.0f%%" % (name, 1e6 * old, 1e6 * seconds,
+                                                   100 * (seconds / old - 1)))
+        else:
+            print("%-24s %14s %14.2f %9s" % (name, '-', 1e6 * seconds, ''))
+
+    slower = compare(results, baseline, args.threshold) if baseline else []
+    for name, old, seconds in slower:
+        print("%s is more than %.0f%% slower than the baseline" %
+              (name, 100 * args.threshold))
+    return int(bool(slower))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from app.analyze import *
+from app.batch import choose_squares
+from app.ttt import ENGINE
+from app.uci import board_string
+
+
+class AnalyzeTests(unittest.TestCase):
+
+    def test_read_board(self):
+        self.assertEqual(0x20000, read_board(0x20000))
+        self.assertEqual(0x20000, read_board('0x20000'))
+        self.assertEqual(0x20000, read_board(' 131072 '))
+        self.assertEqual(0x20000, read_board(board_string(0x20000)))
+        # nine characters, but an integer rather than a board string
+        self.assertEqual(0x20000, read_board('0x0020000'))
+        self.assertEqual(0x20000, read_board('0o0400000'))
+        for value in (None, True, 1.5, 'zzz', '0x1', 1 << 18, 'XO.X....?'):
+            self.assertRaises(ValueError, read_board, value)
+
+    def test_outcome(self):
+        self.assertEqual(['loss', 'tie', 'win'], [outcome(score) for score in (-8, 0, 6)])
+
+    def test_analyze_rows(self):
+        boards = [0, 0x20000, 0x2082f, 0x20323] * 7
+        rows = [{'id': index, 'board': board} for index, board in enumerate(boards)]
+        rows.insert(5, {'id': 'bad', 'board': 'zzz'})
+        rows.append({'id': 'over', 'board': 'XXXOO....'})
+        analyzed = list(analyze_rows(rows, processes=2, chunk_size=3))
+
+        self.assertEqual([row['id'] for row in rows], [row['id'] for row in analyzed])
+        self.assertEqual((None, 'invalid'), (analyzed[5]['best_move'], analyzed[5]['outcome']))
+        self.assertEqual((None, True, 'loss'), (analyzed[-1]['best_move'],
+                                                analyzed[-1]['game_over'],
+                                                analyzed[-1]['outcome']))
+        valid = [row for row in analyzed[:-1] if row['id'] != 'bad']
+        scores = choose_squares(boards)[1]
+        self.assertEqual(scores.tolist(), [row['score'] for row in valid])
+        for row, board in zip(valid, boards):
+            self.assertIn(row['best_move'], ENGINE.best_squares(board))
+            self.assertFalse(row['game_over'])
+
+    def test_main_csv(self):
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, 'positions.csv')
+        target = os.path.join(directory, 'analysis.csv')
+        with io.open(source, 'w', newline='') as source_file:
+            source_file.write('id,position\n1,0x20000\n2,oops\n')
+        self.assertEqual(0, main([source, target, '--column', 'position',
+                                  '--processes', '1']))
+        with io.open(target, newline='') as target_file:
+            lines = target_file.read().splitlines()
+        self.assertEqual('id,position,best_move,score,outcome,game_over', lines[0])
+        self.assertEqual('2,oops,,,invalid,', lines[2])
+        self.assertTrue(lines[1].startswith('1,0x20000,'))
+
+    def test_write_rows_jsonl(self):
+        output = io.StringIO()
+        rows = read_rows(io.StringIO('{"board": 0}\n\n{"board": "X........"}\n'), 'jsonl')
+        self.assertEqual(2, write_rows(analyze_rows(rows, processes=1), output, 'jsonl'))
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(['board'] + list(FIELDS), list(lines[0]))
+        self.assertEqual('tie', lines[1]['outcome'])
+
+    def test_read_rows_bad_lines(self):
+        # lines that aren't JSON objects are kept, as invalid rows
+        stream = io.StringIO('{"board": 0}\n{"board": \n[1, 2]\n"X........"\n')
+        rows = list(read_rows(stream, 'jsonl'))
+        self.assertEqual([{'board': 0}, {'line': '{"board": '}, {'line': '[1, 2]'},
+                          {'line': '"X........"'}], rows)
+        analyzed = list(analyze_rows(rows + [[3, 4]], processes=1))
+        self.assertEqual(['tie'] + ['invalid'] * 4, [row['outcome'] for row in analyzed])
+        self.assertEqual([3, 4], analyzed[-1]['line'])
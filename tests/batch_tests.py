@@ -0,0 +1,105 @@
+import random
+import unittest
+
+import numpy
+
+from app.batch import *
+from app.ttt import *
+
+
+def random_boards(count, seed):
+    """
+    Plays random moves on empty boards, stopping each at a random point.
+
+    :param count: number of boards
+    :param seed: seed for the random number generator
+    :return: list of integers
+    """
+    rng = random.Random(seed)
+    boards = []
+    for i in range(count):
+        board = 0
+        player = rng.choice((HUMAN, COMPUTER))
+        for move in range(rng.randint(0, 9)):
+            if board_winner(board) or is_board_full(board):
+                break
+            board |= SQUARE_MOVES[player][rng.choice(open_squares(board))]
+            player = ~player & 0x3
+        boards.append(board)
+    return boards
+
+
+class BatchSolverTests(unittest.TestCase):
+
+    def test_split_boards(self):
+        boards = random_boards(500, 0) + [0, 0b111011101110111011]
+        human, computer = split_boards(numpy.array(boards))
+        self.assertEqual([split_board(board) for board in boards],
+                         list(zip(human.tolist(), computer.tolist())))
+
+    def test_records(self):
+        solver = BatchSolver()
+
+        # every orientation of every position in the table
+        for rank in range(3 ** 9):
+            canonical = canonical_board(unrank_board(rank))[0]
+            self.assertEqual(bool(solver.records[rank]),
+                             bool(table_record(SOLVED_TABLE, position_key(canonical, COMPUTER))))
+        for board in (0x00000, 0x20000, 0x20203, 0x3000a):
+            for k in range(8):
+                human, computer = split_board(board)
+                variant = join_board(MASK_SYMMETRIES[k][human],
+                                     MASK_SYMMETRIES[k][computer])
+                self.assertEqual(unpack_record(int(solver.records[board_rank(variant)])),
+                                 ENGINE.potential_moves(variant))
+
+        # nothing to spread out without a table
+        solver = BatchSolver(Engine(table=None))
+        self.assertEqual(0, numpy.count_nonzero(solver.records))
+
+    def test_choose_squares(self):
+        boards = random_boards(2000, 1)
+        for solver in (BatchSolver(), BatchSolver(Engine(table=None))):
+            squares, scores, game_over = solver.choose_squares(
+                boards, numpy.random.default_rng(0))
+
+            for i, board in enumerate(boards):
+                winner = board_winner(board)
+                if winner or is_board_full(board):
+                    self.assertTrue(game_over[i])
+                    self.assertEqual(-1, squares[i])
+                    self.assertEqual({HUMAN: LOSS_VALUE, COMPUTER: WIN_VALUE,
+                                      None: TIE_VALUE}[winner], scores[i])
+                    continue
+
+                potential_moves = ENGINE.potential_moves(board)
+                self.assertFalse(game_over[i])
+                self.assertEqual(max(potential_moves.values()), scores[i])
+                self.assertEqual(scores[i], potential_moves[squares[i]])
+
+    def test_unreachable_boards(self):
+        # these aren't in the table, so they're searched and kept
+        boards = [0x20200, 0b100010000000000000, 0b000010000000000010]
+        squares, scores, game_over = choose_squares(boards)
+        self.assertEqual([0, 7, 2], squares.tolist())
+        self.assertEqual([False] * 3, game_over.tolist())
+        for board, square, score in zip(boards, squares, scores):
+            self.assertEqual(ENGINE.potential_moves(board)[square], score)
+
+        solver = BatchSolver()
+        solver.choose_squares(boards)
+        for board in boards:
+            self.assertTrue(solver.records[board_rank(board)])
+
+    def test_rng(self):
+        boards = [0] * 1000
+        first = choose_squares(boards, numpy.random.default_rng(5))[0]
+        second = choose_squares(boards, numpy.random.default_rng(5))[0]
+        self.assertEqual(first.tolist(), second.tolist())
+
+        # equally good moves are all used
+        self.assertEqual(set(OPENING_BOOK[(0, COMPUTER)]), set(first.tolist()))
+
+    def test_empty(self):
+        squares, scores, game_over = choose_squares([])
+        self.assertEqual((0, 0, 0), (len(squares), len(scores), len(game_over)))
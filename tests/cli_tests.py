@@ -0,0 +1,78 @@
+import io
+import subprocess
+import sys
+import unittest
+
+from app.cli import *
+from app.ttt import Engine
+
+
+# imports every module that runs without the UI, with Kivy made impossible to
+# import, and prints any GUI modules that were imported anyway
+NO_GUI_SCRIPT = """
+import sys
+
+class NoGui(object):
+    def find_spec(self, name, path=None, target=None):
+        if name.split('.')[0] in %r:
+            raise ImportError("%%s imported by the engine" %% name)
+
+sys.meta_path.insert(0, NoGui())
+import app.ttt, app.cli, app.batch, app.build_book, app.build_table
+import app.grid, app.server, app.simulate, app.uci, app.analyze, app.stats
+print(' '.join(name for name in sys.modules if name.split('.')[0] in %r))
+""" % (GUI_MODULES, GUI_MODULES)
+
+
+class CliTests(unittest.TestCase):
+
+    def test_format_board(self):
+        self.assertEqual('X | 7 | 6\n---------\n1 | O | 5\n---------\n2 | 3 | 4',
+                         format_board(0x20003))
+
+    def test_parse_board(self):
+        self.assertEqual(0x20003, parse_board('0x20003'))
+        self.assertEqual(3, parse_board('3'))
+        for text in ('0x1', '1 << 18', '-2', str(1 << 18)):
+            self.assertRaises(ValueError, parse_board, text)
+
+    def test_move(self):
+        self.assertEqual('2 4 6 8', move(0))
+        self.assertEqual('0', move(0x20000))
+        self.assertEqual('No valid moves for the computer',
+                         move(0b101011101111101110, Engine(table=None)))
+
+    def test_play(self):
+        # the computer wins 0-1-5 after the human ignores it
+        stdout = io.StringIO()
+        winner = play('human', io.StringIO('8\n2\nx\n\u00b2\n4\n'), stdout,
+                      tie_breaker=TieBreaker(deterministic=True))
+        self.assertEqual(COMPUTER, winner)
+        self.assertTrue("x isn't an open square" in stdout.getvalue())
+        self.assertTrue("\u00b2 isn't an open square" in stdout.getvalue())
+        self.assertTrue(stdout.getvalue().endswith('You lose!\n'))
+
+        # the game stops at the end of the input
+        stdout = io.StringIO()
+        self.assertEqual(None, play('computer', io.StringIO('q\n'), stdout))
+        self.assertEqual(1, stdout.getvalue().count('Computer plays'))
+
+    def test_main(self):
+        stdout = io.StringIO()
+        self.assertEqual(0, main(['move', '0x20000'], stdout=stdout))
+        self.assertEqual('0\n', stdout.getvalue())
+        self.assertEqual(2, main([], stdout=io.StringIO()))
+
+    def test_never_imports_gui(self):
+        output = subprocess.run([sys.executable, '-c', NO_GUI_SCRIPT],
+                                stdout=subprocess.PIPE, universal_newlines=True,
+                                cwd=PROJECT_ROOT, check=True).stdout
+        self.assertEqual('', output.strip())
+
+    def test_import_report(self):
+        report, gui = import_report()
+        self.assertEqual([], gui)
+        self.assertTrue(report.startswith('import app.ttt: '))
+        self.assertTrue(report.endswith('GUI modules imported: none'))
+        names = [name for name, own, cumulative in import_times()]
+        self.assertEqual('app.ttt', names[-1])
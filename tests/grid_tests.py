@@ -0,0 +1,185 @@
+import random
+import unittest
+
+from app.grid import *
+from app.ttt import *
+
+
+class GridTests(unittest.TestCase):
+
+    def test_line_masks(self):
+        # the 3x3 lines are the ones in WINNING_MOVES
+        grid = Grid(3, 3)
+        self.assertEqual(sorted(sum(1 << CLASSIC_SQUARES[square]
+                                    for square in range(9)
+                                    if combo & (2 << (2 * square)))
+                                for combo in WINNING_MOVES),
+                         sorted(grid.lines))
+
+        for size, k, count in ((3, 3, 8), (3, 2, 20), (4, 3, 24), (4, 4, 10),
+                               (5, 4, 28), (1, 1, 1)):
+            lines = line_masks(size, k)
+            self.assertEqual(count, len(lines))
+            self.assertEqual(count, len(set(lines)))
+            for line in lines:
+                self.assertEqual(k, square_count(line))
+
+        self.assertEqual((0b0011, 0b0101, 0b0110, 0b1001, 0b1010, 0b1100),
+                         tuple(sorted(line_masks(2, 2))))
+
+    def test_init(self):
+        grid = Grid(4)
+        self.assertEqual((4, 4, 16, 0xffff), (grid.size, grid.k, grid.squares,
+                                              grid.all_squares))
+        for square in range(16):
+            for line in grid.square_lines[square]:
+                self.assertTrue(line & (1 << square))
+        self.assertEqual(sorted(range(16)), sorted(grid.move_order))
+
+        # the corners and centre are on the most lines
+        self.assertEqual(set((4, 0, 8, 2, 6)), set(Grid(3).move_order[:5]))
+
+        for size, k in ((3, 4), (3, 0)):
+            self.assertRaises(ValueError, Grid, size, k)
+
+    def test_zobrist(self):
+        self.assertEqual(Grid(4, seed=1).zobrist, Grid(4, seed=1).zobrist)
+        self.assertNotEqual(Grid(4, seed=1).zobrist, Grid(4, seed=2).zobrist)
+        keys = Grid(5, 4).zobrist[0] + Grid(5, 4).zobrist[1]
+        self.assertEqual(50, len(set(keys)))
+
+    def test_is_win(self):
+        grid = Grid(4, 3)
+        self.assertTrue(grid.is_win(0b0111, 1))
+        self.assertTrue(grid.is_win(0b1110, 3))
+        self.assertFalse(grid.is_win(0b1011, 3))
+        self.assertTrue(grid.is_win(1 | 1 << 5 | 1 << 10, 5))
+        self.assertFalse(grid.is_win(1 | 1 << 5 | 1 << 10, 15))
+
+    def test_winner(self):
+        grid = Grid(3)
+        self.assertEqual(1, grid.winner(0b111, 0b111000))
+        self.assertEqual(2, grid.winner(0b11, 0b100010001))
+        self.assertEqual(None, grid.winner(0b11, 0b1100))
+
+
+class GridEngineTests(unittest.TestCase):
+
+    def test_keys(self):
+        engine = GridEngine(Grid(4))
+        own, other = engine.grid.zobrist
+        self.assertEqual((0, 0), engine._keys(0, 0))
+        self.assertEqual((own[3] ^ other[5], other[3] ^ own[5]),
+                         engine._keys(1 << 3, 1 << 5))
+
+        # swapping the players swaps the keys
+        self.assertEqual(engine._keys(1 << 5, 1 << 3),
+                         engine._keys(1 << 3, 1 << 5)[::-1])
+
+        # the keys are the same whether updated by a move or from scratch
+        mover, opponent = 0b1000010, 0b100100
+        keys = engine._keys(mover, opponent)
+        self.assertEqual(engine._keys(opponent, mover | 1 << 9),
+                         (keys[1] ^ other[9], keys[0] ^ own[9]))
+
+    def test_move_scores(self):
+        # searching to the end gives the same scores as the 3x3 solver
+        engine = GridEngine(Grid(3))
+        solver = Engine(table=None)
+        rng = random.Random(0)
+        for trial in range(100):
+            board = 0
+            for move in range(rng.randint(0, 7)):
+                player = [HUMAN, COMPUTER][move % 2]
+                board |= SQUARE_MOVES[player][rng.choice(open_squares(board))]
+                if board_winner(board):
+                    break
+            if board_winner(board) or is_board_full(board):
+                continue
+            human, computer = [sum(1 << CLASSIC_SQUARES[square]
+                                   for square in range(9) if mask & (1 << square))
+                               for mask in split_board(board)]
+            costs = solver.calculate_board_costs(board)[(board, COMPUTER)]
+            self.assertEqual(dict((CLASSIC_SQUARES[square], cost)
+                                  for square, cost in costs.items()),
+                             engine.move_scores(computer, human))
+
+        # with the search cut short
+        scores = GridEngine(Grid(4)).move_scores(0, 0, depth=2)
+        self.assertEqual(16, len(scores))
+        for score in scores.values():
+            self.assertTrue(abs(score) <= GridEngine(Grid(4)).heuristic_limit)
+
+    def test_best_move(self):
+        engine = GridEngine(Grid(4))
+
+        # wins straight away, and blocks the other player's win
+        self.assertEqual((3, engine.grid.win_value, 1),
+                         engine.best_move(0b0111, 0b1110000))
+        square, score, depth = engine.best_move(0b10000000, 0b0111)
+        self.assertEqual(3, square)
+
+        # proves a win three moves ahead without searching any further
+        grid = Grid(4, 3)
+        engine = GridEngine(grid)
+        square, score, depth = engine.best_move(1 << 5, 1 << 0 | 1 << 15)
+        self.assertEqual(grid.win_value - 2, score)
+        self.assertEqual(3, depth)
+
+        # a full board
+        self.assertEqual((None, TIE_VALUE, 0),
+                         GridEngine(Grid(2, 2)).best_move(0b0101, 0b1010))
+
+    def test_limits(self):
+        engine = GridEngine(Grid(5, 4))
+        square, score, depth = engine.best_move(0, 0, max_depth=2)
+        self.assertEqual(2, depth)
+        self.assertEqual(12, square)
+
+        # the first move is always searched, however little time there is
+        square, score, depth = engine.best_move(0, 0, time_limit=0)
+        self.assertEqual(1, depth)
+        self.assertTrue(0 <= square < 25)
+        self.assertEqual(None, engine.deadline)
+
+        engine = GridEngine(Grid(5, 4))
+        square, score, depth = engine.best_move(0, 0, time_limit=0.2)
+        self.assertTrue(1 <= depth < 25)
+
+    def test_small_transposition_cache(self):
+        grid = Grid(3)
+        expected = GridEngine(grid).move_scores(0b10000, 0)
+        engine = GridEngine(grid, BoundedCache(maxsize=10))
+        self.assertEqual(expected, engine.move_scores(0b10000, 0))
+
+
+class ClassicEngineTests(unittest.TestCase):
+
+    def test_potential_moves(self):
+        engine = ClassicEngine()
+        solver = Engine(table=None)
+        for board in (0x00000, 0x20000, 0x20203, 0x3000a, 0b110011101000100011):
+            self.assertEqual(solver.calculate_board_costs(board)[(board, COMPUTER)],
+                             engine.potential_moves(board))
+
+        self.assertRaises(InvalidStateException, engine.potential_moves,
+                          0b101011101111101110)
+
+    def test_tic_tac_toe_board(self):
+        ttt = TicTacToeBoard(ClassicEngine())
+        for board, expected_move in (((0b100010000000000000, 7),
+                                      (0b000010000000000010, 2))):
+            self.assertEqual(expected_move, ttt._choose_square(board))
+
+        # the computer never loses
+        rng = random.Random(0)
+        for game in range(20):
+            ttt.reset_board()
+            game_over = False
+            while not game_over:
+                if ttt.is_computer_turn():
+                    square, game_over, winner = ttt.computer_move()
+                else:
+                    square = rng.choice(ttt._get_valid_moves(ttt.board))
+                    square, game_over, winner = ttt.human_move(square)
+            self.assertNotEqual(HUMAN, winner)
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import unittest
+
+from app.server import *
+from app.stats import StatsStore
+from app.ttt import HUMAN, Engine
+
+
+class GameServerTests(unittest.TestCase):
+
+    def request(self, game_server, **request):
+        """
+        Helper method to send a request straight to a server.
+
+        :param game_server: GameServer
+        :return: dictionary
+        """
+        return asyncio.run(game_server.handle_request(request))
+
+    async def play(self, reader, writer, games, seed):
+        """
+        Helper method to play games over a connection, with random moves for
+        the human. Returns the winner of each game.
+
+        :param reader: asyncio.StreamReader
+        :param writer: asyncio.StreamWriter
+        :param games: number of games to play
+        :param seed: seed for the human's moves
+        :return: list of winners
+        """
+        rng = random.Random(seed)
+
+        async def send(**request):
+            writer.write(json.dumps(request).encode() + b'\n')
+            response = json.loads(await reader.readline())
+            self.assertTrue(response['ok'], response)
+            self.assertTrue(response['ms'] >= 0)
+            return response
+
+        winners = []
+        for game in range(games):
+            state = await send(op='new', first=rng.choice(('human', 'computer')))
+            while not state['game_over']:
+                open_squares = [square for square in range(9)
+                                if not (state['board'] >> (2 * square)) & 3]
+                state = await send(op='move', id=state['id'],
+                                   square=rng.choice(open_squares))
+            winners.append(state['winner'])
+            await send(op='end', id=state['id'])
+        return winners
+
+    def run_clients(self, game_server, clients, games):
+        """
+        Helper method to start a server and play games from many
+        connections at once. Returns the winners and the final stats.
+
+        :param game_server: GameServer
+        :param clients: number of connections
+        :param games: number of games for each connection to play
+        :return: (list, dictionary)
+        """
+        async def run():
+            server = await game_server.start(port=0)
+            host, port = server.sockets[0].getsockname()[:2]
+            connections = [await asyncio.open_connection(host, port)
+                           for client in range(clients)]
+            try:
+                results = await asyncio.gather(*[
+                    self.play(reader, writer, games, seed)
+                    for seed, (reader, writer) in enumerate(connections)])
+                writer = connections[0][1]
+                writer.write(b'{"op": "stats"}\n')
+                stats = json.loads(await connections[0][0].readline())
+            finally:
+                for reader, writer in connections:
+                    writer.close()
+                    await writer.wait_closed()
+                await game_server.close()
+            return sum(results, []), stats
+
+        return asyncio.run(run())
+
+    def test_many_sessions(self):
+        winners, stats = self.run_clients(GameServer(Engine()), 20, 100)
+        self.assertEqual(2000, len(winners))
+        self.assertFalse(HUMAN in winners)
+        self.assertEqual(0, stats['sessions'])
+        self.assertEqual(0, stats['offloaded'])
+        self.assertEqual(2000, stats['latency']['new']['count'])
+        self.assertEqual(2000, stats['latency']['end']['count'])
+        self.assertEqual(stats['engine']['counters']['table_hits'],
+                         stats['engine']['latency']['move']['count'])
+        for report in stats['latency'].values():
+            self.assertTrue(0 <= report['p50_us'] <= report['p99_us'] <= report['max_us'])
+
+    def test_offloaded_search(self):
+        # without the solved table, the computer's moves run in the executor
+        winners, stats = self.run_clients(GameServer(Engine(table=None)), 10, 20)
+        self.assertFalse(HUMAN in winners)
+        self.assertTrue(stats['offloaded'] > 0)
+
+    def test_session(self):
+        game_server = GameServer()
+        state = self.request(game_server, op='new', first='computer')
+        self.assertEqual(True, state['ok'])
+        self.assertEqual(0, state['turn'])
+        self.assertEqual(3 << (2 * state['computer']), state['board'])
+        self.assertEqual((False, None), (state['game_over'], state['winner']))
+
+        square = [square for square in range(9) if square != state['computer']][0]
+        moved = self.request(game_server, op='move', id=state['id'], square=square)
+        self.assertEqual(state['board'] | 2 << (2 * square) | 3 << (2 * moved['computer']),
+                         moved['board'])
+        self.assertEqual(moved['board'],
+                         self.request(game_server, op='state', id=state['id'])['board'])
+
+        state = self.request(game_server, op='new')
+        self.assertEqual((0, None, 0), (state['board'], state['computer'],
+                                        state['turn']))
+        self.assertEqual(2, len(game_server.sessions))
+        self.request(game_server, op='end', id=state['id'])
+        self.assertEqual(1, len(game_server.sessions))
+    
+    def test_seed(self):
+        game_server = GameServer()
+        squares = [[self.request(game_server, op='new', first='computer',
+                                 seed=seed)['computer'] for trial in range(2)]
+                   for seed in range(10)]
+        for first, second in squares:
+            self.assertEqual(first, second)
+        self.assertTrue(len(set(first for first, second in squares)) > 1)
+
+    def test_leaderboard(self):
+        stats = StatsStore(':memory:')
+        game_server = GameServer(stats=stats)
+        results = {}
+        for player, games in (('ada', 3), ('bob', 1), (None, 2)):
+            for game in range(games):
+                state = self.request(game_server, op='new', player=player)
+                while not state['game_over']:
+                    square = [square for square in range(9)
+                              if not (state['board'] >> (2 * square)) & 3][0]
+                    state = self.request(game_server, op='move', id=state['id'],
+                                         square=square)
+                counts = results.setdefault(player, [0, 0, 0])
+                counts[[None, 1, 2].index(state['winner'])] += 1
+
+        # results come from the human's point of view: wins, losses, ties.
+        # Nobody beats the computer, so fewer losses come first.
+        players = self.request(game_server, op='leaderboard')['players']
+        expected = sorted([name] + counts[1:] + counts[:1]
+                          for name, counts in results.items() if name)
+        expected.sort(key=lambda row: (-row[1], row[2]))
+        self.assertEqual(expected, [[player['name'], player['wins'], player['losses'],
+                                     player['ties']] for player in players])
+        self.assertEqual(1, len(self.request(game_server, op='leaderboard',
+                                             count=1)['players']))
+        for request in ({'op': 'leaderboard', 'count': 0},
+                        {'op': 'new', 'player': 5}):
+            self.assertEqual(False, self.request(game_server, **request)['ok'])
+        self.assertEqual(False, self.request(GameServer(), op='leaderboard')['ok'])
+        stats.close()
+
+    def test_errors(self):
+        game_server = GameServer()
+        state = self.request(game_server, op='new')
+        for request in ({'op': 'fly'}, {}, {'op': 'move', 'id': 'nope', 'square': 1},
+                        {'op': 'new', 'first': 'nobody'},
+                        {'op': 'new', 'seed': 'x'},
+                        {'op': 'move', 'id': state['id'], 'square': 9},
+                        {'op': 'move', 'id': state['id'], 'square': 'x'},
+                        {'op': 'move', 'id': state['id'], 'square': [1]},
+                        {'op': 'move', 'id': state['id'], 'square': True},
+                        {'op': 'move', 'id': [1], 'square': 1},
+                        {'op': 'state', 'id': {}}):
+            response = self.request(game_server, **request)
+            self.assertEqual(False, response['ok'])
+            self.assertTrue(response['error'])
+
+        # a finished game needs a reset
+        game_server.sessions[state['id']].state.game_over = True
+        response = self.request(game_server, op='move', id=state['id'], square=0)
+        self.assertEqual(False, response['ok'])
+        response = self.request(game_server, op='reset', id=state['id'])
+        self.assertEqual((True, False), (response['ok'], response['game_over']))
+
+    def test_bad_lines(self):
+        game_server = GameServer()
+
+        async def fail(request):
+            raise ValueError("broken")
+        game_server.ops['fail'] = fail
+
+        async def run():
+            server = await game_server.start(port=0)
+            host, port = server.sockets[0].getsockname()[:2]
+            reader, writer = await asyncio.open_connection(host, port)
+            responses = []
+            try:
+                for line in (b'{"op": "move", "id": [1]}', b'not json', b'[1, 2]',
+                             b'{"op": "fail"}', b'{"op": "stats"}'):
+                    writer.write(line + b'\n')
+                    responses.append(json.loads(await reader.readline()))
+            finally:
+                writer.close()
+                await writer.wait_closed()
+                await game_server.close()
+            return responses
+
+        # every bad line gets an error, and the connection stays open
+        responses = asyncio.run(run())
+        self.assertEqual([False, False, False, False, True],
+                         [response['ok'] for response in responses])
+        self.assertIn('broken', responses[3]['error'])
+
+    def test_stats_during_solve(self):
+        game_server = GameServer()
+        solving, solved = threading.Event(), threading.Event()
+
+        def solve():
+            # stands in for a solve in the executor, which holds the lock
+            with game_server.engine.lock:
+                solving.set()
+                solved.wait(5)
+        solver = threading.Thread(target=solve)
+        solver.start()
+        solving.wait(5)
+
+        async def run():
+            # a stats request waits for the lock off the event loop, and
+            # other requests still get answers in the meantime
+            stats = asyncio.ensure_future(game_server.handle_request({'op': 'stats'}))
+            state = await asyncio.wait_for(
+                game_server.handle_request({'op': 'new', 'first': 'computer'}), 1)
+            self.assertEqual((True, False), (state['ok'], stats.done()))
+            solved.set()
+            return await stats
+
+        stats = asyncio.run(run())
+        solver.join()
+        self.assertEqual((True, 1), (stats['ok'], stats['sessions']))
+        self.assertTrue('playbook' in stats['engine'])
+
+    def test_expire_sessions(self):
+        game_server = GameServer(ttl=10, max_sessions=3)
+        ids = [self.request(game_server, op='new')['id'] for i in range(3)]
+        self.assertEqual(False, self.request(game_server, op='new')['ok'])
+
+        game_server.sessions[ids[0]].touched -= 11
+        self.assertEqual(1, game_server.expire_sessions())
+        self.assertEqual(False, ids[0] in game_server.sessions)
+        self.assertEqual(0, game_server.expire_sessions())
+        self.assertEqual(2, game_server.expire_sessions(time.monotonic() + 11))
+
+        # full servers close unused sessions to make room
+        ids = [self.request(game_server, op='new')['id'] for i in range(3)]
+        game_server.sessions[ids[1]].touched -= 11
+        self.assertEqual(True, self.request(game_server, op='new')['ok'])
+        self.assertEqual(False, ids[1] in game_server.sessions)
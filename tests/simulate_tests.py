@@ -0,0 +1,96 @@
+import random
+import unittest
+
+from app.simulate import *
+from app.simulate import _tasks
+from app.ttt import (OPENING_BOOK, Engine, PlaybookArray, canonical_playbook,
+                     keyed_playbook)
+
+
+class SimulateTests(unittest.TestCase):
+
+    def losing_engine(self):
+        """
+        Helper method to make an engine that answers a human corner with the
+        edge next to it, which loses.
+
+        :return: Engine
+        """
+        playbook = PlaybookArray(pinned=keyed_playbook(
+            canonical_playbook({(0x20000, 2): {7: 0}})))
+        return Engine(playbook=playbook, table=None)
+
+    def test_greedy_move(self):
+        rng = random.Random(0)
+        # wins with 2-3-4 before blocking 1-0-5
+        self.assertEqual(2, greedy_move(0b001010001111, rng))
+        self.assertEqual(5, greedy_move(0b000000001111, rng))
+        for trial in range(20):
+            self.assertTrue(greedy_move(0b11, rng) in range(1, 9))
+
+    def test_format_moves(self):
+        self.assertEqual('H4 C0 H8', format_moves([(1, 4), (2, 0), (1, 8)]))
+        self.assertEqual('', format_moves([]))
+
+    def test_play_games(self):
+        for opponent in ('random', 'greedy'):
+            for computer_first in (False, True):
+                results = play_games(opponent, computer_first, 200, 1)
+                self.assertEqual(200, results['games'])
+                self.assertEqual(200, results['wins'] + results['ties'])
+                self.assertEqual((0, []), (results['losses'],
+                                           results['losing_games']))
+
+        # the same seed plays the same games
+        self.assertEqual(play_games('random', False, 50, 7)['wins'],
+                         play_games('random', False, 50, 7)['wins'])
+
+    def test_explore(self):
+        results = explore(0, False)
+        self.assertEqual((0, []), (results['losses'], results['losing_games']))
+        self.assertEqual(results['games'], results['wins'] + results['ties'])
+        self.assertEqual(results['games'],
+                         sum(explore(SQUARE_MOVES[1][square], True)['games']
+                             for square in range(9)))
+
+        results = explore(0, True)
+        self.assertEqual(0, results['losses'])
+        self.assertEqual(sorted(OPENING_BOOK[(0, 2)]), best_squares(0))
+
+    def test_losses_are_reported(self):
+        engine = self.losing_engine()
+        results = explore(0x20000, True, ((1, 8),), engine)
+        self.assertTrue(results['losses'] > 0)
+        self.assertEqual(min(MAX_LOSSES, results['losses']),
+                         len(results['losing_games']))
+        for moves in results['losing_games']:
+            self.assertTrue(moves.startswith('H8 C7 '))
+
+        total = new_results()
+        for trial in range(MAX_LOSSES):
+            add_results(total, results)
+        self.assertEqual(MAX_LOSSES * results['losses'], total['losses'])
+        self.assertEqual(MAX_LOSSES, len(total['losing_games']))
+
+    def test_tasks(self):
+        tasks = _tasks(OPPONENTS, 25001, 3)
+        for opponent in ('random', 'greedy'):
+            sizes = [size for name, computer_first, size, seed in tasks
+                     if name == opponent]
+            self.assertEqual(25001, sum(sizes))
+            self.assertTrue(max(sizes) <= CHUNK_SIZE)
+        self.assertEqual(9 + 4, len([task for task in tasks
+                                     if task[0] == 'exhaustive']))
+        seeds = [seed for name, computer_first, size, seed in tasks
+                 if seed is not None]
+        self.assertEqual(len(seeds), len(set(seeds)))
+
+    def test_simulate(self):
+        summary = simulate(('random', 'exhaustive'), 1000, processes=2)
+        self.assertEqual(['random', 'exhaustive'], list(summary))
+        self.assertEqual(1000, summary['random']['games'])
+        self.assertEqual(explore(0, False)['games'] + explore(0, True)['games'],
+                         summary['exhaustive']['games'])
+        for results in summary.values():
+            self.assertEqual(0, results['losses'])
+            self.assertTrue(results['seconds'] > 0)
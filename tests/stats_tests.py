@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from app.stats import *
+from app.ttt import Engine, TicTacToeBoard, TieBreaker
+
+
+class StatsStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'stats', 'stats.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_add(self):
+        store = StatsStore(self.path, flush_interval=60)
+        self.assertEqual((0, 0, 0), store.get('ada'))
+        store.add('ada', wins=1)
+        store.add('ada', losses=2, ties=1)
+        store.add('ada', ties=-1)
+
+        # reads include results that haven't been written yet
+        self.assertEqual({'ada': [1, 2, 0]}, store.pending)
+        self.assertEqual((1, 2, 0), store.get('ada'))
+        self.assertEqual(1, store.flush())
+        self.assertEqual(({}, (1, 2, 0)), (store.pending, store.get('ada')))
+        self.assertEqual(0, store.flush())
+        store.close()
+
+        # and they're still there after a restart
+        store = StatsStore(self.path)
+        self.assertEqual((1, 2, 0), store.get('ada'))
+        store.close()
+
+    def test_batches(self):
+        store = StatsStore(self.path, flush_interval=60, batch_size=50)
+        threads = [threading.Thread(target=lambda start=start: [
+                       store.add('player%s' % number, wins=1)
+                       for number in range(start, start + 25)])
+                   for start in (0, 25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # a full batch is written by the writer thread, without waiting
+        # for the interval
+        for wait in range(100):
+            if store.flushes:
+                break
+            time.sleep(.01)
+        self.assertEqual((1, {}), (store.flushes, store.pending))
+        store.close()
+
+    def test_flush_during_reads(self):
+        store = StatsStore(':memory:', flush_interval=60)
+        store.add('ada', wins=1)
+
+        # a flush waits for readers before it takes the buffer, so the
+        # results are always in one place or the other
+        with store._database_lock:
+            flusher = threading.Thread(target=store.flush)
+            flusher.start()
+            time.sleep(.05)
+            self.assertEqual({'ada': [1, 0, 0]}, store.pending)
+            store.add('bob', ties=1)
+        flusher.join()
+        self.assertEqual(({}, (1, 0, 0), (0, 0, 1)),
+                         (store.pending, store.get('ada'), store.get('bob')))
+        store.close()
+
+    def test_leaderboard(self):
+        store = StatsStore(':memory:', flush_interval=60)
+        for player, wins, losses, ties in (('ada', 3, 1, 0), ('bob', 3, 0, 2),
+                                           ('cy', 5, 9, 9), ('dee', 0, 0, 1)):
+            store.add(player, wins, losses, ties)
+        self.assertEqual([('cy', 5, 9, 9), ('bob', 3, 0, 2), ('ada', 3, 1, 0)],
+                         store.leaderboard(3))
+        self.assertEqual(4, len(store.leaderboard()))
+        store.close()
+
+    def test_board(self):
+        store = StatsStore(':memory:', flush_interval=60)
+        ttt = TicTacToeBoard(Engine(), TieBreaker(deterministic=True), store, 'ada')
+
+        # the computer wins on the diagonal (see TicTacToeBoardTests)
+        for square in (8, 7, 3):
+            ttt.human_move(square)
+            ttt.computer_move()
+        self.assertEqual((0, 1, 0), ttt.scores())
+        self.assertTrue(ttt.player_stats(1).endswith("Wins: 0\nLosses: 1\nTies: 0"))
+
+        # taking the last move back takes the result back too
+        ttt.undo_move()
+        self.assertEqual((0, 0, 0), store.get('ada'))
+        ttt.redo_move()
+        ttt.reset_board()
+        other = TicTacToeBoard(stats=store, player_name='ada')
+        self.assertEqual((0, 1, 0), other.scores())
+        self.assertEqual((0, 0, 0), (other.player_wins, other.player_losses,
+                                     other.ties))
+        store.close()
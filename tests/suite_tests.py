@@ -0,0 +1,23 @@
+import unittest
+
+from benchmarks.suite import *
+
+
+class SuiteTests(unittest.TestCase):
+
+    def test_compare(self):
+        baseline = {'seconds_per_op': {'a': 1.0, 'b': 1.0, 'c': 1.0}}
+        results = {'seconds_per_op': {'a': 1.2, 'b': 1.5, 'c': 0.5, 'd': 9.0}}
+        self.assertEqual([('b', 1.0, 1.5)], compare(results, baseline))
+        self.assertEqual([('a', 1.0, 1.2), ('b', 1.0, 1.5)],
+                         compare(results, baseline, threshold=.1))
+
+    def test_random_positions(self):
+        boards = random_positions(100)
+        self.assertEqual(boards, random_positions(100))
+        for board in boards:
+            self.assertFalse(board_winner(board) or is_board_full(board))
+
+    def test_main(self):
+        self.assertEqual(0, main(['has_won', '--repeat', '1', '--threshold', '1000']))
+        self.assertRaises(SystemExit, main, ['nope'])
@@ -1,6 +1,13 @@
+import os
 import random
+import shutil
+import sys
+import tempfile
+import threading
 import unittest
 
+from app.build_book import build_book
+from app.build_table import build_table, table_bytes
 from app.ttt import *
 
 
@@ -27,6 +34,20 @@ LAST_MOVES = ((0b100010000000000000, 7), (0b100000001000000000, 0),
               (0b000000000000001010, 5), (0b000000001000100000, 3))
 
 
+def transform_board(board, symmetry):
+    """
+    Moves every square of a board to where SYMMETRIES sends it.
+    
+    :param board: integer representing a board
+    :param symmetry: index into SYMMETRIES
+    :return: integer
+    """
+    new_board = 0
+    for square in range(9):
+        new_board |= ((board >> (2 * square)) & 3) << (2 * SYMMETRIES[symmetry][square])
+    return new_board
+
+
 class TicTacToeBoardTests(unittest.TestCase):
     # Testing done in binary as a second check to hex calculations in main class
     
@@ -107,6 +128,10 @@ class TicTacToeBoardTests(unittest.TestCase):
         for attr in ('board', 'turn', 'player_wins', 'player_losses', 
                      'ties', 'game_over'):
             self.assertEquals(0, getattr(ttt, attr))
+        self.assertTrue(ttt.engine is ENGINE)
+        
+        engine = Engine()
+        self.assertTrue(TicTacToeBoard(engine).engine is engine)
     
     def test__apply_move(self):
         ttt = TicTacToeBoard()
@@ -139,6 +164,10 @@ class TicTacToeBoardTests(unittest.TestCase):
                 move, board = ttt._apply_move(square, board, player)
                 self.assertIsNone(move)
                 self.assertEquals(0b101011101110101111, board, player)
+        
+        # only the board changes; the moves are counted by the callers
+        self.assertEquals((0, 0, 0, 0), (ttt.line_counts, ttt.moves,
+                                              ttt.rank, ttt.counted_board))
     
     def test__assert_valid_player(self):
         ttt = TicTacToeBoard()
@@ -168,6 +197,13 @@ class TicTacToeBoardTests(unittest.TestCase):
         # problem case
         for player in (1, 2):
             self.assertEquals(None, ttt._best_move({}, player))
+        
+        # ties are broken by the board's own tie breaker
+        ttt = TicTacToeBoard(tie_breaker=TieBreaker(deterministic=True))
+        self.assertEquals((3, 2), ttt._best_move(potential_moves, 2))
+        choices = [TicTacToeBoard(tie_breaker=TieBreaker(7))._best_move(potential_moves, 1)
+                   for i in range(2)]
+        self.assertEquals(choices[0], choices[1])
     
     def test__board_for_player(self):
         ttt = TicTacToeBoard()
@@ -180,75 +216,13 @@ class TicTacToeBoardTests(unittest.TestCase):
                 self.assertEquals(playerboards[i], 
                                   ttt._board_for_player(player, board))
     
-    def test__calculate_board_costs(self):
-        ttt = TicTacToeBoard()
-        board = 0b110011101000100011
-        
-        cost_dict = ttt._calculate_board_costs(board)
-        self.assertEquals(6, len(cost_dict))
-        for board, player, value_dict in ((0b110011101000100011, 2, {1: -9, 3:0, 7: 10}),
-                                          (0b110011101011100011, 1, {1: 9, 7:0}),
-                                          (0b111011101011100011, 2, {1: 0}),
-                                          (0b110011101011101011, 2, {7: 10}),
-                                          (0b110011101000101111, 1, {3: -10, 7: 0}),
-                                          (0b111011101000101111, 2, {3: 0})):
-            self.assertEquals(value_dict, cost_dict[(board, player)])        
-        
-    def test__calculate_board_variations(self):
-        ttt = TicTacToeBoard()
-        
-        # simple test: only one move
-        board = 0b001011101011101111
-        board_list, board_dict, revisit = ttt._calculate_board_variations(board, 2)
-        self.assertEquals([], board_list)
-        self.assertEquals({8: 0}, board_dict)
-        self.assertEquals([], revisit)
-        
-        # complex test: lots of moves
-        board = 0b110000000000000010
-        board_list, board_dict, revisit = ttt._calculate_board_variations(board, 2)
-        self.assertEquals([(0b110000000000001110, 1),
-                           (0b110000000000110010, 1),
-                           (0b110000000011000010, 1),
-                           (0b110000001100000010, 1),
-                           (0b110000110000000010, 1),
-                           (0b110011000000000010, 1),
-                           (0b111100000000000010, 1)], board_list)
-        self.assertEquals(len(board_list), len(board_dict))
-        self.assertEquals(len(board_list), len(revisit))
-        
-        expected_moves = [1, 2, 3, 4, 5, 6, 7]
-        for move in expected_moves:
-            self.assertTrue(move in board_dict)
-            self.assertIsNone(board_dict[move])
-        
-        for square, next_move in zip(expected_moves, board_list):
-            self.assertTrue((board, 2, square, next_move[0]) in revisit)
-
-        # some game-ending moves, some continuing moves
-        board = 0b000011101111100010
-        board_list, board_dict, revisit = ttt._calculate_board_variations(board, 1)
-        self.assertEquals([(0b001011101111100010, 2),
-                           (0b100011101111100010, 2)], board_list)
-        self.assertEquals(3, len(board_dict))
-        self.assertEquals(LOSS_VALUE, board_dict[1])
-        self.assertEquals(len(board_list), len(revisit))
-        
-        expected_moves = [7, 8]
-        for move in expected_moves:
-            self.assertTrue(move in board_dict)
-            self.assertIsNone(board_dict[move])
-        
-        for square, next_move in zip(expected_moves, board_list):
-            self.assertTrue((board, 1, square, next_move[0]) in revisit)
-
     def test__choose_square(self):
         ttt = TicTacToeBoard()
         
-        # should follow moves from PLAYBOOK
-        for board, player in PLAYBOOK:
+        # should follow moves from OPENING_BOOK
+        for board, player in OPENING_BOOK:
             move = ttt._choose_square(board)
-            self.assertTrue(move in PLAYBOOK[(board, 2)])
+            self.assertTrue(move in OPENING_BOOK[(board, 2)])
         
         # should always go for a win if next move
         for board, expected_move in LAST_MOVES:
@@ -296,7 +270,33 @@ class TicTacToeBoardTests(unittest.TestCase):
         
         # game is still going
         self.assertEquals((False, None), ttt._game_over_validation(0b111011001000000010))
-    
+
+    def test__count_move(self):
+        ttt = TicTacToeBoard(tie_breaker=TieBreaker(deterministic=True))
+        rng = random.Random(3)
+        for game in range(200):
+            ttt.reset_board()
+            while not ttt.game_over:
+                if ttt.is_computer_turn():
+                    ttt.computer_move()
+                else:
+                    ttt.human_move(rng.choice(ttt._get_valid_moves(ttt.board)))
+
+                # the counts kept move by move match a recount of the board
+                self.assertEqual(ttt.board, ttt.counted_board)
+                counts, moves, rank = ttt.line_counts, ttt.moves, ttt.rank
+                ttt._count_board(ttt.board)
+                self.assertEqual((counts, moves, rank),
+                                 (ttt.line_counts, ttt.moves, ttt.rank))
+            self.assertEqual(bool(board_winner(ttt.board)) or is_board_full(ttt.board),
+                             ttt.game_over)
+
+        # a board set from outside is recounted
+        ttt.reset_board()
+        ttt.board = 0b101011101111110010
+        self.assertEqual((True, 2), ttt._game_over_validation(ttt.board))
+        self.assertEqual((ttt.board, 8), (ttt.counted_board, ttt.moves))
+
     def test__get_valid_moves(self):
         ttt = TicTacToeBoard()
         
@@ -487,12 +487,84 @@ class TicTacToeBoardTests(unittest.TestCase):
         self.assertEquals(0b101010001011000011, ttt.board)
         self.assertEquals(0, ttt.turn)
         
+        # a square that int() can read is played, and counted, as an integer
+        ttt = TicTacToeBoard()
+        self.assertEqual((3, False, None), ttt.human_move('3'))
+        self.assertEqual([(3, HUMAN, False)], ttt.history_moves())
+        self.assertEqual((0x80, 1, 1), (ttt.board, ttt.turn, ttt.moves))
+        self.assertEqual((4, False, None), ttt.make_move('4'))
+        self.assertEqual(4, ttt.unmake_move())
     
     def test_is_computer_turn(self):
         ttt = TicTacToeBoard()
         for turn in (0, 1):
             ttt.turn = turn
             self.assertEquals(bool(turn), ttt.is_computer_turn())
+    
+    def test_make_move(self):
+        ttt = TicTacToeBoard()
+        self.assertEqual((0, False, None), ttt.make_move(0))
+        self.assertEqual((None, False, None), ttt.make_move(0))
+        self.assertEqual((1, 0x2), (ttt.turn, ttt.board))
+        
+        def walk(depth):
+            # every sequence of moves to a depth, stopping at finished games
+            if depth == 0 or ttt.game_over:
+                return 1
+            count = 0
+            for square in ttt._get_valid_moves(ttt.board):
+                ttt.make_move(square)
+                count += walk(depth - 1)
+                self.assertEqual(square, ttt.unmake_move())
+            return count
+        
+        self.assertEqual(0, ttt.unmake_move())
+        self.assertEqual(9 * 8 * 7 * 6 * 5, walk(5))
+        self.assertEqual((0, 0, 0, 0, 0), (ttt.board, ttt.turn, ttt.history,
+                                           ttt.line_counts, ttt.moves))
+        
+        # the human wins along the top row, without keeping score
+        for square in (8, 0, 7, 1, 6):
+            square, game_over, winner = ttt.make_move(square)
+        self.assertEqual((True, HUMAN, 0), (game_over, winner, ttt.player_wins))
+        self.assertEqual(6, ttt.unmake_move())
+        self.assertEqual((False, 0), (ttt.game_over, ttt.turn))
+        self.assertIsNone(TicTacToeBoard().unmake_move())
+    
+    def test_undo_redo(self):
+        ttt = TicTacToeBoard(Engine(), TieBreaker(deterministic=True))
+        self.assertIsNone(ttt.undo_move())
+        self.assertEqual((None, False, None), ttt.redo_move())
+        
+        # the computer blocks the top row, and then wins on the diagonal
+        for square in (8, 7, 3):
+            ttt.human_move(square)
+            ttt.computer_move()
+        self.assertEqual((True, 1), (ttt.game_over, ttt.player_losses))
+        boards = [ttt.board]
+        
+        self.assertEqual(2, ttt.undo_move())
+        self.assertEqual((False, 0, 1), (ttt.game_over, ttt.player_losses, ttt.turn))
+        self.assertEqual(3, ttt.undo_move())
+        self.assertEqual(0, ttt.turn)
+        boards.append(ttt.board)
+        
+        self.assertEqual((3, False, None), ttt.redo_move())
+        self.assertEqual((2, True, COMPUTER), ttt.redo_move())
+        self.assertEqual((boards[0], 1), (ttt.board, ttt.player_losses))
+        self.assertEqual(0, ttt.redo_moves)
+        self.assertEqual([(8, HUMAN, False), (0, COMPUTER, False), (7, HUMAN, False),
+                          (6, COMPUTER, False), (3, HUMAN, False), (2, COMPUTER, True)],
+                         ttt.history_moves())
+        
+        # a new move drops the moves that were undone
+        ttt.undo_move()
+        ttt.undo_move()
+        ttt.human_move(2)
+        self.assertEqual(0, ttt.redo_moves)
+        self.assertEqual((None, False, None), ttt.redo_move())
+        ttt.reset_board()
+        self.assertEqual((0, 0), (ttt.history, ttt.redo_moves))
             
     def test_player_stats(self):
         ttt = TicTacToeBoard()
@@ -553,5 +625,866 @@ class TicTacToeBoardTests(unittest.TestCase):
                         if not game_over and ttt.board not in game_in_the_known_universe:
                             game_in_the_known_universe.append(ttt.board)
 
+
+class SolvedTableTests(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+    
+    def write_table(self, data):
+        """
+        Helper method to write table data to a temporary file.
+        
+        :param data: bytes to write
+        :return: string path of the file
+        """
+        path = os.path.join(self.tmp_dir, 'solved.bin')
+        with open(path, 'wb') as table_file:
+            table_file.write(data)
+        return path
+    
+    def test_board_rank(self):
+        self.assertEqual(0, board_rank(0b000000000000000000))
+        self.assertEqual(3 ** 9 - 1, board_rank(0b111111111111111111))
+        
+        # human in square 0 and 8, computer in square 4
+        self.assertEqual(1 + 2 * 3 ** 4 + 3 ** 8, 
+                         board_rank(0b100000001100000010))
+    
+    def test_is_legal_position(self):
+        # either player can move first on an empty board
+        self.assertTrue(is_legal_position(0, HUMAN))
+        self.assertTrue(is_legal_position(0, COMPUTER))
+        self.assertTrue(is_legal_position(0x20000, COMPUTER))
+        self.assertFalse(is_legal_position(0x20000, HUMAN))
+        self.assertFalse(is_legal_position(0x2a000, COMPUTER))
+        self.assertFalse(is_legal_position(0x10000, HUMAN))
+        
+        # the human won on the top row, so only the computer can be next
+        self.assertTrue(is_legal_position(0x2a00f, COMPUTER))
+        self.assertFalse(is_legal_position(0x2a00f, HUMAN))
+        
+        # both players can't have won
+        self.assertFalse(is_legal_position(0x2ac0f, HUMAN))
+        self.assertFalse(is_legal_position(0x2ac0f, COMPUTER))
+        
+        # a full board with a tie
+        self.assertTrue(is_legal_position(0b101110111011101110, COMPUTER))
+    
+    def test_position_id(self):
+        self.assertEqual(10956, LEGAL_POSITIONS)
+        keys = [position_key(*unrank_position_id(position)) 
+                for position in range(LEGAL_POSITIONS)]
+        self.assertEqual(sorted(keys), keys)
+        self.assertEqual(LEGAL_POSITIONS, 
+                         len([key for key in range(PLAYBOOK_SLOTS)
+                              if is_legal_position(*unrank_position(key))]))
+        for position in (0, 1, 5000, LEGAL_POSITIONS - 1):
+            board, player = unrank_position_id(position)
+            self.assertTrue(is_legal_position(board, player))
+            self.assertEqual(position, position_id(board, player))
+        self.assertEqual(0, position_id(0, HUMAN))
+        self.assertRaises(ValueError, position_id, 0x2a000, COMPUTER)
+        self.assertRaises(IndexError, unrank_position_id, LEGAL_POSITIONS)
+    
+    def test_position_key(self):
+        self.assertEqual(2 * board_rank(0x2082f) + 1, position_key(0x2082f, COMPUTER))
+        for key in (0, 1, 12345, PLAYBOOK_SLOTS - 1):
+            self.assertEqual(key, position_key(*unrank_position(key)))
+    
+    def test_pack_record(self):
+        for potential_moves, player in (({1: -9, 3: 0, 7: 10}, 2),
+                                        ({1: 9, 7: 0}, 1),
+                                        ({8: 0, 6: 0, 4: -1}, 2)):
+            record = pack_record(potential_moves, player)
+            best = [min, max][player == 2](potential_moves.values())
+            self.assertEqual(dict((square, cost) 
+                                  for square, cost in potential_moves.items()
+                                  if cost == best),
+                             unpack_record(record))
+        
+        self.assertIsNone(unpack_record(0))
+    
+    def test_shipped_table_is_current(self):
+        # if this fails, rebuild the table with `python -m app.build_table`
+        with open(TABLE_PATH, 'rb') as table_file:
+            self.assertEqual(table_bytes(build_table()), table_file.read())
+        self.assertIsNotNone(SOLVED_TABLE)
+    
+    def test_shipped_book_is_current(self):
+        # if this fails, rebuild the book with `python -m app.build_book`
+        with open(BOOK_PATH, 'rb') as book_file:
+            self.assertEqual(table_bytes(build_book(), BOOK_MAGIC, BOOK_VERSION, 
+                                         BOOK_DEPTH), book_file.read())
+        
+        # a book is a slice of the table, so it can't be built past the end
+        # of the game
+        records = build_book(9)
+        self.assertEqual(len(records), len([key for key in build_table()
+                                            if key % 2]))
+        self.assertEqual([1], list(build_book(0)))
+    
+    def test_load_solved_table(self):
+        records = build_table()
+        values = load_solved_table(self.write_table(table_bytes(records)))
+        self.assertEqual(LEGAL_POSITIONS, len(values))
+        self.assertEqual(dict((position_id(*unrank_position(key)), record)
+                              for key, record in records.items()),
+                         dict((position, record) for position, record in enumerate(values)
+                              if record))
+        
+        # missing, truncated or from another version
+        self.assertIsNone(load_solved_table(os.path.join(self.tmp_dir, 'nope')))
+        self.assertIsNone(load_solved_table(self.write_table(table_bytes(records)[:-2])))
+        header = TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION + 1, 0, LEGAL_POSITIONS)
+        data = header + table_bytes(records)[TABLE_HEADER.size:]
+        self.assertIsNone(load_solved_table(self.write_table(data)))
+    
+    def test_table_record(self):
+        records = build_table()
+        
+        # canonical boards are solved, and stored in every orientation
+        self.assertEqual(len(records), len(SOLVED_TABLE) - list(SOLVED_TABLE).count(0))
+        for key, record in records.items():
+            self.assertEqual(record, table_record(SOLVED_TABLE, key))
+        for board in (0x00000, 0x20000, 0x20203, 0x3000a):
+            for k in range(8):
+                human, computer = split_board(board)
+                variant = join_board(MASK_SYMMETRIES[k][human], MASK_SYMMETRIES[k][computer])
+                record = table_record(SOLVED_TABLE, position_key(variant, COMPUTER))
+                self.assertEqual(Engine(table=None).potential_moves(variant),
+                                 unpack_record(record))
+        
+        # unreachable or finished games aren't in the table, and illegal
+        # positions have no place in it
+        for board, player in ((0b100010000000000000, 2), (0b101011101111101110, 1),
+                              (0b100000000000000000, 1)):
+            self.assertEqual(0, table_record(SOLVED_TABLE, position_key(board, player)))
+    
+    def test__choose_square_uses_table(self):
+        engine = Engine()
+        ttt = TicTacToeBoard(engine)
+        
+        def no_search(board):
+            raise AssertionError("searched for %#x" % board)
+        engine.calculate_board_costs = no_search
+        
+        for board in (0x00000, 0x20000, 0x20203, 0x3000a):
+            record = table_record(SOLVED_TABLE, position_key(board, 2))
+            self.assertTrue(ttt._choose_square(board) in unpack_record(record))
+
+
+class PrimitiveTests(unittest.TestCase):
+    
+    def test_player_board(self):
+        # every board, checked square by square
+        for rank in range(3 ** 9):
+            board = unrank_board(rank)
+            for player in (1, 2):
+                expected = sum(2 << (2 * square) for square in range(9)
+                               if (board >> (2 * square)) & 3 == player + 1)
+                self.assertEqual(expected, player_board(board, player))
+    
+    def test_board_winner(self):
+        self.assertEqual(1, board_winner(0b101110111000110010))
+        self.assertEqual(2, board_winner(0b101011101111110010))
+        self.assertIsNone(board_winner(0b101011101111101110))
+        self.assertIsNone(board_winner(0b000000000000000000))
+        
+        for combo in WINNING_MOVES:
+            self.assertEqual(1, board_winner(combo))
+            self.assertEqual(2, board_winner(combo | (combo >> 1)))
+    
+    def test_open_squares(self):
+        self.assertEqual(tuple(range(9)), open_squares(0b000000000000000000))
+        self.assertEqual((), open_squares(0b101110111011101110))
+        self.assertEqual((3, 5, 7), open_squares(0b100010001100111110))
+    
+    def test_square_moves(self):
+        ttt = TicTacToeBoard()
+        for player in (1, 2):
+            self.assertEqual(tuple(ttt._convert_move(square, player) 
+                                   for square in range(9)),
+                             SQUARE_MOVES[player])
+    
+    def test_is_board_full(self):
+        self.assertTrue(is_board_full(0b101110111011101110))
+        self.assertFalse(is_board_full(0b001110111011101110))
+
+
+class BitboardTests(unittest.TestCase):
+    
+    def test_split_board(self):
+        self.assertEqual((0, 0), split_board(0b000000000000000000))
+        self.assertEqual((0b010101010, 0b101010101), 
+                         split_board(0b111011101110111011))
+        
+        # every board makes the round trip
+        for rank in range(3 ** 9):
+            board = unrank_board(rank)
+            human, computer = split_board(board)
+            self.assertEqual(0, human & computer)
+            self.assertEqual(board, join_board(human, computer))
+    
+    def test_line_masks(self):
+        self.assertEqual(8, len(set(LINE_MASKS)))
+        for line in LINE_MASKS:
+            self.assertEqual(3, len(MASK_SQUARES[line]))
+            self.assertTrue(HAS_LINE[line])
+            self.assertTrue(HAS_LINE[line | 0b000100000])
+            self.assertEqual(line, split_board(join_board(line, 0))[0])
+        
+        self.assertFalse(HAS_LINE[0])
+        self.assertFalse(HAS_LINE[0b101100010])
+    
+    def test_canonical_masks(self):
+        # canonical_masks agrees with canonical_board on which positions are
+        # the same
+        for trial in range(200):
+            board = 0
+            for square in range(9):
+                board |= random.choice((0, 2, 3)) << (2 * square)
+            
+            keys = set()
+            for k in range(8):
+                human, computer = split_board(transform_board(board, k))
+                keys.add(canonical_masks(computer, human))
+            self.assertEqual(1, len(keys))
+            
+            canonical = canonical_board(board)[0]
+            human, computer = split_board(canonical)
+            self.assertEqual(keys.pop(), canonical_masks(computer, human))
+
+
+class PlaybookArrayTests(unittest.TestCase):
+    
+    def test_mapping(self):
+        playbook = PlaybookArray()
+        key = position_key(0b110011101000100011, 2)
+        self.assertEqual(0, len(playbook))
+        self.assertFalse(key in playbook)
+        self.assertRaises(KeyError, playbook.__getitem__, key)
+        
+        # only the best moves are kept
+        playbook[key] = {1: -9, 3: 0, 7: 10}
+        playbook.update(keyed_playbook({(0b110011101011100011, 1): {1: 9, 7: 0},
+                                        (0b000000000000000000, 2): {8: 0, 6: 0, 4: 0, 2: 0}}))
+        self.assertEqual(3, len(playbook))
+        self.assertTrue(key in playbook)
+        self.assertFalse(key - 1 in playbook)
+        self.assertEqual({7: 10}, playbook[key])
+        self.assertEqual({7: 0}, playbook[position_key(0b110011101011100011, 1)])
+        self.assertEqual({8: 0, 6: 0, 4: 0, 2: 0}, playbook[1])
+        self.assertEqual([(0, 2), (0b110011101000100011, 2), (0b110011101011100011, 1)],
+                         [unrank_position(key) for key in playbook])
+        
+        self.assertEqual(pack_record({7: 10}, 2), playbook.record(key))
+        self.assertEqual(0, playbook.record(key - 1))
+        
+        playbook.clear()
+        self.assertEqual(0, len(playbook))
+        self.assertEqual([], list(playbook))
+    
+    def test_pin(self):
+        playbook = PlaybookArray(pinned={1: {8: 0, 6: 0}})
+        self.assertEqual({8: 0, 6: 0}, playbook[1])
+        
+        # pinned entries aren't replaced or cleared
+        playbook[1] = {0: 0, 1: 0}
+        playbook.update({1: {0: 0}, 0: {0: 0}})
+        self.assertEqual({8: 0, 6: 0}, playbook[1])
+        playbook.clear()
+        self.assertEqual([1], list(playbook))
+    
+    def test_stats(self):
+        playbook = PlaybookArray(pinned={1: {8: 0}})
+        self.assertEqual({8: 0}, playbook.get(1))
+        self.assertIsNone(playbook.get(0))
+        self.assertEqual('nope', playbook.get(3, 'nope'))
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0, 'size': 1,
+                          'maxsize': 2 * 3 ** 9, 'pinned': 1}, playbook.stats())
+    
+    def test_unrank_board(self):
+        for rank in (0, 1, 2, 3 ** 9 - 1, 12345):
+            self.assertEqual(rank, board_rank(unrank_board(rank)))
+
+
+class GameStateTests(unittest.TestCase):
+    
+    def test_init(self):
+        state = GameState()
+        self.assertEqual((0, 0, False), (state.board, state.turn, state.game_over))
+        self.assertFalse(hasattr(state, '__dict__'))
+        self.assertRaises(AttributeError, setattr, state, 'ties', 1)
+    
+    def test_pack(self):
+        for state, packed in ((GameState(), 0),
+                              (GameState(0x3ffff, 1, True), 0xfffff),
+                              (GameState(0x20203, 0, True), 0x80000 | 0x20203),
+                              (GameState(0x20203, 1, False), 0x40000 | 0x20203)):
+            self.assertEqual(packed, state.pack())
+            self.assertEqual(state, GameState.unpack(packed))
+        self.assertNotEqual(GameState(1), GameState(2))
+        self.assertNotEqual(GameState(), 0)
+
+
+class OpeningBookTests(unittest.TestCase):
+    
+    def test_book(self):
+        book = OpeningBook()
+        self.assertEqual((False, None), (book.loaded, book.table))
+        
+        # every computer position up to BOOK_DEPTH moves in, with the
+        # hand-picked moves from OPENING_BOOK
+        for key, potential_moves in keyed_playbook(canonical_playbook(OPENING_BOOK)).items():
+            self.assertEqual(potential_moves, unpack_record(book.record(key)))
+        self.assertTrue(book.loaded)
+        for board in (0x20203, 0x3000a, 0x20323):
+            key = position_key(canonical_board(board)[0], COMPUTER)
+            self.assertEqual(table_record(SOLVED_TABLE, key), book.record(key))
+        
+        # five moves in, or not a real game
+        self.assertEqual(0, book.record(position_key(canonical_board(0x2082f)[0], COMPUTER)))
+        self.assertEqual(0, book.record(position_key(0x20200, COMPUTER)))
+        
+        # a missing book is empty
+        book = OpeningBook(os.path.join(os.path.dirname(BOOK_PATH), 'nope.bin'))
+        self.assertEqual((0, True), (book.record(1), book.loaded))
+    
+    def test_engine(self):
+        engine = Engine(table=None)
+        self.assertEqual((2, 4, 6, 8), engine.best_squares(0))
+        engine.best_squares(0x20203)
+        self.assertEqual({'book_hits': 2}, engine.snapshot()['counters'])
+        
+        # positions past the book are solved
+        engine.best_squares(0x2082f)
+        self.assertEqual(1, engine.snapshot()['counters']['solves'])
+        
+        # without a book, everything is solved, and every opening is as good
+        engine = Engine(table=None, book=None)
+        self.assertEqual(tuple(range(9)), engine.best_squares(0))
+        self.assertEqual(1, engine.snapshot()['counters']['solves'])
+
+
+class TieBreakerTests(unittest.TestCase):
+    
+    def test_choose(self):
+        squares = (1, 3, 5, 7)
+        self.assertEqual([1] * 10, [TieBreaker(deterministic=True).choose(squares)
+                                    for i in range(10)])
+        self.assertEqual(4, TieBreaker(0).choose((4,)))
+        
+        tie_breaker = TieBreaker(3)
+        choices = [tie_breaker.choose(squares) for i in range(100)]
+        self.assertEqual(set(squares), set(choices))
+        tie_breaker = TieBreaker(3)
+        self.assertEqual(choices, [tie_breaker.choose(squares) for i in range(100)])
+
+
+class MetricsTests(unittest.TestCase):
+    
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(0.0, histogram.percentile(.5))
+        for microseconds in [3] * 98 + [100, 5e6]:
+            histogram.add(microseconds / 1e6)
+        
+        snapshot = histogram.snapshot()
+        self.assertEqual(100, snapshot['count'])
+        self.assertEqual({4: 98, 128: 1, None: 1}, snapshot['buckets'])
+        self.assertEqual((4.0, 128.0), (snapshot['p50_us'], snapshot['p99_us']))
+        self.assertAlmostEqual(5e6, snapshot['max_us'])
+        self.assertAlmostEqual(5000394 / 100.0, snapshot['mean_us'])
+        self.assertAlmostEqual(5e6, histogram.percentile(1))
+    
+    def test_metrics(self):
+        metrics = Metrics()
+        metrics.count('solves')
+        metrics.count('nodes', 10)
+        metrics.observe('move', metrics.start())
+        metrics.observe('move', None)
+        snapshot = metrics.snapshot()
+        self.assertEqual({'solves': 1, 'nodes': 10}, snapshot['counters'])
+        self.assertEqual(1, snapshot['latency']['move']['count'])
+        
+        metrics.enabled = False
+        self.assertEqual(None, metrics.start())
+        metrics.count('solves')
+        self.assertEqual(1, metrics.snapshot()['counters']['solves'])
+        
+        metrics.reset()
+        self.assertEqual({'enabled': False, 'counters': {}, 'latency': {}},
+                         metrics.snapshot())
+    
+    def test_metrics_threads(self):
+        # every thread counts on its own, and the snapshot adds them up
+        metrics = Metrics()
+        def count():
+            for i in range(1000):
+                metrics.count('moves')
+                metrics.observe('move', metrics.start())
+        threads = [threading.Thread(target=count) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        count()
+        snapshot = metrics.snapshot()
+        self.assertEqual({'moves': 5000}, snapshot['counters'])
+        self.assertEqual(5000, snapshot['latency']['move']['count'])
+        self.assertEqual(5000, sum(snapshot['latency']['move']['buckets'].values()))
+
+
+class BoundedCacheTests(unittest.TestCase):
+    
+    def test_lru_eviction(self):
+        cache = BoundedCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        
+        # 'a' was used more recently than 'b', so 'b' goes first
+        self.assertEqual(1, cache['a'])
+        cache['c'] = 3
+        self.assertEqual(['a', 'c'], list(cache))
+        self.assertFalse('b' in cache)
+        self.assertRaises(KeyError, cache.__getitem__, 'b')
+        
+        cache.update({'d': 4, 'e': 5})
+        self.assertEqual(['d', 'e'], list(cache))
+        self.assertEqual(3, cache.stats()['evictions'])
+        
+        # no limit
+        cache = BoundedCache()
+        cache.update(dict((i, i) for i in range(1000)))
+        self.assertEqual(1000, len(cache))
+    
+    def test_pin(self):
+        cache = BoundedCache(maxsize=1, pinned={'book': 0})
+        cache['a'] = 1
+        cache['b'] = 2
+        
+        # pinned entries don't count towards the limit and aren't replaced,
+        # evicted or cleared
+        self.assertEqual(['book', 'b'], list(cache))
+        cache['book'] = 1
+        self.assertEqual(0, cache['book'])
+        cache.clear()
+        self.assertEqual(['book'], list(cache))
+        
+        cache['c'] = 3
+        cache.pin('c', 4)
+        self.assertEqual(4, cache['c'])
+        self.assertEqual(2, len(cache))
+    
+    def test_stats(self):
+        cache = BoundedCache(maxsize=1, pinned={'book': 0})
+        self.assertEqual({'hits': 0, 'misses': 0, 'evictions': 0, 'size': 1,
+                          'maxsize': 1, 'pinned': 1}, cache.stats())
+        
+        cache['a'] = 1
+        self.assertEqual(0, cache.get('book'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('nope', cache.get('c', 'nope'))
+        cache['b'] = 2
+        self.assertEqual({'hits': 2, 'misses': 2, 'evictions': 1, 'size': 2,
+                          'maxsize': 1, 'pinned': 1}, cache.stats())
+    
+class EngineTests(unittest.TestCase):
+    
+    def play_games(self, engine, games, seed):
+        """
+        Helper method to play games between a random human and the computer.
+        Returns the number of games the human won, which should be none.
+        
+        :param engine: the Engine for every game to share
+        :param games: number of games to play
+        :param seed: seed for the human's moves
+        :return: integer
+        """
+        rng = random.Random(seed)
+        human_wins = 0
+        for game in range(games):
+            ttt = TicTacToeBoard(engine)
+            ttt.turn = rng.randint(0, 1)
+            game_over = winner = False
+            while not game_over:
+                if ttt.is_computer_turn():
+                    square, game_over, winner = ttt.computer_move()
+                else:
+                    square = rng.choice(ttt._get_valid_moves(ttt.board))
+                    square, game_over, winner = ttt.human_move(square)
+            human_wins += int(winner == HUMAN)
+        return human_wins
+    
+    def run_threads(self, target, count):
+        """
+        Helper method to run `target` in `count` threads at once, with
+        threads switching as often as possible. Returns what each call
+        returned, and raises the first exception if any call raised one.
+        
+        :param target: callable taking the index of the thread
+        :param count: number of threads
+        :return: list
+        """
+        results = [None] * count
+        errors = []
+        
+        def run(index):
+            try:
+                results[index] = target(index)
+            except Exception as error:
+                errors.append(error)
+        
+        threads = [threading.Thread(target=run, args=(index,)) 
+                   for index in range(count)]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        if errors:
+            raise errors[0]
+        return results
+    
+    def test_calculate_board_costs(self):
+        engine = Engine()
+        
+        for board, player, value_dict in ((0b110011101000100011, 2, {1: -9, 3:0, 7: 10}),
+                                          (0b110011101011100011, 1, {1: 9, 7:0}),
+                                          (0b111011101011100011, 2, {1: 0}),
+                                          (0b110011101011101011, 2, {7: 10}),
+                                          (0b110011101000101111, 1, {3: -10, 7: 0}),
+                                          (0b111011101000101111, 2, {3: 0})):
+            # with an empty and a warm transposition table
+            for trial in range(2):
+                if not trial:
+                    engine.transpositions.clear()
+                cost_dict = engine.calculate_board_costs(board, player)
+                self.assertEquals({(board, player): value_dict}, cost_dict)
+        
+        # defaults to the computer
+        self.assertEquals({(0b110011101000100011, 2): {1: -9, 3:0, 7: 10}},
+                          engine.calculate_board_costs(0b110011101000100011))
+        
+        # no moves left
+        self.assertEquals({}, engine.calculate_board_costs(0b101011101111101110))
+    
+    def test_potential_moves(self):
+        engine = Engine()
+        search_engine = Engine(table=None)
+        
+        # the table only keeps the best of the moves the search finds
+        for board in (0x00000, 0x20000, 0x20203, 0x3000a):
+            best_moves = engine.potential_moves(board)
+            potential_moves = search_engine.potential_moves(board)
+            best_cost = max(potential_moves.values())
+            self.assertEqual(dict((square, cost) for square, cost 
+                                  in potential_moves.items() 
+                                  if cost == best_cost), best_moves)
+        
+        # turned back to the orientation that was passed in
+        for board, expected_move in LAST_MOVES:
+            for k in range(8):
+                potential_moves = search_engine.potential_moves(
+                    transform_board(board, k))
+                best_cost = max(potential_moves.values())
+                self.assertEqual(best_cost, 
+                                 potential_moves[SYMMETRIES[k][expected_move]])
+        
+        # no moves left
+        self.assertRaises(InvalidStateException, search_engine.potential_moves,
+                          0b101011101111101110)
+    
+    def test_best_squares(self):
+        for engine in (Engine(), Engine(table=None)):
+            self.assertEqual((2, 4, 6, 8), engine.best_squares(0))
+            for board, expected_move in LAST_MOVES:
+                self.assertEqual((expected_move,), engine.best_squares(board))
             
+            # the same squares as potential_moves, turned the same way
+            for board in (0x20000, 0x80, 0x20203, 0x3000a, 0x20200):
+                potential_moves = engine.potential_moves(board)
+                best_cost = max(potential_moves.values())
+                self.assertEqual(tuple(sorted(square for square, cost 
+                                              in potential_moves.items()
+                                              if cost == best_cost)),
+                                 engine.best_squares(board))
+        
+        self.assertRaises(InvalidStateException, Engine(table=None).best_squares,
+                          0b101011101111101110)
+    
+    def test_in_table(self):
+        for board in (0x00000, 0x20000, 0x20203, 0x3000a):
+            self.assertTrue(Engine().in_table(board))
+            self.assertFalse(Engine(table=None).in_table(board))
+        
+        # can't come up in a real game, or the game is over
+        for board in (0x20200, 0b101011101111101110, 0b111111000000000000):
+            self.assertFalse(Engine().in_table(board))
+    
+    def test_human_move(self):
+        engine = Engine()
+        state = GameState()
+        self.assertEqual((4, False, None), engine.human_move(state, 4))
+        self.assertEqual(GameState(0b1000000000, 1, False), state)
+        
+        # not the human's turn, or not an open square
+        self.assertEqual((None, False, None), engine.human_move(state, 3))
+        state.turn = 0
+        for square in (4, 9, -1, '3', None, 2.0):
+            self.assertEqual((None, False, None), engine.human_move(state, square))
+        self.assertEqual(GameState(0b1000000000, 0, False), state)
+        
+        # wins and ties end the game
+        state = GameState(0b000000000000101000)
+        self.assertEqual((8, True, 1), engine.human_move(state, 8))
+        self.assertEqual(GameState(0b100000000000101000, 1, True), state)
+        state = GameState(0b111011111011100010)
+        self.assertEqual((1, True, None), engine.human_move(state, 1))
+        self.assertEqual((None, True, None), engine.human_move(state, 1))
+    
+    def test_computer_move(self):
+        engine = Engine()
+        for board, expected_move in LAST_MOVES:
+            state = GameState(board, 1)
+            self.assertEqual((expected_move, False, None), engine.computer_move(state))
+            self.assertEqual(GameState(board | 3 << (2 * expected_move), 0), state)
+            
+            # not the computer's turn
+            self.assertEqual((None, False, None), engine.computer_move(state))
+        
+        state = GameState(0b000000000000111100, 1)
+        self.assertEqual((8, True, 2), engine.computer_move(state))
+        self.assertTrue(state.game_over)
+        self.assertEqual((None, True, None), engine.computer_move(state))
+        
+        # seeded tie breakers replay the same moves, whatever the engine's
+        squares = []
+        for trial in range(2):
+            tie_breaker = TieBreaker(5)
+            squares.append([engine.computer_move(GameState(turn=1), tie_breaker)[0]
+                            for i in range(20)])
+        self.assertEqual(squares[0], squares[1])
+        self.assertTrue(len(set(squares[0])) > 1)
+        engine = Engine(tie_breaker=TieBreaker(deterministic=True))
+        self.assertEqual(2, engine.computer_move(GameState(turn=1))[0])
+        
+        # the same games as in TicTacToeBoardTests.test_forty_two
+        rng = random.Random(42)
+        for game in range(200):
+            state = GameState(turn=game % 2)
+            winner = None
+            while not state.game_over:
+                if state.turn:
+                    square, game_over, winner = engine.computer_move(state)
+                else:
+                    square = rng.choice(open_squares(state.board))
+                    square, game_over, winner = engine.human_move(state, square)
+            self.assertNotEqual(HUMAN, winner)
+    
+    def test_single_flight(self):
+        engine = Engine(table=None)
+        
+        # threads asking for the same position only solve it once
+        results = self.run_threads(lambda index: engine.potential_moves(0x20200),
+                                   16)
+        self.assertEqual(1, engine.playbook.stats()['misses'])
+        self.assertEqual(15, engine.playbook.stats()['hits'])
+        
+        # the playbook only keeps the best moves of the first result
+        best_moves = dict((square, cost) for square, cost in results[0].items()
+                          if cost == max(results[0].values()))
+        for potential_moves in results[1:]:
+            self.assertEqual(best_moves, potential_moves)
+    
+    def test_concurrent_games(self):
+        # without the table, every computer move goes through the caches
+        for engine in (Engine(), Engine(table=None), 
+                       Engine(transpositions=BoundedCache(maxsize=50), 
+                              table=None)):
+            human_wins = self.run_threads(
+                lambda index: self.play_games(engine, 250, index), 8)
+            self.assertEqual([0] * 8, human_wins)
+            
+            # and each position was only solved once
+            self.assertEqual(len(engine.playbook), 
+                             engine.snapshot()['counters'].get('solves', 0))
+    
+    def test__move_score(self):
+        engine = Engine()
+        human, computer = split_board(0b110011101000100011)
+        
+        # scores are from the point of view of the player moving
+        self.assertEquals(WIN_VALUE, engine._move_score(7, computer, human, -11, 11))
+        self.assertEquals(TIE_VALUE, engine._move_score(3, computer, human, -11, 11))
+        self.assertEquals(-9, engine._move_score(1, computer, human, -11, 11))
+        
+        human, computer = split_board(0b110011101000101111)
+        self.assertEquals(WIN_VALUE, engine._move_score(3, human, computer, -11, 11))
+    
+    def test__negamax(self):
+        engine = Engine()
+        
+        for board, player, expected in ((0b110011101000100011, 2, 10),
+                                        (0b110011101011100011, 1, 0),
+                                        (0b000000000000000000, 2, 0),
+                                        (0b000000000000000000, 1, 0),
+                                        (0b100000000000000000, 2, 0),
+                                        (0b100000000000000010, 2, -7)):
+            mover, opponent = split_board(board)[::[1, -1][player == 2]]
+            engine.transpositions.clear()
+            self.assertEquals(expected, engine._negamax(mover, opponent, -11, 11))
             
+            # narrower windows only have to give a bound on the real score
+            for alpha, beta in ((-11, -5), (-1, 1), (0, 1), (5, 11), (-3, 8)):
+                for trial in range(2):
+                    if not trial:
+                        engine.transpositions.clear()
+                    score = engine._negamax(mover, opponent, alpha, beta)
+                    if score <= alpha:
+                        self.assertTrue(expected <= score)
+                    elif score >= beta:
+                        self.assertTrue(expected >= score)
+                    else:
+                        self.assertEquals(expected, score)
+    
+    def test_tiny_transposition_cache(self):
+        # evicting search results shouldn't change any scores
+        expected = Engine().calculate_board_costs(0)
+        
+        for maxsize in (0, 1, 10, 100):
+            transpositions = BoundedCache(maxsize=maxsize)
+            engine = Engine(transpositions=transpositions)
+            self.assertEqual(expected, engine.calculate_board_costs(0))
+            self.assertTrue(len(transpositions) <= maxsize)
+            self.assertTrue(transpositions.stats()['evictions'] > 0)
+    
+    def test_pluggable_playbook(self):
+        playbook = BoundedCache(maxsize=5)
+        ttt = TicTacToeBoard(Engine(playbook=playbook))
+        
+        # positions that can't come up in a real game aren't in SOLVED_TABLE
+        for board, expected_move in LAST_MOVES:
+            self.assertEqual(expected_move, ttt._choose_square(board))
+            self.assertEqual(expected_move, ttt._choose_square(board))
+        self.assertTrue(len(playbook) <= 5)
+        self.assertTrue(playbook.stats()['hits'] >= len(LAST_MOVES))
+    
+    def test_prewarm(self):
+        # without a table or a book, every early position is solved ahead
+        engine = Engine(table=None, book=None)
+        self.assertEqual(162, engine.prewarm())
+        self.assertEqual(162, len(engine.playbook))
+        solves = engine.metrics.snapshot()['counters']['solves']
+        
+        ttt = TicTacToeBoard(engine, TieBreaker(deterministic=True))
+        ttt.human_move(8)
+        ttt.computer_move()
+        ttt.human_move(ttt._get_valid_moves(ttt.board)[0])
+        ttt.computer_move()
+        self.assertEqual(solves, engine.metrics.snapshot()['counters']['solves'])
+        
+        # with them, the book is loaded and nothing needs solving
+        book = OpeningBook()
+        engine = Engine(book=book)
+        # the empty board, and a center, corner or edge from the human
+        self.assertEqual(4, engine.prewarm(1))
+        self.assertTrue(book.loaded)
+        self.assertNotIn('solves', engine.metrics.snapshot()['counters'])
+    
+    def test_snapshot(self):
+        engine = Engine()
+        state = GameState(turn=1)
+        engine.computer_move(state)
+        engine.potential_moves(0x20200)
+        engine.potential_moves(0x20200)
+        
+        snapshot = engine.snapshot()
+        counters = snapshot['counters']
+        self.assertEqual((1, 2, 1), (counters['table_hits'], 
+                                     counters['table_misses'], 
+                                     counters['solves']))
+        self.assertEqual(engine.nodes, counters['nodes'])
+        self.assertTrue(counters['nodes'] > 0)
+        self.assertEqual(1, snapshot['latency']['move']['count'])
+        self.assertEqual(1, snapshot['latency']['solve']['count'])
+        self.assertEqual((1, 1), (snapshot['playbook']['hits'], 
+                                  snapshot['playbook']['misses']))
+        self.assertEqual(engine.transpositions.stats(), snapshot['transpositions'])
+        
+        # a board keeps counting in its engine
+        ttt = TicTacToeBoard(engine)
+        ttt.turn = 1
+        ttt.computer_move()
+        self.assertEqual(2, engine.snapshot()['latency']['move']['count'])
+        
+        # switched off, nothing is counted
+        engine = Engine(metrics=Metrics(enabled=False))
+        engine.computer_move(GameState(turn=1))
+        engine.potential_moves(0x20200)
+        self.assertEqual(({}, {}), (engine.snapshot()['counters'],
+                                    engine.snapshot()['latency']))
+
+
+class SymmetryTests(unittest.TestCase):
+    
+    def test_symmetries(self):
+        winning_lines = set(WINNING_MOVES)
+        for k, symmetry in enumerate(SYMMETRIES):
+            self.assertEqual(0, symmetry[0])
+            self.assertEqual(list(range(9)), sorted(symmetry))
+            
+            undo = SYMMETRIES[INVERSE_SYMMETRIES[k]]
+            for square in range(9):
+                self.assertEqual(square, undo[symmetry[square]])
+            
+            # rows, columns and diagonals stay rows, columns and diagonals
+            self.assertEqual(winning_lines, 
+                             set(transform_board(line, k) for line in WINNING_MOVES))
+        
+        self.assertEqual(8, len(set(SYMMETRIES)))
+    
+    def test_canonical_board(self):
+        for trial in range(200):
+            board = 0
+            for square in range(9):
+                board |= random.choice((0, 2, 3)) << (2 * square)
+            
+            variants = [transform_board(board, k) for k in range(8)]
+            canonical, symmetry = canonical_board(board)
+            self.assertEqual(min(variants), canonical)
+            self.assertEqual(canonical, variants[symmetry])
+            for variant in variants:
+                self.assertEqual(canonical, canonical_board(variant)[0])
+        
+        # a corner, an edge, and the center
+        self.assertEqual(0x00020, canonical_board(0x20000)[0])
+        self.assertEqual(0x00008, canonical_board(0x08000)[0])
+        self.assertEqual((0x00002, 0), canonical_board(0x00002))
+    
+    def test_canonical_playbook(self):
+        playbook = canonical_playbook({(0x20000, 2): {0: -100},
+                                       (0x00200, 2): {0: -100},
+                                       (0x08000, 2): {8: -100, 6: -100},
+                                       (0x20200, 1): {6: 1, 0: 2}})
+        self.assertEqual({(0x00020, 2): {0: -100},
+                          (0x00008, 2): {8: -100, 2: -100},
+                          (0x02020, 1): {8: 1, 0: 2}}, playbook)
+    
+    def test__choose_square(self):
+        ttt = TicTacToeBoard()
+        
+        # rotated and reflected boards get rotated and reflected moves
+        for board, expected_move in LAST_MOVES:
+            for k in range(8):
+                move = ttt._choose_square(transform_board(board, k))
+                self.assertEqual(SYMMETRIES[k][expected_move], move)
@@ -0,0 +1,96 @@
+import io
+import unittest
+
+from app.uci import *
+from app.ttt import Engine
+
+
+class UciTests(unittest.TestCase):
+
+    def session(self):
+        """
+        Helper method to make a session that always breaks ties the same way.
+
+        :return: UciSession
+        """
+        return UciSession(Engine(), TieBreaker(deterministic=True))
+
+    def test_board_string(self):
+        self.assertEqual(0x20000 | 3 << 14 | 2 << 2, parse_board_string('XO.X.....'))
+        self.assertEqual(parse_board_string('XO.X.....'), parse_board_string('xo-x-----'))
+        self.assertEqual('XO.X.....', board_string(parse_board_string('XO.X.....')))
+        for text in ('XO.X....', 'XO.X.....O', 'XO.X....?'):
+            self.assertRaises(ProtocolError, parse_board_string, text)
+
+    def test_position(self):
+        session = self.session()
+        self.assertEqual([], session.handle('position startpos moves 8 0'))
+        self.assertEqual((0x20003, 0), (session.board.board, session.board.turn))
+
+        session.handle('position board XO.X..... computer moves 2')
+        self.assertEqual(parse_board_string('XO.X..O..'), session.board.board)
+        self.assertEqual(0, session.board.turn)
+
+        session.handle('position packed %s' % GameState(0x20000, 1).pack())
+        self.assertEqual((0x20000, 1), (session.board.board, session.board.turn))
+
+        session.handle('position board XXX.OO...')
+        self.assertTrue(session.board.game_over)
+        self.assertEqual(['bestmove (none)'], session.handle('go'))
+        session.handle('reset')
+        self.assertEqual((0, 0, False), (session.board.board, session.board.turn,
+                                         session.board.game_over))
+
+    def test_go(self):
+        session = self.session()
+        session.handle('position board XO.X..... computer')
+        lines = session.handle('go')
+        self.assertEqual('info move 2 score -7', lines[0])
+        self.assertEqual('bestmove 2 score -7', lines[-1])
+        self.assertEqual(7, len(lines))
+
+        # scores are for the side to move, so the human's are negated
+        session.handle('move 2')
+        lines = session.handle('go')
+        self.assertEqual('bestmove 0 score 8', lines[-1])
+
+    def test_undo_redo(self):
+        session = self.session()
+        session.handle('position board XO.X..... computer moves 2 4')
+        self.assertEqual([], session.handle('undo'))
+        self.assertEqual(parse_board_string('XO.X..O..'), session.board.board)
+        self.assertEqual([], session.handle('redo'))
+        self.assertEqual(1, session.board.turn)
+        session.handle('undo')
+        session.handle('undo')
+        self.assertEqual(parse_board_string('XO.X.....'), session.board.board)
+        self.assertTrue(session.handle('undo')[0].startswith('info string'))
+
+        session.handle('move 5')
+        self.assertTrue(session.handle('redo')[0].startswith('info string'))
+
+    def test_errors(self):
+        session = self.session()
+        for command in ('fly', 'position', 'position board XO', 'position packed x',
+                        'position packed %s' % (1 << 20), 'position startpos moves 9',
+                        'position startpos sideways', 'move', 'move x',
+                        'setoption name Depth value 3',
+                        # isdigit() is true for these, but int() can't read them
+                        'move \u00b2', 'position startpos moves \u00b2',
+                        'setoption name Seed value --5'):
+            lines = session.handle(command)
+            self.assertEqual(1, len(lines))
+            self.assertTrue(lines[0].startswith('info string '), command)
+        self.assertEqual([], session.handle('   '))
+
+    def test_run(self):
+        stdout = io.StringIO()
+        session = self.session()
+        session.run(io.StringIO('uci\nisready\nsetoption name Seed value 4\n'
+                                'position startpos computer\ngo\nquit\nisready\n'),
+                    stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(['id name %s' % NAME, 'option name Seed type spin', 'uciok',
+                          'readyok'], lines[:4])
+        self.assertTrue(lines[-1].startswith('bestmove '))
+        self.assertFalse(session.running)